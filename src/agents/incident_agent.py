@@ -1,5 +1,8 @@
 from deepagents import create_deep_agent
+from ..services.chat_model_service import get_chat_model
 from ..tools.rags.incidents_rag import search_incidents
+from ..tools.rags.document_lookup import get_document
+from ..tools.rags.reports_search import search_reports
 
 agent_instructions = """You are an AI Ethics Incident Analysis Agent. 
 Your task is to analyze and summarize AI ethics incidents based on information retrieved from a database of incidents. 
@@ -7,11 +10,14 @@ You will be provided with search results from the database, and your goal is to
 including the nature of the incident, the parties involved, 
 the consequences, and any ethical considerations. 
 Use the search results to inform your analysis, and ensure that your summary is clear, concise, and informative. 
-Focus on providing insights into the ethical implications of the incident and any lessons that can be learned from it."""
+Focus on providing insights into the ethical implications of the incident and any lessons that can be learned from it.
+Search results start with an id in brackets; cite results by that id and call get_document with it when you need the full record.
+Use search_reports to find specific evidence (quotes, names, figures) in the full text of the incident reports."""
 
 
 incident_agent = create_deep_agent(
     name="Incident Analysis Agent",
+    model=get_chat_model(),
     system_prompt=agent_instructions,
-    tools=[search_incidents]
+    tools=[search_incidents, search_reports, get_document]
 )
\ No newline at end of file
@@ -1,16 +1,20 @@
 from deepagents import create_deep_agent
+from ..services.chat_model_service import get_chat_model
 from ..tools.rags.risk_rag import search_risks
+from ..tools.rags.document_lookup import get_document
 
 risk_agent_instructions = """You are an AI Ethics Risk Analysis Agent. 
 Your task is to analyze and summarize AI ethics risks based on information retrieved from a database of AI risks. 
 You will be provided with search results from the database, and your goal is to synthesize this information into a coherent summary that highlights the key details of the risk, 
 including the nature of the risk, the potential consequences, the parties involved, and any ethical considerations. 
 Use the search results to inform your analysis, and ensure that your summary is clear, concise, and informative. 
-Focus on providing insights into the ethical implications of the risk and any lessons that can be learned from it."""
+Focus on providing insights into the ethical implications of the risk and any lessons that can be learned from it.
+Search results start with an id in brackets; cite results by that id and call get_document with it when you need the full record."""
 
 
 risks_agent = create_deep_agent(
     name="AI Ethics Risk Analysis Agent",
+    model=get_chat_model(),
     system_prompt=risk_agent_instructions,
-    tools=[search_risks]
+    tools=[search_risks, get_document]
 )
\ No newline at end of file
@@ -1,89 +1,136 @@
 from .agents.risk_agent import risks_agent
 from .agents.incident_agent import incident_agent
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 from typing_extensions import TypedDict, Annotated
 import operator
 from langgraph.graph import StateGraph, START, END
-from langchain_google_genai import ChatGoogleGenerativeAI
+from .services.chat_model_service import get_chat_model
+from .services.intent_router_service import get_intent_router, RISK_ROUTE, INCIDENT_ROUTE
+from .services.result_formatter_service import parse_citations
 from typing import Literal
+import os
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
+llm = get_chat_model()
+
+# "router" runs the agent(s) the supervisor picks, "always" runs both agents on every request
+AGENT_FANOUT_MODE = os.getenv("AGENT_FANOUT_MODE", "router").lower()
+
+class AgentOutput(TypedDict):
+    agent: str
+    answer: str
+    citations: list[dict]
 
 class MessagesState(TypedDict):
     messages: Annotated[list[AnyMessage], operator.add]
-    llm_calls: int
-
-def risk_agent_call(state:dict):
-    """LLM decides whether to call a tool or not"""
-    system_prompt = """"
-        You are an AI Ethics Risk Analysis Agent. 
-        Your task is to analyze and summarize AI ethics risks based on information retrieved from a database of AI risks. 
-        You will be provided with search results from the database, and your goal is to synthesize this information into a coherent summary that highlights the key details of the risk, 
-        including the nature of the risk, the potential consequences, the parties involved, and any ethical considerations. Use the search results to inform your analysis, and ensure that your summary is clear, concise, and informative. 
-        Focus on providing insights into the ethical implications of the risk and any lessons that can be learned from it."
-    """
+    # Summed, since both agents may run in the same step when a request is routed to both
+    llm_calls: Annotated[int, operator.add]
+    agent_outputs: Annotated[list[AgentOutput], operator.add]
 
+def extract_citations(messages: list[AnyMessage]) -> list[dict]:
+    """Collect the documents returned by search tools in a deep agent run, one entry per source record."""
+    citations = {}
+    for message in messages:
+        if not isinstance(message, ToolMessage):
+            continue
+        for citation in parse_citations(message.text):
+            # Chunk ids are "<source key>#<chunk>", several chunks of one record are one citation
+            key = citation['id'].split("#")[0]
+            citations.setdefault(key, {**citation, 'id': key})
+    return list(citations.values())
+
+def _agent_output(agent: str, result: dict) -> dict:
+    messages = result["messages"]
     return {
-        "messages": [
-            risks_agent.invoke(
-                [ SystemMessage(content=system_prompt),] +
-                state["messages"]),
-        ],
-        "llm_calls": state["llm_calls"] + 1
+        "agent_outputs": [{"agent": agent, "answer": messages[-1].text, "citations": extract_citations(messages)}],
+        "llm_calls": sum(isinstance(message, AIMessage) for message in messages),
     }
 
-def incident_agent_call(state:dict):
-    """LLM decides whether to call a tool or not"""
-    system_prompt = """You are an AI Ethics Incident Analysis Agent. 
-        Your task is to analyze and summarize AI ethics incidents based on information retrieved from a database of incidents. 
-        You will be provided with search results from the database, and your goal is to synthesize this information into a coherent summary that highlights the key details of the incident, 
-        including the nature of the incident, the parties involved, 
-        the consequences, and any ethical considerations. 
-        Use the search results to inform your analysis, and ensure that your summary is clear, concise, and informative. 
-        Focus on providing insights into the ethical implications of the incident and any lessons that can be learned from it."""
+# Both deep agents carry their instructions as their own system prompt, so only the conversation is passed in
+def risk_agent_call(state: MessagesState):
+    """Run the risk deep agent over the conversation."""
+    return _agent_output(RISK_ROUTE, risks_agent.invoke({"messages": state["messages"]}))
 
-    return {
-        "messages": [
-            incident_agent.invoke(
-                [ SystemMessage(content=system_prompt),] +
-                state["messages"]),
-        ],
-        "llm_calls": state["llm_calls"] + 1
-    }
+async def arisk_agent_call(state: MessagesState):
+    return _agent_output(RISK_ROUTE, await risks_agent.ainvoke({"messages": state["messages"]}))
 
-def supervisor_node(state: MessagesState) -> Literal["risk_agent", "incident_agent"]:
-    """
-    Classifies the user's intent and routes to the appropriate agent.
-    """
-    messages = state["messages"]
+def incident_agent_call(state: MessagesState):
+    """Run the incident deep agent over the conversation."""
+    return _agent_output(INCIDENT_ROUTE, incident_agent.invoke({"messages": state["messages"]}))
+
+async def aincident_agent_call(state: MessagesState):
+    return _agent_output(INCIDENT_ROUTE, await incident_agent.ainvoke({"messages": state["messages"]}))
+
+AGENT_SECTION_TITLES = {RISK_ROUTE: "Risk analysis", INCIDENT_ROUTE: "Incident analysis"}
+
+def merge_agent_outputs(state: MessagesState):
+    """Reduce the sub-agent answers into one reply with a single, deduplicated source list."""
+    # Branches finish in any order, present them in a fixed one
+    outputs = sorted(state["agent_outputs"], key=lambda output: list(AGENT_SECTION_TITLES).index(output["agent"]))
+    if len(outputs) == 1:
+        sections = [outputs[0]["answer"]]
+    else:
+        sections = [f"## {AGENT_SECTION_TITLES[output['agent']]}\n\n{output['answer']}" for output in outputs]
+
+    citations = {}
+    for output in outputs:
+        for citation in output["citations"]:
+            citations.setdefault((citation['source'], citation['id']), citation)
+    if citations:
+        sources = [f"{i}. {c['title'] or c['id']} ({c['source']}, {c['id']})" for i, c in enumerate(citations.values(), 1)]
+        sections.append("## Sources\n\n" + "\n".join(sources))
+
+    return {"messages": [AIMessage(content="\n\n".join(sections))]}
+
+def _llm_route(query: str) -> list[str] | None:
     system_prompt = """You are a supervisor for an AI Ethics system.
     Your job is to route the user's request to the appropriate agent.
     
     If the user asks about AI risks, you should route to 'risk_agent'.
     If the user asks about AI incidents, you should route to 'incident_agent'.
-    If the request is unclear or general, default to 'risk_agent'.
+    If the user needs both risks and past incidents, answer 'both'.
     
     Only output the name of the agent to call.
     """
     
-    response = llm.invoke([SystemMessage(content=system_prompt)] + messages)
-    content = response.content.lower().strip()
+    response = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=query)])
+    content = response.text.lower().strip()
     
+    if "both" in content:
+        return [RISK_ROUTE, INCIDENT_ROUTE]
     if "incident_agent" in content or "incident" in content:
-        return "incident_agent"
-    return "risk_agent"
+        return [INCIDENT_ROUTE]
+    if "risk_agent" in content or "risk" in content:
+        return [RISK_ROUTE]
+    return None
+
+def supervisor_node(state: MessagesState) -> list[Literal["risk_agent", "incident_agent"]]:
+    """
+    Classifies the user's intent and routes to the appropriate agent(s).
+    Clear requests are routed locally; the LLM is only asked when the local router is unsure.
+    """
+    query = state["messages"][-1].text
+    return get_intent_router().route(query, llm_fallback=_llm_route).routes # type: ignore
 
 workflow = StateGraph(MessagesState)
 
-workflow.add_node("risk_agent", risk_agent_call)
-workflow.add_node("incident_agent", incident_agent_call)
+# Branches that run in the same step execute concurrently, so fanning out costs about the slower agent
+workflow.add_node("risk_agent", RunnableLambda(risk_agent_call, afunc=arisk_agent_call))
+workflow.add_node("incident_agent", RunnableLambda(incident_agent_call, afunc=aincident_agent_call))
+workflow.add_node("merge", merge_agent_outputs)
 
-# Add conditional edges from START using supervisor logic
-workflow.add_conditional_edges(START, supervisor_node)
+if AGENT_FANOUT_MODE == "always":
+    workflow.add_edge(START, "risk_agent")
+    workflow.add_edge(START, "incident_agent")
+else:
+    # Add conditional edges from START using supervisor logic
+    workflow.add_conditional_edges(START, supervisor_node, ["risk_agent", "incident_agent"])
 
-workflow.add_edge("risk_agent", END)
-workflow.add_edge("incident_agent", END)
+# Separate edges, so merge runs once after whichever agents were started
+workflow.add_edge("risk_agent", "merge")
+workflow.add_edge("incident_agent", "merge")
+workflow.add_edge("merge", END)
 
 graph = workflow.compile()
 
@@ -3,14 +3,17 @@ from .tools.rags.risk_rag import search_risks
 from .agents.incident_agent import incident_agent
 from .tools.rags.incidents_rag import search_incidents
 from .services.incidents_reports_etl_service import get_reports_by_ids
+from .services.telemetry_service import get_logger
 from langchain_core.messages import AnyMessage, SystemMessage, ToolMessage
 from typing_extensions import TypedDict, Annotated
-import operator
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
 from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import Literal
 from pydantic import BaseModel, Field
 
+logger = get_logger(__name__)
+
 llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
 
 class Risk(BaseModel):
@@ -54,7 +57,7 @@ class IncidentAnalysisResult(BaseModel):
 
 class AgentState(TypedDict):
 
-    messages: Annotated[list[AnyMessage], operator.add]
+    messages: Annotated[list[AnyMessage], add_messages]
     analysis_result: dict # Store the structured result here
     risk_assessments: list[dict] # Store the structured detailed risk assessments here
     incident_analyses: list[dict] # Store structured incident analyses
@@ -104,18 +107,18 @@ def supervisor_agent(state: AgentState) -> AgentState:
     tool_calls = state['messages'][-1].tool_calls # type: ignore
     results = []
     for t in tool_calls:
-        print(f"Calling tool: {t['name']} with queries: {t['args'].get('query', 'No query provided')}")
+        logger.info(f"Calling tool: {t['name']} with queries: {t['args'].get('query', 'No query provided')}")
 
         if not t['name'] in tools_dict:
-            print(f"Tool {t['name']} not found in tools_dict. Skipping.")
+            logger.warning(f"Tool {t['name']} not found in tools_dict. Skipping.")
             result  = f"Tool {t['name']} not found. Please Retry and Select a valid tool from the list of available tools."
         else:
             result = tools_dict[t['name']].invoke(t['args'].get('query', ''))
-            print(f"Result from tool {t['name']}: {result}")
+            logger.debug(f"Result from tool {t['name']}: {result}")
         results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
     
-    print("Tool calls completed. Updating state with results. Back to the model!")
-    return {"messages": state["messages"] + results, "llm_calls": state["llm_calls"]}
+    logger.info("Tool calls completed. Updating state with results. Back to the model!")
+    return {"messages": results}
 
 def risk_agent_call(state: AgentState) -> AgentState:
     analysis_result = state["analysis_result"]
@@ -187,7 +190,7 @@ def risk_agent_call(state: AgentState) -> AgentState:
         summary_text += f"  - Summary: {assessment.analysis_summary}\n"
 
     return {
-        "messages": state["messages"] + [SystemMessage(content=summary_text)], 
+        "messages": [SystemMessage(content=summary_text)], 
         "risk_assessments": [r.model_dump() for r in result.assessments],
         "llm_calls": state["llm_calls"] + 1
     }
@@ -292,7 +295,7 @@ def incident_agent_call(state: AgentState) -> AgentState:
                     fetched_reports = get_reports_by_ids(data_indices)
                     analysis_dict['reports'] = fetched_reports
                 except Exception as e:
-                    print(f"Error fetching reports for incident '{analysis.incident_title}': {e}")
+                    logger.error(f"Error fetching reports for incident '{analysis.incident_title}': {e}")
         
         final_analyses.append(analysis_dict)
 
@@ -307,7 +310,7 @@ def incident_agent_call(state: AgentState) -> AgentState:
             summary_text += f"  - {count} related reports retrieved.\n"
 
     return {
-        "messages": state["messages"] + [SystemMessage(content=summary_text)], 
+        "messages": [SystemMessage(content=summary_text)], 
         "incident_analyses": final_analyses,
         "llm_calls": state["llm_calls"] + 1
     }
@@ -0,0 +1,148 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from langchain.messages import HumanMessage
+from pydantic import BaseModel, Field
+from .main import rag_agent
+from .warmup import warmup, is_ready, warmup_errors
+from .services.query_cache_service import query_cache_stats
+from .services.report_repository_service import get_report_cache
+from .services.telemetry_service import render_metrics, metrics_snapshot
+import asyncio
+import json
+import os
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("MAX_CONCURRENT_ANALYSES", "16"))
+# How long a request may wait for a free analysis slot before being turned away
+ANALYSIS_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_QUEUE_TIMEOUT_SECONDS", "5"))
+API_WARMUP_ON_STARTUP = os.getenv("API_WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+
+_analysis_slots = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = None
+    if API_WARMUP_ON_STARTUP:
+        # Serve health checks right away; /readyz flips once the indexes are built
+        warmup_task = asyncio.create_task(asyncio.to_thread(warmup))
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+
+app = FastAPI(title="AI Ethics Multiagents", lifespan=lifespan)
+
+
+class AnalysisRequest(BaseModel):
+    query: str = Field(description="Project description or question to analyze")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _stream_analysis(request: Request, query: str):
+    '''Run one analysis and translate graph events into Server-Sent Events.
+
+    The caller already holds an analysis slot; it is released when the stream ends. If the
+    client disconnects, the event stream is closed before the slot is released, which cancels
+    the graph run and any in-flight tool calls awaiting inside it.
+    '''
+    events = None
+    try:
+        yield _sse("start", {"query": query})
+        inputs = {"messages": [HumanMessage(content=query)], "llm_calls": 0}
+        events = rag_agent.astream_events(inputs, version="v2")
+        async for event in events:
+            if await request.is_disconnected():
+                break
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if isinstance(content, str) and content:
+                    yield _sse("token", {"content": content})
+            elif kind == "on_tool_start":
+                yield _sse("tool_start", {"run_id": event["run_id"], "name": event["name"], "input": event["data"].get("input")})
+            elif kind == "on_tool_end":
+                yield _sse("tool_end", {"run_id": event["run_id"], "name": event["name"]})
+            elif kind == "on_chain_end" and event["name"] == "LangGraph":
+                state = event["data"]["output"]
+                yield _sse("final", {"answer": state["messages"][-1].content, "llm_calls": state["llm_calls"]})
+    except Exception as e:
+        yield _sse("error", {"message": str(e)})
+    finally:
+        try:
+            if events is not None:
+                # Breaking out of the loop leaves the run going until the generator is collected
+                await events.aclose()
+        finally:
+            _analysis_slots.release()
+
+
+@app.post("/analyze")
+async def analyze(body: AnalysisRequest, request: Request):
+    try:
+        await asyncio.wait_for(_analysis_slots.acquire(), timeout=ANALYSIS_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return JSONResponse({"detail": "Too many concurrent analyses, retry later."}, status_code=503)
+
+    stream = _stream_analysis(request, body.query)
+    # Advance into the generator's try block right away, so the slot is released even if
+    # the client goes away before the response body is ever iterated
+    first_event = await stream.__anext__()
+
+    async def events():
+        try:
+            yield first_event
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # Closing this wrapper (client gone, server cancelling the response) does not close
+            # the inner generator, which would keep the slot until it is garbage collected
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    if is_ready():
+        return {"status": "ready"}
+    return JSONResponse({"status": "warming_up", "errors": warmup_errors()}, status_code=503)
+
+
+@app.get("/stats")
+async def stats():
+    return {"query_cache": query_cache_stats(), "report_cache": get_report_cache().stats(), "metrics": metrics_snapshot()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def main():
+    import uvicorn
+    uvicorn.run(
+        "src.api:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        workers=int(os.getenv("API_WORKERS", "1")),
+    )
+
+
+if __name__ == "__main__":
+    main()
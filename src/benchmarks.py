@@ -0,0 +1,383 @@
+'''Offline benchmarks for ingestion, retrieval, report hydration and the agent graph.
+
+Everything runs against fake embeddings and the scripted chat model inside a scratch
+directory, so no API key is needed and the real data/ directory is left untouched:
+
+    python -m src.benchmarks --output benchmarks/results.json
+    python -m src.benchmarks --baseline benchmarks/results.json --output benchmarks/new.json
+'''
+from pathlib import Path
+import numpy as np
+import subprocess
+import argparse
+import platform
+import tempfile
+import random
+import json
+import time
+import csv
+import sys
+import os
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+RAW_DATA_DIR = REPO_ROOT / "data" / "raw"
+
+BENCHMARK_QUERIES = [
+    "facial recognition misidentifies people of color",
+    "autonomous vehicle collision with pedestrian",
+    "chatbot produces harmful or toxic content",
+    "hiring algorithm discriminates against women",
+    "deepfake videos used for election misinformation",
+    "privacy violations from surveillance systems",
+    "recommendation algorithm exposes children to inappropriate content",
+    "medical diagnosis model gives unsafe advice",
+    "credit scoring bias against minorities",
+    "large language model hallucinates legal citations",
+    "predictive policing reinforces discrimination",
+    "loss of human oversight over automated decisions",
+]
+
+
+def _configure_environment(workdir: Path):
+    '''Point every service at the scratch directory before any of them is imported.
+
+    The services read their configuration from the environment at import time, which is why
+    the rest of this module imports them inside the benchmark functions. Values are assigned
+    over anything exported or loaded from .env, so a benchmark never calls a remote model or
+    writes into the real data/ stores.
+    '''
+    overrides = {
+        "EMBEDDING_MODEL_NAME": "fake",
+        "CHAT_MODEL_BACKEND": "fake",
+        "LLM_CACHE_ENABLED": "false",
+        "QUERY_CACHE_ENABLED": "false",
+        "CHROMA_PERSIST_DIR": str(workdir / "chroma"),
+        "EMBEDDING_CACHE_PATH": str(workdir / "cache" / "embeddings.sqlite"),
+        "DUCKDB_PATH": str(workdir / "duckdb" / "reports.duckdb"),
+        "PDF_ELEMENT_CACHE_PATH": str(workdir / "cache" / "pdf_elements.duckdb"),
+        "REPORTS_DATA_PATH": str(workdir / "raw" / "reports.csv"),
+        "REPORTS_PARQUET_PATH": "",
+        "AI_RISK_DATA_DIR": str(RAW_DATA_DIR / "ai_risk_database_v3.csv"),
+        "INCIDENTS_DATA_DIR": str(RAW_DATA_DIR / "incidents.csv"),
+        "PROPRIETARY_FRAMEWORK_DATA_DIR": str(RAW_DATA_DIR / "PL_2338-2023.pdf"),
+    }
+    for name, value in overrides.items():
+        if os.environ.get(name, value) != value:
+            print(f"Ignoring {name}={os.environ[name]} for the offline benchmark", file=sys.stderr)
+        os.environ[name] = value
+
+
+def latency_summary(samples_ms: list[float]) -> dict:
+    values = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) if len(values) else (0.0, 0.0, 0.0)
+    return {
+        'n': len(values),
+        'mean_ms': float(values.mean()) if len(values) else 0.0,
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+    }
+
+
+def time_calls(fn, inputs: list, iterations: int = 1) -> list[float]:
+    samples = []
+    for _ in range(iterations):
+        for args in inputs:
+            started = time.perf_counter()
+            fn(*args)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def write_synthetic_reports(path: Path, incidents_path: Path, seed: int = 0) -> int:
+    '''Write a reports.csv large enough to resolve every report reference in incidents.csv.'''
+    max_ref = 0
+    with open(incidents_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                refs = json.loads(row.get('reports') or '[]')
+            except json.JSONDecodeError:
+                continue
+            max_ref = max([max_ref] + [ref for ref in refs if isinstance(ref, int)])
+
+    rng = random.Random(seed)
+    words = [w for q in BENCHMARK_QUERIES for w in q.split()]
+    columns = [
+        '_id', 'authors', 'date_downloaded', 'date_modified', 'date_published', 'date_submitted',
+        'description', 'epoch_date_downloaded', 'epoch_date_modified', 'epoch_date_published',
+        'epoch_date_submitted', 'image_url', 'language', 'ref_number', 'report_number',
+        'source_domain', 'submitters', 'text', 'title', 'url', 'tags'
+    ]
+    # Reference n points at CSV line n (header is line 1), so n - 1 data rows are needed
+    rows = max(max_ref - 1, 0)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for i in range(rows):
+            epoch = str(1_500_000_000 + i * 3600)
+            writer.writerow({
+                '_id': f"ObjectId({i:024x})",
+                'authors': '["benchmark"]',
+                'date_downloaded': '2024-01-01',
+                'date_modified': '2024-01-01',
+                'date_published': f"20{15 + i % 10}-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                'date_submitted': '2024-01-01',
+                'description': " ".join(rng.choices(words, k=30)),
+                'epoch_date_downloaded': "{'$numberDouble': 'NaN'}" if i % 11 == 0 else epoch,
+                'epoch_date_modified': epoch,
+                'epoch_date_published': epoch,
+                'epoch_date_submitted': epoch,
+                'image_url': f"https://example.com/{i}.png",
+                'language': 'en',
+                'ref_number': str(i),
+                'report_number': str(i + 1),
+                'source_domain': 'example.com',
+                'submitters': '["benchmark"]',
+                'text': " ".join(rng.choices(words, k=400)),
+                'title': f"Report {i + 1}: " + " ".join(rng.choices(words, k=6)),
+                'url': f"https://example.com/reports/{i}",
+                'tags': '[]',
+            })
+    return rows
+
+
+def _sync_stats(ingest, collection_name: str) -> dict:
+    from .services.ingestion_manifest_service import IngestionManifest
+    from .services.vector_store_service import VectorStoreService
+
+    started = time.perf_counter()
+    ingest()
+    cold_seconds = time.perf_counter() - started
+    # Second pass over unchanged sources measures the manifest diff alone
+    started = time.perf_counter()
+    ingest()
+    resync_seconds = time.perf_counter() - started
+
+    manifest = IngestionManifest.load(VectorStoreService.storage_name(collection_name))
+    records = len(manifest.entries) if manifest else 0
+    return {
+        'records': records,
+        'chunks': VectorStoreService().count(collection_name),
+        'cold_seconds': cold_seconds,
+        'rows_per_sec': records / cold_seconds if cold_seconds else 0.0,
+        'resync_seconds': resync_seconds,
+    }
+
+
+def bench_etl() -> dict:
+    from .services.incidents_reports_etl_service import create_reports_table, REPORTS_DATA_PATH
+    from .services.ai_risk_etl_service import ingest_ai_risk_csv
+    from .services.incidents_etl_service import ingest_incidents_csv, INCIDENTS_DATA_DIR
+
+    results = {}
+
+    rows = write_synthetic_reports(Path(REPORTS_DATA_PATH), Path(INCIDENTS_DATA_DIR))
+    started = time.perf_counter()
+    create_reports_table().close()
+    elapsed = time.perf_counter() - started
+    results['reports_table'] = {'records': rows, 'cold_seconds': elapsed, 'rows_per_sec': rows / elapsed if elapsed else 0.0}
+
+    results['ai_risk'] = _sync_stats(ingest_ai_risk_csv, "ai_risk_database_v3")
+    results['incidents'] = _sync_stats(ingest_incidents_csv, "incidents_database")
+
+    try:
+        from .services.proprietary_framework_etl_service import ingest_proprietary_framework
+        results['proprietary_framework'] = _sync_stats(ingest_proprietary_framework, "reports_database")
+    except Exception as e:
+        # PDF parsing needs the optional unstructured[pdf] stack
+        results['proprietary_framework'] = {'error': f"{type(e).__name__}: {e}"}
+    return results
+
+
+def bench_retrieval(iterations: int, top_k: int = 5) -> dict:
+    from .services.vector_store_service import VectorStoreService
+    from .services.retrieval_service import get_ensembled_retriever
+
+    inputs = [(query, top_k) for query in BENCHMARK_QUERIES]
+    results = {}
+    for collection_name in ("ai_risk_database_v3", "incidents_database"):
+        retriever = get_ensembled_retriever(VectorStoreService().get_or_create_collection(collection_name))
+        if retriever is None:
+            results[collection_name] = {'error': 'collection is empty'}
+            continue
+        results[collection_name] = {
+            'bm25': latency_summary(time_calls(retriever.lexical_search, inputs, iterations)),
+            'vector': latency_summary(time_calls(retriever.vector_search, inputs, iterations)),
+            'hybrid': latency_summary(time_calls(
+                lambda query, k: retriever.invoke(query, top_k=k), inputs, iterations
+            )),
+        }
+    return results
+
+
+def bench_hydration(iterations: int, top_k: int = 5) -> dict:
+    from .services.vector_store_service import VectorStoreService
+    from .services.report_repository_service import get_report_repository, ReportCache
+
+    collection = VectorStoreService().get_or_create_collection("incidents_database")
+    metadatas = collection.get(include=["metadatas"])["metadatas"]
+    groups = []
+    for metadata in metadatas:
+        refs = json.loads(metadata.get('reports') or '[]')
+        groups.append([int(ref) - 2 for ref in refs])
+
+    # Batches shaped like one search_incidents call: top_k incidents hydrated together
+    rng = random.Random(0)
+    batches = [(rng.sample(groups, min(top_k, len(groups))),) for _ in range(len(BENCHMARK_QUERIES))]
+    repository = get_report_repository()
+    cache = ReportCache()
+
+    return {
+        'reports_per_batch': float(np.mean([sum(len(g) for g in batch[0]) for batch in batches])) if batches else 0.0,
+        'repository': latency_summary(time_calls(repository.reports_by_group, batches, iterations)),
+        'cache_cold': latency_summary(time_calls(cache.reports_by_group, batches)),
+        'cache_warm': latency_summary(time_calls(cache.reports_by_group, batches, iterations)),
+    }
+
+
+def bench_cold_import(runs: int = 3) -> dict:
+    '''Time `import src.main` in fresh interpreters, which is what every CLI or worker start pays.'''
+    script = "import time; started = time.perf_counter(); import src.main; print(time.perf_counter() - started)"
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", script], cwd=REPO_ROOT, env=os.environ.copy(),
+            capture_output=True, text=True, check=True
+        ).stdout
+        process_seconds = time.perf_counter() - started
+        samples.append((float(output.strip().splitlines()[-1]) * 1000, process_seconds * 1000))
+    return {
+        'import': latency_summary([s[0] for s in samples]),
+        'process': latency_summary([s[1] for s in samples]),
+    }
+
+
+def bench_graph(iterations: int) -> dict:
+    from langchain.messages import HumanMessage
+    from .main import rag_agent
+
+    node_samples: dict[str, list[float]] = {}
+    total_samples = []
+    for _ in range(iterations):
+        for query in BENCHMARK_QUERIES:
+            inputs = {"messages": [HumanMessage(content=query)], "llm_calls": 0}
+            started = last = time.perf_counter()
+            for update in rag_agent.stream(inputs, stream_mode="updates"):
+                now = time.perf_counter()
+                for node in update:
+                    node_samples.setdefault(node, []).append((now - last) * 1000)
+                last = now
+            total_samples.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'nodes': {node: latency_summary(samples) for node, samples in node_samples.items()},
+        'end_to_end': latency_summary(total_samples),
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def find_regressions(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    '''Compare latencies (*_ms, *_seconds, lower is better) and throughputs (*_per_sec, higher is better).'''
+    old, new = _flatten(baseline), _flatten(current)
+    regressions = []
+    for metric, old_value in old.items():
+        if metric.startswith("meta.") or metric not in new or not old_value:
+            continue
+        new_value = new[metric]
+        if metric.endswith(("_ms", "_seconds")) and new_value > old_value * (1 + tolerance):
+            regressions.append(f"{metric}: {old_value:.2f} -> {new_value:.2f}")
+        elif metric.endswith("_per_sec") and new_value < old_value * (1 - tolerance):
+            regressions.append(f"{metric}: {old_value:.2f} -> {new_value:.2f}")
+    return regressions
+
+
+def run_benchmarks(workdir: Path, iterations: int, skip: set[str]) -> dict:
+    _configure_environment(workdir)
+    from .services.vector_store_service import EMBEDDING_MODEL_NAME
+
+    results = {
+        'meta': {
+            'git_commit': _git_commit(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'chat_model_backend': os.environ["CHAT_MODEL_BACKEND"],
+            'iterations': iterations,
+        }
+    }
+    # ETL runs first since every other stage reads what it ingested
+    stages = [
+        ('etl', bench_etl),
+        ('retrieval', lambda: bench_retrieval(iterations)),
+        ('hydration', lambda: bench_hydration(iterations)),
+        ('cold_import', bench_cold_import),
+        ('graph', lambda: bench_graph(iterations)),
+    ]
+    for name, stage in stages:
+        if name in skip:
+            continue
+        # Progress goes to stderr, stdout carries only the JSON payload
+        print(f"Running {name} benchmark...", file=sys.stderr)
+        started = time.perf_counter()
+        results[name] = stage()
+        print(f"{name} done in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this path (default: stdout)")
+    parser.add_argument("--iterations", type=int, default=5, help="Passes over the benchmark queries")
+    parser.add_argument("--workdir", help="Scratch directory for the indexes (default: a temporary directory)")
+    parser.add_argument("--skip", action="append", default=[],
+                        choices=["etl", "retrieval", "hydration", "cold_import", "graph"])
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+    if "etl" in args.skip and not args.workdir:
+        parser.error("--skip etl needs --workdir pointing at the scratch directory of an earlier run")
+
+    with tempfile.TemporaryDirectory(prefix="ai-ethics-bench-") as tmp:
+        results = run_benchmarks(Path(args.workdir or tmp), args.iterations, set(args.skip))
+
+    payload = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(payload, encoding="utf-8")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(payload)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = find_regressions(baseline, results, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
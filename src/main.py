@@ -4,27 +4,41 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from langchain.messages import AnyMessage, SystemMessage, ToolMessage, HumanMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
-from typing_extensions import TypedDict, Annotated
+from langchain_core.runnables import RunnableLambda
+from typing_extensions import TypedDict, Annotated, NotRequired
 from langgraph.graph import StateGraph, END
-import operator
+from langgraph.graph.message import add_messages
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import asyncio
+import time
 import os
 from .tools.rags.incidents_rag import search_incidents
 from .tools.rags.risk_rag import search_risks
+from .tools.rags.document_lookup import get_document
+from .tools.rags.reports_search import search_reports
+from .services.chat_model_service import get_chat_model
+from .services.telemetry_service import get_logger, record_llm_call, TOOL_CALL_SECONDS
+from .services.context_budget_service import compact_tool_results, apply_replacements, estimate_tokens, CONTEXT_TOKEN_BUDGET
 
-from google import genai
+logger = get_logger(__name__)
 
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-pro", temperature=0)
+llm = get_chat_model()
+LLM_MODEL_NAME = getattr(llm, "model", None) or getattr(llm, "model_name", type(llm).__name__)
 
-tools = [search_incidents, search_risks]
+tools = [search_incidents, search_risks, search_reports, get_document]
 
 llm_with_tools = llm.bind_tools(tools)
 
 
 class AgentState(TypedDict):
-    messages: Annotated[list[AnyMessage], operator.add]
+    # Nodes return only new messages; add_messages appends them, or replaces by id when compacting
+    messages: Annotated[list[AnyMessage], add_messages]
     llm_calls: int
+    # Per-request prompt budget in estimated tokens, CONTEXT_TOKEN_BUDGET when not given
+    token_budget: NotRequired[int]
+    # Estimated size of the last prompt sent to the model
+    context_tokens: NotRequired[int]
 
 def should_continue(state: AgentState) -> bool:
     """Check if the last message contains a tool call."""
@@ -38,37 +52,190 @@ system_prompt = """
         including the nature of the risk, the potential consequences, the parties involved, and any ethical considerations. Use the search results to inform your analysis, and ensure that your summary is clear, concise, and informative. 
         Focus on providing insights into the ethical implications of the risk and any lessons that can be learned from it."
         Please always cite the specific parts of the documents you use in your answers.
+        Search results are compact summaries that start with an id in brackets, such as [I:12#0]; cite results by that id,
+        and call get_document with it when you need the full record of a result.
+        Use search_reports to find specific evidence (quotes, names, figures) in the full text of the incident reports.
     """
  
 tools_dict = {tool.name: tool for tool in tools}
 
-def call_llm(state: AgentState) -> AgentState:
-    '''Call the LLM with the current state messages and return the new state with updated messages and incremented LLM call count.'''
-    new_message = llm_with_tools.invoke([SystemMessage(content=system_prompt)] + state["messages"])
-    return {"messages": state["messages"] + [new_message], "llm_calls": state["llm_calls"] + 1}
+def _prepare_prompt(state: AgentState) -> tuple[list[AnyMessage], list[ToolMessage], int]:
+    '''Build the prompt within the request's token budget, compacting older tool results if needed.'''
+    system_message = SystemMessage(content=system_prompt)
+    replacements, context_tokens = compact_tool_results(
+        state["messages"],
+        state.get("token_budget", CONTEXT_TOKEN_BUDGET),
+        reserved_tokens=estimate_tokens([system_message])
+    )
+    return [system_message] + apply_replacements(state["messages"], replacements), replacements, context_tokens
 
-def retriever_action(state: AgentState) -> AgentState:
-    '''Execute tool calls from the LLM's response and return the new state with tool call results added as messages.'''
+def call_llm(state: AgentState) -> dict:
+    '''Call the LLM with the current state messages and return the new message, any compacted tool results and the incremented LLM call count.'''
+    prompt, replacements, context_tokens = _prepare_prompt(state)
+    started = time.perf_counter()
+    new_message = llm_with_tools.invoke(prompt)
+    record_llm_call(LLM_MODEL_NAME, time.perf_counter() - started, new_message)
+    return {"messages": replacements + [new_message], "llm_calls": state["llm_calls"] + 1, "context_tokens": context_tokens}
+
+async def acall_llm(state: AgentState) -> dict:
+    '''Async counterpart of call_llm, used when the graph runs through ainvoke/astream.'''
+    prompt, replacements, context_tokens = _prepare_prompt(state)
+    started = time.perf_counter()
+    new_message = await llm_with_tools.ainvoke(prompt)
+    record_llm_call(LLM_MODEL_NAME, time.perf_counter() - started, new_message)
+    return {"messages": replacements + [new_message], "llm_calls": state["llm_calls"] + 1, "context_tokens": context_tokens}
+
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "60"))
+# Per-tool overrides of TOOL_TIMEOUT_SECONDS
+TOOL_TIMEOUTS = {
+    search_incidents.name: float(os.getenv("SEARCH_INCIDENTS_TIMEOUT_SECONDS", str(TOOL_TIMEOUT_SECONDS))),
+    search_risks.name: float(os.getenv("SEARCH_RISKS_TIMEOUT_SECONDS", str(TOOL_TIMEOUT_SECONDS))),
+}
+
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+# Shared across turns so a timed-out call never blocks the graph waiting for a pool shutdown
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+# A thread cannot be interrupted, so a timed-out call keeps its worker until it returns. Past this
+# many such calls, new calls are refused instead of queueing behind the stuck workers.
+TOOL_MAX_ABANDONED = max(1, TOOL_MAX_WORKERS // 2)
+
+class _ToolRun:
+    '''One submitted tool call. Its duration is recorded once, by whichever of completion or timeout comes first.'''
+
+    abandoned = 0
+    _abandoned_lock = threading.Lock()
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self._settled = False
+        self._lock = threading.Lock()
+
+    def _settle(self) -> bool:
+        with self._lock:
+            settled, self._settled = self._settled, True
+        return not settled
+
+    def finish(self, status: str):
+        if self._settle():
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - self.started, tool=self.name, status=status)
+        else:
+            # Timed out earlier and already recorded; it only gives its worker back now
+            with _ToolRun._abandoned_lock:
+                _ToolRun.abandoned -= 1
+
+    def abandon(self, timeout: float) -> bool:
+        '''Record a timeout; False if the call completed in the meantime.'''
+        if not self._settle():
+            return False
+        TOOL_CALL_SECONDS.observe(timeout, tool=self.name, status="timeout")
+        with _ToolRun._abandoned_lock:
+            _ToolRun.abandoned += 1
+        return True
+
+def _invoke_tool(run: _ToolRun, args: dict):
+    try:
+        result = tools_dict[run.name].invoke(args)
+    except Exception:
+        run.finish("error")
+        raise
+    run.finish("ok")
+    return result
+
+def _log_tool_result(name: str, result: str):
+    # Results can still be several KB, only their size is worth logging outside of debugging
+    logger.info(f"Tool {name} returned {len(result)} chars")
+    logger.debug(f"Result from tool {name}: {result}")
+
+def retriever_action(state: AgentState) -> dict:
+    '''Execute tool calls from the LLM's response concurrently and return the new state with tool call results added as messages.'''
 
     tool_calls = state['messages'][-1].tool_calls # type: ignore
-    results = []
+    started = time.monotonic()
+    pending = []
     for t in tool_calls:
-        print(f"Calling tool: {t['name']} with queries: {t['args'].get('query', 'No query provided')}")
+        logger.info(f"Calling tool: {t['name']} with args: {t['args']}")
 
         if not t['name'] in tools_dict:
-            print(f"Tool {t['name']} not found in tools_dict. Skipping.")
+            logger.warning(f"Tool {t['name']} not found in tools_dict. Skipping.")
+            pending.append((t, None, None))
+        elif _ToolRun.abandoned >= TOOL_MAX_ABANDONED:
+            logger.warning(f"{_ToolRun.abandoned} timed-out tool calls still hold workers, refusing {t['name']}")
+            pending.append((t, None, None))
+        else:
+            run = _ToolRun(t['name'])
+            pending.append((t, run, tool_executor.submit(_invoke_tool, run, t['args'])))
+
+    # Collect in the order the model requested the calls, each against its own deadline
+    results = []
+    for t, run, future in pending:
+        if future is None and t['name'] in tools_dict:
+            result = f"Tool {t['name']} is unavailable: earlier calls are still running. Continue without it."
+        elif future is None:
             result  = f"Tool {t['name']} not found. Please Retry and Select a valid tool from the list of available tools."
         else:
-            result = tools_dict[t['name']].invoke(t['args'].get('query', ''))
-            print(f"Result from tool {t['name']}: {result}")
-        results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=str(result)))
+            timeout = TOOL_TIMEOUTS.get(t['name'], TOOL_TIMEOUT_SECONDS)
+            try:
+                result = str(future.result(timeout=max(0.0, started + timeout - time.monotonic())))
+                _log_tool_result(t['name'], result)
+            except FutureTimeoutError:
+                if future.cancel():
+                    # Still queued behind other calls, it will never run
+                    run.finish("timeout")
+                else:
+                    # Running: it finishes in the background, holding its worker until then
+                    run.abandon(timeout)
+                logger.warning(f"Tool {t['name']} timed out after {timeout}s.")
+                result = f"Tool {t['name']} timed out after {timeout} seconds. Try a narrower query or continue without it."
+            except Exception as e:
+                logger.error(f"Tool {t['name']} failed: {e}")
+                result = f"Tool {t['name']} failed with error: {e}"
+        results.append(ToolMessage(tool_call_id=t['id'], name=t['name'], content=result))
     
-    print("Tool calls completed. Updating state with results. Back to the model!")
-    return {"messages": state["messages"] + results, "llm_calls": state["llm_calls"]}
+    logger.info("Tool calls completed. Updating state with results. Back to the model!")
+    return {"messages": results}
+
+async def _arun_tool_call(t) -> str:
+    if not t['name'] in tools_dict:
+        logger.warning(f"Tool {t['name']} not found in tools_dict. Skipping.")
+        return f"Tool {t['name']} not found. Please Retry and Select a valid tool from the list of available tools."
+
+    timeout = TOOL_TIMEOUTS.get(t['name'], TOOL_TIMEOUT_SECONDS)
+    started = time.perf_counter()
+    try:
+        result = str(await asyncio.wait_for(tools_dict[t['name']].ainvoke(t['args']), timeout=timeout))
+        TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=t['name'], status="ok")
+        _log_tool_result(t['name'], result)
+        return result
+    except asyncio.TimeoutError:
+        TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=t['name'], status="timeout")
+        logger.warning(f"Tool {t['name']} timed out after {timeout}s.")
+        return f"Tool {t['name']} timed out after {timeout} seconds. Try a narrower query or continue without it."
+    except Exception as e:
+        TOOL_CALL_SECONDS.observe(time.perf_counter() - started, tool=t['name'], status="error")
+        logger.error(f"Tool {t['name']} failed: {e}")
+        return f"Tool {t['name']} failed with error: {e}"
+
+async def aretriever_action(state: AgentState) -> dict:
+    '''Async counterpart of retriever_action: runs all tool calls of the turn concurrently on the event loop.'''
+    tool_calls = state['messages'][-1].tool_calls # type: ignore
+    for t in tool_calls:
+        logger.info(f"Calling tool: {t['name']} with args: {t['args']}")
+
+    # gather keeps the results in the order the model requested the calls
+    contents = await asyncio.gather(*(_arun_tool_call(t) for t in tool_calls))
+    results = [
+        ToolMessage(tool_call_id=t['id'], name=t['name'], content=content)
+        for t, content in zip(tool_calls, contents)
+    ]
+
+    logger.info("Tool calls completed. Updating state with results. Back to the model!")
+    return {"messages": results}
 
 graph = StateGraph(AgentState)
-graph. add_node("llm", call_llm)
-graph.add_node("retriever", retriever_action)
+# Each node has a sync and an async body, so rag_agent supports invoke/stream as well as ainvoke/astream
+graph.add_node("llm", RunnableLambda(call_llm, afunc=acall_llm))
+graph.add_node("retriever", RunnableLambda(retriever_action, afunc=aretriever_action))
 
 graph.add_conditional_edges(
     "llm",
@@ -97,5 +264,10 @@ def running_agent():
         print("Result:", result["messages"][-1].content)
         llm_calls = result["llm_calls"]
 
+async def arun_agent(user_input: str, llm_calls: int = 0) -> AgentState:
+    '''Run one analysis on the async path; many of these can share one event loop.'''
+    messages: list[AnyMessage] = [HumanMessage(content=user_input)]
+    return await rag_agent.ainvoke({"messages": messages, "llm_calls": llm_calls}) # type: ignore
+
 if __name__ == "__main__":
     running_agent()
\ No newline at end of file
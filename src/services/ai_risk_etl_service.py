@@ -1,6 +1,6 @@
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from .vector_store_service import VectorStoreService
+from .ingestion_manifest_service import sync_documents
 from datetime import datetime
 import os
 import csv
@@ -10,15 +10,23 @@ AI_RISK_DATA_DIR = os.getenv("AI_RISK_DATA_DIR", "data/raw/ai_risk_database_v3.c
 vectorStoreService = VectorStoreService()
 
 
-def ingest_ai_risk_csv(chunk_size: int = 1000, chunk_overlap: int = 200):
-    processed_docs = []
+def iter_ai_risk_documents():
+    '''Yield (source_key, Document) pairs for each row of the AI risk database.'''
+    ingestion_date = datetime.now().strftime('%Y-%m-%d')
+    key_counts = {}
 
     with open(AI_RISK_DATA_DIR, "r", encoding="utf-8") as csvfile: 
         reader = csv.DictReader(csvfile)
-        for row in reader:
+        for row_number, row in enumerate(reader):
+            # Ev_ID is not unique across the whole sheet, disambiguate repeats by occurrence
+            ev_id = row.get('Ev_ID', '') or f"row-{row_number}"
+            occurrence = key_counts.get(ev_id, 0)
+            key_counts[ev_id] = occurrence + 1
+            source_key = ev_id if occurrence == 0 else f"{ev_id}~{occurrence}"
+
             metadata = {
                 'source': 'ai_risk_database_v3.csv',
-                'ingestion_date': datetime.now().strftime('%Y-%m-%d'),
+                'ingestion_date': ingestion_date,
                 'data_owner': 'AI Ethics Team',
                 'title': row.get('Title', ''),
                 'risk_category': row.get('Risk category', ''),
@@ -48,10 +56,14 @@ def ingest_ai_risk_csv(chunk_size: int = 1000, chunk_overlap: int = 200):
             page_content = "\n".join(content_parts) 
 
             if page_content:
-                processed_docs.append(Document(page_content=page_content, metadata=metadata))
-    
-    text_spliter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    split_docs = text_spliter.split_documents(processed_docs)
+                yield source_key, Document(page_content=page_content, metadata=metadata)
 
-    vector_db = vectorStoreService.ingest_documents(split_docs, collection_name="ai_risk_database_v3")
+
+def ingest_ai_risk_csv(chunk_size: int = 1000, chunk_overlap: int = 200):
+    vector_db = sync_documents(
+        iter_ai_risk_documents(),
+        collection_name="ai_risk_database_v3",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
     return vector_db
\ No newline at end of file
@@ -0,0 +1,142 @@
+from langchain_core.documents import Document
+from langchain_chroma import Chroma
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Iterable
+from .telemetry_service import get_logger, span, INGESTED_CHUNKS
+import time
+import os
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100"))
+INGEST_MAX_WORKERS = int(os.getenv("INGEST_MAX_WORKERS", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
+INGEST_RETRY_BACKOFF = float(os.getenv("INGEST_RETRY_BACKOFF", "2.0"))
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class IngestionReport:
+    total: int = 0
+    # Only a count of the written chunks, so streaming a large source keeps memory flat
+    written: int = 0
+    failed_ids: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> bool:
+        return not self.failed_ids
+
+
+def _with_retries(fn, description: str, max_retries: int, backoff: float):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            delay = backoff ** attempt
+            logger.warning(f"{description} failed ({e}), retrying in {delay:.1f}s ({attempt}/{max_retries})")
+            time.sleep(delay)
+
+
+class BatchIngestor:
+    '''Embeds documents in bounded parallel batches and writes each batch to Chroma as soon as it is ready.
+
+    Embedding runs on a thread pool, since it is dominated by network round trips, while
+    writes happen on the calling thread so the persisted store only ever sees one writer.
+    A batch that keeps failing after its retries is reported back instead of aborting the run.
+    '''
+
+    def __init__(self, batch_size: int = INGEST_BATCH_SIZE, max_workers: int = INGEST_MAX_WORKERS,
+                 max_retries: int = INGEST_MAX_RETRIES, retry_backoff: float = INGEST_RETRY_BACKOFF):
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _embed_batch(self, collection: Chroma, texts: list[str], batch_number: int) -> list[list[float]]:
+        with span("ingest.embed_batch", collection=collection._collection.name, batch=batch_number, size=len(texts)):
+            return _with_retries(
+                lambda: collection.embeddings.embed_documents(texts), # type: ignore
+                f"Embedding batch {batch_number}",
+                self.max_retries,
+                self.retry_backoff
+            )
+
+    def _write_batch(self, collection: Chroma, batch: list[tuple[str, Document]],
+                     embeddings: list[list[float]], batch_number: int):
+        with span("ingest.write_batch", collection=collection._collection.name, batch=batch_number, size=len(batch)):
+            _with_retries(
+                lambda: collection._collection.upsert(
+                    ids=[doc_id for doc_id, _ in batch],
+                    embeddings=embeddings, # type: ignore
+                    documents=[doc.page_content for _, doc in batch],
+                    metadatas=[doc.metadata for _, doc in batch] # type: ignore
+                ),
+                f"Writing batch {batch_number}",
+                self.max_retries,
+                self.retry_backoff
+            )
+
+    def ingest(self, collection: Chroma, documents: list[Document], ids: list[str]) -> IngestionReport:
+        return self.ingest_stream(collection, zip(ids, documents))
+
+    def ingest_stream(self, collection: Chroma, pairs: Iterable[tuple[str, Document]],
+                      on_batch: Callable[[list[str], bool], None] | None = None) -> IngestionReport:
+        '''Embed and write (id, document) pairs as they are produced.
+
+        `pairs` is only pulled from while fewer than two batches per worker are in flight, so a
+        lazy source is never read further ahead than that. `on_batch(ids, ok)` runs on the calling
+        thread after each batch is written or has failed, in completion order, batches that
+        complete together in the order they were read.
+        '''
+        report = IngestionReport()
+        started = time.perf_counter()
+        source = iter(pairs)
+        name = collection._collection.name
+
+        in_flight: dict[Future, tuple[int, list[tuple[str, Document]]]] = {}
+        next_batch = 0
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as executor:
+            while not exhausted or in_flight:
+                # Keep at most two batches per worker queued so memory stays bounded
+                while not exhausted and len(in_flight) < self.max_workers * 2:
+                    batch = list(islice(source, self.batch_size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    report.total += len(batch)
+                    future = executor.submit(self._embed_batch, collection, [doc.page_content for _, doc in batch], next_batch)
+                    in_flight[future] = (next_batch, batch)
+                    next_batch += 1
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                # `done` is a set; batches that finished together are written in the order they were read
+                for future in sorted(done, key=lambda future: in_flight[future][0]):
+                    batch_number, batch = in_flight.pop(future)
+                    batch_ids = [doc_id for doc_id, _ in batch]
+                    try:
+                        self._write_batch(collection, batch, future.result(), batch_number)
+                        report.written += len(batch_ids)
+                        INGESTED_CHUNKS.inc(len(batch_ids), collection=name, status="written")
+                        ok = True
+                    except Exception as e:
+                        logger.error(f"Error ingesting batch {batch_number} into {name}: {e}")
+                        report.failed_ids.extend(batch_ids)
+                        INGESTED_CHUNKS.inc(len(batch_ids), collection=name, status="failed")
+                        ok = False
+                    if on_batch is not None:
+                        on_batch(batch_ids, ok)
+                    logger.info(f"Ingested {report.written} chunks into {name}"
+                                f" ({len(report.failed_ids)} failed)")
+
+        report.elapsed = time.perf_counter() - started
+        return report
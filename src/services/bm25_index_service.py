@@ -0,0 +1,325 @@
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_chroma import Chroma
+from .vector_store_service import CHROMA_PERSIST_DIR
+from .telemetry_service import get_logger
+from pathlib import Path
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from scipy.sparse import csr_matrix
+import numpy as np
+import threading
+import shutil
+import json
+import re
+
+BM25_INDEX_DIR = Path(CHROMA_PERSIST_DIR).parent / "bm25"
+BM25_FORMAT_VERSION = 2
+
+logger = get_logger(__name__)
+
+# Metadata fields that get a precomputed column for filtering
+FILTERABLE_FIELDS = (
+    'source', 'risk_category', 'risk_subcategory', 'entity', 'intent', 'timing',
+    'domain', 'sub_domain', 'incident_date', 'deployer', 'developer',
+)
+_MASK_CACHE_SIZE = 128
+_RANGE_OPERATORS = {'gte', 'gt', 'lte', 'lt'}
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    '''Okapi BM25 index persisted as a sparse term-document matrix.
+
+    The matrix holds precomputed BM25 weights in CSR layout (one row per term), so scoring
+    a query is a single sparse product over the rows of its terms. Filterable metadata is
+    stored as per-field value codes, which are turned into boolean masks on demand and cached.
+    Documents live in a JSON-lines file read by offset, so loading the index maps the arrays
+    from disk instead of reading the corpus back into memory.
+    '''
+
+    def __init__(self, vocabulary: dict[str, int], term_indptr: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, doc_lengths: np.ndarray, idf: np.ndarray,
+                 filter_values: dict[str, list[str]], filter_codes: dict[str, np.ndarray],
+                 meta: dict, path: Path | None = None, doc_offsets: np.ndarray | None = None,
+                 documents: list[Document] | None = None):
+        self.vocabulary = vocabulary
+        self.doc_lengths = doc_lengths
+        self.idf = idf
+        self.filter_values = filter_values
+        self.filter_codes = filter_codes
+        self.meta = meta
+        self.path = path
+        self.doc_offsets = doc_offsets
+        self._documents = documents
+        self._mask_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        # Tool calls and retriever legs share the index across threads
+        self._mask_lock = threading.Lock()
+        self.matrix = csr_matrix(
+            (weights, doc_ids, term_indptr),
+            shape=(len(vocabulary), int(meta['num_docs']))
+        )
+
+    @property
+    def version(self) -> str:
+        return self.meta['version']
+
+    @property
+    def num_docs(self) -> int:
+        return int(self.meta['num_docs'])
+
+    @classmethod
+    def build(cls, ids: list[str], texts: list[str], metadatas: list[dict], version: str,
+              k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocabulary: dict[str, int] = {}
+        postings: list[dict[int, int]] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for doc_idx, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_idx] = len(tokens)
+            counts: dict[int, int] = {}
+            for token in tokens:
+                term_id = vocabulary.setdefault(token, len(vocabulary))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            for term_id, count in counts.items():
+                if term_id == len(postings):
+                    postings.append({})
+                postings[term_id][doc_idx] = count
+
+        term_indptr = np.zeros(len(vocabulary) + 1, dtype=np.int32)
+        for term_id, term_postings in enumerate(postings):
+            term_indptr[term_id + 1] = term_indptr[term_id] + len(term_postings)
+        doc_ids = np.empty(int(term_indptr[-1]), dtype=np.int32)
+        term_freqs = np.empty(int(term_indptr[-1]), dtype=np.float32)
+        for term_id, term_postings in enumerate(postings):
+            start, end = term_indptr[term_id], term_indptr[term_id + 1]
+            doc_ids[start:end] = list(term_postings.keys())
+            term_freqs[start:end] = list(term_postings.values())
+
+        num_docs = len(texts)
+        avgdl = float(doc_lengths.mean()) if num_docs else 0.0
+        doc_freqs = np.diff(term_indptr).astype(np.float64)
+        idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        # Fold idf and length normalisation into the stored weights so queries only sum them
+        term_of_posting = np.repeat(np.arange(len(vocabulary)), np.diff(term_indptr))
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / (avgdl or 1.0))
+        weights = (idf[term_of_posting] * term_freqs * (k1 + 1) / (term_freqs + norm)).astype(np.float32)
+
+        filter_values, filter_codes = {}, {}
+        metadatas = [metadata or {} for metadata in metadatas]
+        for field in FILTERABLE_FIELDS:
+            column = [metadata.get(field) for metadata in metadatas]
+            values = sorted({str(v) for v in column if v not in (None, '')})
+            if not values:
+                continue
+            value_codes = {v: i for i, v in enumerate(values)}
+            filter_values[field] = values
+            filter_codes[field] = np.array(
+                [value_codes[str(v)] if v not in (None, '') else -1 for v in column], dtype=np.int32
+            )
+
+        meta = {
+            'format': BM25_FORMAT_VERSION,
+            'version': version,
+            'num_docs': num_docs,
+            'avgdl': avgdl,
+            'k1': k1,
+            'b': b,
+        }
+        documents = [
+            Document(id=doc_id, page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        return cls(vocabulary, term_indptr, doc_ids, weights, doc_lengths, idf,
+                   filter_values, filter_codes, meta, documents=documents)
+
+    def save(self, path: Path):
+        '''Write the index atomically to `path`, replacing any previous version.'''
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+
+        np.save(tmp_path / "term_indptr.npy", self.matrix.indptr)
+        np.save(tmp_path / "doc_ids.npy", self.matrix.indices)
+        np.save(tmp_path / "weights.npy", self.matrix.data)
+        np.save(tmp_path / "doc_lengths.npy", self.doc_lengths)
+        np.save(tmp_path / "idf.npy", self.idf)
+        (tmp_path / "vocabulary.json").write_text(json.dumps(self.vocabulary), encoding="utf-8")
+        (tmp_path / "filters.json").write_text(json.dumps(self.filter_values), encoding="utf-8")
+        for field, codes in self.filter_codes.items():
+            np.save(tmp_path / f"filter_{field}.npy", codes)
+
+        offsets = np.zeros(self.num_docs + 1, dtype=np.int64)
+        with open(tmp_path / "documents.jsonl", "wb") as f:
+            for i in range(self.num_docs):
+                doc = self.get_document(i)
+                line = json.dumps({'id': doc.id, 'page_content': doc.page_content, 'metadata': doc.metadata})
+                f.write(line.encode("utf-8") + b"\n")
+                offsets[i + 1] = f.tell()
+        np.save(tmp_path / "doc_offsets.npy", offsets)
+        (tmp_path / "meta.json").write_text(json.dumps(self.meta), encoding="utf-8")
+
+        shutil.rmtree(path, ignore_errors=True)
+        tmp_path.replace(path)
+        self.path = path
+        self.doc_offsets = offsets
+
+    @classmethod
+    def load(cls, path: Path, version: str | None = None) -> "BM25Index | None":
+        '''Memory-map a saved index, returning None if it is missing or built for other contents.'''
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta.get('format') != BM25_FORMAT_VERSION or (version is not None and meta.get('version') != version):
+                return None
+            filter_values = json.loads((path / "filters.json").read_text(encoding="utf-8"))
+            return cls(
+                vocabulary=json.loads((path / "vocabulary.json").read_text(encoding="utf-8")),
+                term_indptr=np.load(path / "term_indptr.npy", mmap_mode="r"),
+                doc_ids=np.load(path / "doc_ids.npy", mmap_mode="r"),
+                weights=np.load(path / "weights.npy", mmap_mode="r"),
+                doc_lengths=np.load(path / "doc_lengths.npy", mmap_mode="r"),
+                idf=np.load(path / "idf.npy", mmap_mode="r"),
+                filter_values=filter_values,
+                filter_codes={
+                    field: np.load(path / f"filter_{field}.npy", mmap_mode="r") for field in filter_values
+                },
+                meta=meta,
+                path=path,
+                doc_offsets=np.load(path / "doc_offsets.npy", mmap_mode="r"),
+            )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load BM25 index from {path}: {e}")
+            return None
+
+    def get_document(self, doc_idx: int) -> Document:
+        if self._documents is not None:
+            return self._documents[doc_idx]
+        assert self.path is not None and self.doc_offsets is not None
+        start, end = int(self.doc_offsets[doc_idx]), int(self.doc_offsets[doc_idx + 1])
+        with open(self.path / "documents.jsonl", "rb") as f:
+            f.seek(start)
+            data = json.loads(f.read(end - start))
+        return Document(id=data['id'], page_content=data['page_content'], metadata=data['metadata'])
+
+    def _field_mask(self, field: str, condition) -> np.ndarray:
+        codes = self.filter_codes.get(field)
+        if codes is None:
+            # Unknown fields cannot match anything
+            return np.zeros(self.num_docs, dtype=bool)
+        values = self.filter_values[field]
+
+        if isinstance(condition, dict):
+            # Values are stored sorted, so a range over values is a range over codes
+            ops = {k.lstrip('$'): str(v) for k, v in condition.items()}
+            if not set(ops) <= _RANGE_OPERATORS:
+                raise ValueError(f"Unsupported filter operators for {field}: {sorted(condition)}")
+            low, high = 0, len(values)
+            if 'gte' in ops:
+                low = max(low, bisect_left(values, ops['gte']))
+            if 'gt' in ops:
+                low = max(low, bisect_right(values, ops['gt']))
+            if 'lte' in ops:
+                high = min(high, bisect_right(values, ops['lte']))
+            if 'lt' in ops:
+                high = min(high, bisect_left(values, ops['lt']))
+            return (codes >= low) & (codes < high)
+
+        wanted = condition if isinstance(condition, (list, tuple, set)) else [condition]
+        value_codes = [i for i, v in enumerate(values) if v in {str(w) for w in wanted}]
+        return np.isin(codes, value_codes)
+
+    def filter_mask(self, filters: dict | None) -> np.ndarray | None:
+        '''Boolean mask of documents matching every field condition in `filters`.
+
+        A condition is a single value, a list of accepted values, or a range such as
+        `{"gte": "2018-01-01", "lt": "2021-01-01"}` compared on the stored string values.
+        '''
+        if not filters:
+            return None
+        key = json.dumps(filters, sort_keys=True, default=str)
+        with self._mask_lock:
+            mask = self._mask_cache.get(key)
+            if mask is not None:
+                self._mask_cache.move_to_end(key)
+                return mask
+
+        # Built outside the lock; two threads missing on the same key just build it twice
+        mask = np.ones(self.num_docs, dtype=bool)
+        for field, condition in filters.items():
+            mask &= self._field_mask(field, condition)
+
+        with self._mask_lock:
+            self._mask_cache[key] = mask
+            self._mask_cache.move_to_end(key)
+            if len(self._mask_cache) > _MASK_CACHE_SIZE:
+                self._mask_cache.popitem(last=False)
+        return mask
+
+    def score(self, query: str) -> np.ndarray:
+        term_ids = [self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary]
+        if not term_ids or not self.num_docs:
+            return np.zeros(self.num_docs, dtype=np.float32)
+        unique_terms, counts = np.unique(term_ids, return_counts=True)
+        return np.asarray(self.matrix[unique_terms].T @ counts.astype(np.float32)).ravel()
+
+    def search(self, query: str, k: int = 4, filters: dict | None = None) -> list[tuple[Document, float]]:
+        scores = self.score(query)
+        mask = self.filter_mask(filters)
+        if mask is not None:
+            scores = np.where(mask, scores, 0)
+
+        k = min(k, int(np.count_nonzero(scores > 0)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.get_document(int(i)), float(scores[i])) for i in top]
+
+
+class PersistedBM25Retriever(BaseRetriever):
+    '''Lexical retriever backed by a persisted BM25Index.'''
+
+    index: BM25Index
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                top_k: int | None = None, filters: dict | None = None) -> list[Document]:
+        return [doc for doc, _ in self.index.search(query, top_k or self.k, filters)]
+
+
+def index_path(collection_name: str) -> Path:
+    return BM25_INDEX_DIR / collection_name
+
+
+def build_bm25_index(collection: Chroma, collection_name: str, version: str) -> BM25Index | None:
+    '''Build and persist the BM25 index for the current contents of a collection.'''
+    collection_data = collection.get(include=["documents", "metadatas"])
+    if not collection_data['ids']:
+        return None
+    index = BM25Index.build(
+        ids=collection_data['ids'],
+        texts=collection_data['documents'],
+        metadatas=collection_data['metadatas'],
+        version=version
+    )
+    index.save(index_path(collection_name))
+    logger.info(f"Built BM25 index for {collection_name} ({index.num_docs} chunks, {len(index.vocabulary)} terms)")
+    return index
+
+
+def load_or_build_bm25_index(collection: Chroma, collection_name: str, version: str) -> BM25Index | None:
+    index = BM25Index.load(index_path(collection_name), version=version)
+    if index is not None:
+        return index
+    return build_bm25_index(collection, collection_name, version)
@@ -0,0 +1,225 @@
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langchain_core.load import dumps, loads
+from pathlib import Path
+import hashlib
+import sqlite3
+import threading
+import warnings
+import json
+import time
+import os
+
+# "google" talks to Gemini, "fake" runs the deterministic ScriptedChatModel with no network
+CHAT_MODEL_BACKEND = os.getenv("CHAT_MODEL_BACKEND", "google").lower()
+CHAT_MODEL_NAME = os.getenv("CHAT_MODEL_NAME", "gemini-2.5-pro")
+CHAT_MODEL_TEMPERATURE = float(os.getenv("CHAT_MODEL_TEMPERATURE", "0"))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    str(Path(__file__).resolve().parents[2] / "data" / "cache" / "llm_responses.sqlite")
+)
+
+# Per-message fields that differ between otherwise identical runs and never reach the model
+_VOLATILE_MESSAGE_FIELDS = ('id', 'response_metadata', 'usage_metadata', 'additional_kwargs')
+
+
+def normalize_prompt(prompt: str) -> str:
+    '''Strip run-specific ids and metadata from a serialized message list.
+
+    Tool call ids are renumbered in order of appearance and the ToolMessages answering them
+    follow the renumbering, so two conversations that differ only in provider-generated ids
+    map to the same cache key.
+    '''
+    try:
+        messages = json.loads(prompt)
+    except json.JSONDecodeError:
+        return prompt
+
+    tool_call_ids: dict[str, str] = {}
+
+    def renumber(tool_call_id):
+        if tool_call_id is None:
+            return None
+        return tool_call_ids.setdefault(tool_call_id, f"call_{len(tool_call_ids)}")
+
+    for message in messages if isinstance(messages, list) else []:
+        kwargs = message.get('kwargs') if isinstance(message, dict) else None
+        if not isinstance(kwargs, dict):
+            continue
+        for field in _VOLATILE_MESSAGE_FIELDS:
+            kwargs.pop(field, None)
+        for tool_call in kwargs.get('tool_calls', []):
+            tool_call['id'] = renumber(tool_call.get('id'))
+        if 'tool_call_id' in kwargs:
+            kwargs['tool_call_id'] = renumber(kwargs['tool_call_id'])
+    return json.dumps(messages, sort_keys=True)
+
+
+class ResponseCache(BaseCache):
+    '''Persistent LLM response cache keyed by (model config, normalized messages).
+
+    LangChain passes the model's serialized configuration as `llm_string`, which covers the
+    model name, temperature and any bound tools, and the conversation as `prompt`.
+    '''
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                llm_hash TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                generations TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (llm_hash, prompt_hash)
+            )
+        """)
+        self._con.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> tuple[str, str]:
+        return (
+            hashlib.sha256(llm_string.encode("utf-8")).hexdigest(),
+            hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest(),
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            row = self._con.execute(
+                "SELECT generations FROM responses WHERE llm_hash = ? AND prompt_hash = ?",
+                self._key(prompt, llm_string)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with warnings.catch_warnings():
+            # langchain_core.load.loads is flagged beta, the format is stable for our own dumps
+            warnings.simplefilter("ignore")
+            return [loads(generation, allowed_objects='core') for generation in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (*self._key(prompt, llm_string), generations, time.time())
+            )
+            self._con.commit()
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            self._con.execute("DELETE FROM responses")
+            self._con.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._con.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': entries,
+        }
+
+
+class ScriptedChatModel(BaseChatModel):
+    '''Deterministic offline stand-in for the chat model.
+
+    With a `script`, the n-th AI turn of a conversation replays `script[n]`. Without one, a
+    new user question is answered with one call to every bound tool named `search_*`, with
+    the question in each required string argument, and once the tool results are in, with a
+    plain-text digest of them.
+    '''
+
+    model_name: str = "scripted"
+    script: list[AIMessage] = []
+    tool_prefix: str = "search_"
+    max_excerpt_chars: int = 300
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name, "script": [message.model_dump() for message in self.script]}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _respond(self, messages: list[BaseMessage], tools: list[dict]) -> AIMessage:
+        turn = sum(isinstance(message, AIMessage) for message in messages)
+        if turn < len(self.script):
+            return self.script[turn].model_copy()
+
+        last_human = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=-1)
+        question = messages[last_human].text if last_human >= 0 else ""
+        tool_results = [message for message in messages[last_human + 1:] if isinstance(message, ToolMessage)]
+
+        tool_calls = []
+        for tool in tools:
+            function = tool["function"]
+            if not function["name"].startswith(self.tool_prefix):
+                continue
+            parameters = function.get("parameters", {})
+            args = {
+                name: question for name in parameters.get("required", [])
+                if parameters.get("properties", {}).get(name, {}).get("type") == "string"
+            }
+            tool_calls.append({"name": function["name"], "args": args, "id": f"call_{turn}_{len(tool_calls)}", "type": "tool_call"})
+        if tool_calls and not tool_results:
+            return AIMessage(content="", tool_calls=tool_calls)
+
+        lines = [f"Analysis of: {question}"]
+        for message in tool_results:
+            lines.append(f"- [{message.name}] {message.text[:self.max_excerpt_chars]}")
+        if not tool_results:
+            lines.append("- No search results were used.")
+        return AIMessage(content="\n".join(lines))
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._respond(messages, kwargs.get("tools", []))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+_response_cache: ResponseCache | None = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
+
+
+def get_chat_model(model: str | None = None, temperature: float | None = None,
+                   backend: str | None = None) -> BaseChatModel:
+    '''Build the chat model selected by CHAT_MODEL_BACKEND, behind the response cache if LLM_CACHE_ENABLED.'''
+    backend = (backend or CHAT_MODEL_BACKEND).lower()
+    cache = get_response_cache() if LLM_CACHE_ENABLED else None
+
+    if backend == "fake":
+        return ScriptedChatModel(cache=cache)
+    if backend == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
+            model=model or CHAT_MODEL_NAME,
+            temperature=CHAT_MODEL_TEMPERATURE if temperature is None else temperature,
+            cache=cache,
+        )
+    raise ValueError(f"Unknown CHAT_MODEL_BACKEND '{backend}', expected 'google' or 'fake'")
@@ -0,0 +1,84 @@
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from .result_formatter_service import citation_headers
+from .telemetry_service import get_logger, registry
+import os
+
+# Prompt size, in estimated tokens, above which older tool results are compacted
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "32000"))
+# Characters of a tool result kept in its compacted stub
+COMPACTED_RESULT_CHARS = int(os.getenv("COMPACTED_RESULT_CHARS", "400"))
+
+COMPACTED_RESULTS = registry.counter("compacted_tool_results_total", "Tool results replaced by a stub to fit the context budget")
+
+logger = get_logger(__name__)
+
+
+def estimate_tokens(messages: list[AnyMessage]) -> int:
+    return count_tokens_approximately(messages)
+
+
+def is_compacted(message: AnyMessage) -> bool:
+    return bool(message.additional_kwargs.get('compacted'))
+
+
+def compact_tool_result(message: ToolMessage, max_chars: int = COMPACTED_RESULT_CHARS) -> ToolMessage:
+    '''Stub for a tool result under the same message id.
+
+    Formatted search results keep their citation headers, which the model can still cite or
+    expand with get_document; any other result keeps its opening characters.
+    '''
+    text = message.text
+    headers = citation_headers(text)
+    if headers:
+        stub = "\n".join(headers)
+        if len(stub) < len(text):
+            stub += f"\n[... compacted, {len(text)} chars originally; get_document(doc_id) returns a full record]"
+    else:
+        stub = text[:max_chars].rstrip()
+        if len(text) > max_chars:
+            stub += f"\n[... compacted, {len(text)} chars originally]"
+    return ToolMessage(
+        content=stub,
+        tool_call_id=message.tool_call_id,
+        name=message.name,
+        id=message.id,
+        additional_kwargs={'compacted': True},
+    )
+
+
+def compact_tool_results(messages: list[AnyMessage], budget: int = CONTEXT_TOKEN_BUDGET,
+                         reserved_tokens: int = 0) -> tuple[list[ToolMessage], int]:
+    '''Pick tool results to compact, oldest first, until the prompt fits `budget`.
+
+    Results of the latest tool round, which the model has not read yet, are only compacted
+    once every older result is a stub. Returns the replacement messages, meant for the
+    `add_messages` reducer which swaps them in by id, and the estimated prompt size after.
+    '''
+    total = reserved_tokens + estimate_tokens(messages)
+    if total <= budget:
+        return [], total
+
+    last_ai = max((i for i, message in enumerate(messages) if isinstance(message, AIMessage)), default=-1)
+    older = [m for m in messages[:last_ai] if isinstance(m, ToolMessage) and not is_compacted(m)]
+    latest = [m for m in messages[last_ai + 1:] if isinstance(m, ToolMessage) and not is_compacted(m)]
+
+    replacements = []
+    for message in older + latest:
+        if total <= budget:
+            break
+        stub = compact_tool_result(message)
+        total -= estimate_tokens([message]) - estimate_tokens([stub])
+        replacements.append(stub)
+
+    COMPACTED_RESULTS.inc(len(replacements))
+    if total > budget:
+        logger.warning(f"Context still at ~{total} tokens after compacting {len(replacements)} tool results (budget {budget})")
+    elif replacements:
+        logger.info(f"Compacted {len(replacements)} tool results to fit the context budget ({total}/{budget} tokens)")
+    return replacements, total
+
+
+def apply_replacements(messages: list[AnyMessage], replacements: list[AnyMessage]) -> list[AnyMessage]:
+    by_id = {message.id: message for message in replacements}
+    return [by_id.get(message.id, message) for message in messages]
@@ -0,0 +1,168 @@
+from langchain_core.embeddings import Embeddings
+from pathlib import Path
+from array import array
+import hashlib
+import sqlite3
+import threading
+import os
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    str(Path(__file__).resolve().parents[2] / "data" / "cache" / "embeddings.sqlite")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Stores between exact recounts of the table, which pick up rows written by other processes
+RECOUNT_INTERVAL = 1000
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    '''Disk-backed, size-bounded LRU cache in front of another embeddings model.
+
+    Vectors are keyed by (model name, kind, text hash). Document and query embeddings are
+    cached separately because providers such as Gemini embed them with different task types.
+    '''
+
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 db_path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (model, kind, text_hash)
+            )
+        """)
+        self._con.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._con.commit()
+        self._clock = self._con.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+        # Running row count, so eviction does not scan the table on every store
+        self._entries = self._count()
+        self._stores = 0
+
+    def _count(self) -> int:
+        return self._con.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def _lookup(self, kind: str, hashes: list[str]) -> dict[str, list[float]]:
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._con.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND kind = ? AND text_hash IN ({placeholders})",
+                [self.model_name, kind, *batch]
+            ).fetchall()
+            for row_hash, blob in rows:
+                found[row_hash] = array('f', blob).tolist()
+        if found:
+            tick = self._tick()
+            self._con.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND kind = ? AND text_hash = ?",
+                [(tick, self.model_name, kind, h) for h in found]
+            )
+        return found
+
+    def _store(self, kind: str, vectors: dict[str, list[float]]):
+        tick = self._tick()
+        # Another thread or process may have stored the same text meanwhile; the vector is the
+        # same, so only its last use is refreshed and rowcount counts the new rows alone
+        inserted = self._con.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, kind, text_hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(self.model_name, kind, h, array('f', v).tobytes(), tick) for h, v in vectors.items()]
+        ).rowcount
+        if inserted < len(vectors):
+            self._con.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND kind = ? AND text_hash = ?",
+                [(tick, self.model_name, kind, h) for h in vectors]
+            )
+        self._entries += inserted
+        self._stores += 1
+        if self._stores % RECOUNT_INTERVAL == 0:
+            self._entries = self._count()
+        self._evict()
+
+    def _evict(self):
+        excess = self._entries - self.max_entries
+        if excess > 0:
+            deleted = self._con.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            ).rowcount
+            self._entries -= deleted
+
+    def _embed(self, kind: str, texts: list[str]) -> list[list[float]]:
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            cached = self._lookup(kind, hashes)
+            self._con.commit()
+
+        missing = {}
+        for h, t in zip(hashes, texts):
+            if h not in cached:
+                missing.setdefault(h, t)
+
+        if missing:
+            if kind == "query":
+                new_vectors = [self.embeddings.embed_query(t) for t in missing.values()]
+            else:
+                new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            with self._lock:
+                self._store(kind, computed)
+                self._con.commit()
+            cached.update(computed)
+
+        with self._lock:
+            # Per distinct text: repeats within one call are served by the same lookup
+            self.hits += len(set(hashes)) - len(missing)
+            self.misses += len(missing)
+        return [cached[h] for h in hashes]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed("document", texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed("query", [text])[0]
+
+    def stats(self) -> dict:
+        # One snapshot, so the ratio matches the counts it is reported with
+        with self._lock:
+            hits, misses, size = self.hits, self.misses, self._entries
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+            'entries': size,
+            'max_entries': self.max_entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries -= self._con.execute("DELETE FROM embeddings WHERE model = ?", (self.model_name,)).rowcount
+            self._con.commit()
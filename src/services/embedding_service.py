@@ -0,0 +1,296 @@
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
+from .embedding_cache_service import CachedEmbeddings, EMBEDDING_CACHE_ENABLED
+from .telemetry_service import get_logger
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+import numpy as np
+import threading
+import hashlib
+import zlib
+import re
+import os
+
+# "<backend>:<model>" or a bare backend name; anything else is a Gemini model name, e.g.
+#   models/embedding-001            Gemini API (default)
+#   onnx:/models/bge-small-en-v1.5  local ONNX export with its tokenizer.json
+#   sentence-transformers:/models/all-MiniLM-L6-v2
+#   hashing                         feature hashing, no model files at all
+#   fake                            random vectors for offline runs and benchmarks
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "models/embedding-001")
+# Size of the vectors returned when EMBEDDING_MODEL_NAME=fake (offline runs and benchmarks)
+FAKE_EMBEDDING_SIZE = int(os.getenv("FAKE_EMBEDDING_SIZE", "256"))
+HASHING_EMBEDDING_SIZE = int(os.getenv("HASHING_EMBEDDING_SIZE", "1024"))
+# CPU threads and batch size of the local model backends
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", str(min(4, os.cpu_count() or 1))))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Tokens per text for the ONNX backend; a 1000 character chunk is about 250
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))
+# Instruction prefixes some local models expect, e.g. "query: " and "passage: " for E5
+EMBEDDING_QUERY_PREFIX = os.getenv("EMBEDDING_QUERY_PREFIX", "")
+EMBEDDING_DOCUMENT_PREFIX = os.getenv("EMBEDDING_DOCUMENT_PREFIX", "")
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Chroma 0.6, the oldest release pyproject allows, caps collection names at 63 characters
+# (the locked 1.5 accepts up to 512); the suffix bound leaves room for the longest base name
+# plus the "__" separator
+MAX_COLLECTION_NAME_LENGTH = 63
+MAX_COLLECTION_SUFFIX_LENGTH = 32
+_COLLECTION_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._-]*[a-zA-Z0-9]$")
+
+logger = get_logger(__name__)
+
+
+class HashingEmbeddings(Embeddings):
+    '''Signed feature hashing of word unigrams and bigrams with sublinear counts, L2-normalised.
+
+    Purely lexical, but stable across processes and machines and needs no model files, which
+    makes it the fallback for air-gapped nodes without a local model.
+    '''
+
+    def __init__(self, size: int = HASHING_EMBEDDING_SIZE):
+        self.size = size
+
+    def _embed(self, text: str) -> list[float]:
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.size, dtype=np.float32)
+        if features:
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            # Low bits pick the slot, the high bit the sign, so collisions tend to cancel out
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vector, hashes % self.size, signs)
+            vector = np.sign(vector) * np.log1p(np.abs(vector))
+            norm = np.linalg.norm(vector)
+            if norm:
+                vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class OnnxEmbeddings(Embeddings):
+    '''Sentence-transformer-class model exported to ONNX, run on CPU with onnxruntime.
+
+    `model_path` is a directory holding model.onnx (or onnx/model.onnx) and tokenizer.json,
+    as written by optimum or published on the Hugging Face hub. Token outputs are mean-pooled
+    over the attention mask; models that already output sentence embeddings are used as is.
+    '''
+
+    def __init__(self, model_path: str, threads: int = EMBEDDING_THREADS, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_length: int = EMBEDDING_MAX_LENGTH):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError("The ONNX embedding backend needs `pip install onnxruntime tokenizers`") from e
+
+        path = Path(model_path)
+        candidates = [path] if path.suffix == ".onnx" else [path / "model.onnx", path / "onnx" / "model.onnx"]
+        onnx_file = next((p for p in candidates if p.is_file()), None)
+        if onnx_file is None:
+            raise FileNotFoundError(f"No ONNX model at {model_path} (looked for {', '.join(map(str, candidates))})")
+        tokenizer_dir = path if path.is_dir() else path.parent
+        tokenizer_file = next((p for p in (tokenizer_dir / "tokenizer.json", onnx_file.parent / "tokenizer.json") if p.is_file()), None)
+        if tokenizer_file is None:
+            raise FileNotFoundError(f"No tokenizer.json next to {onnx_file}")
+
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_file))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        if self.tokenizer.padding is None:
+            pad_token = next((t for t in ("[PAD]", "<pad>") if self.tokenizer.token_to_id(t) is not None), "[PAD]")
+            self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(onnx_file), sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        outputs = [o.name for o in self.session.get_outputs()]
+        self.output_name = "sentence_embedding" if "sentence_embedding" in outputs else outputs[0]
+        self.batch_size = batch_size
+        # One batch at a time: the intra-op threads already use the cores, concurrent callers
+        # (parallel ingest batches, queries) would only oversubscribe them
+        self._lock = threading.Lock()
+        logger.info(f"Loaded ONNX embedding model {onnx_file} ({threads} threads)")
+
+    def _run(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': mask,
+        }
+        if 'token_type_ids' in self.input_names:
+            feed['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        with self._lock:
+            output = self.session.run([self.output_name], feed)[0]
+        if output.ndim == 3:
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1, None)
+        return _normalize(output.astype(np.float32))
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        # Batches of similar length waste less compute on padding; results go back in input order
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: list[list[float]] = [[] for _ in texts]
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._run([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed([EMBEDDING_DOCUMENT_PREFIX + text for text in texts])
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([EMBEDDING_QUERY_PREFIX + text])[0]
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    '''sentence-transformers model on CPU, from a local path or a model name already in the HF cache.'''
+
+    def __init__(self, model_name_or_path: str, threads: int = EMBEDDING_THREADS, batch_size: int = EMBEDDING_BATCH_SIZE):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The sentence-transformers embedding backend needs `pip install sentence-transformers`") from e
+        torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name_or_path, device="cpu")
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True,
+                                        convert_to_numpy=True, show_progress_bar=False)
+        return vectors.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed([EMBEDDING_DOCUMENT_PREFIX + text for text in texts])
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([EMBEDDING_QUERY_PREFIX + text])[0]
+
+
+def _google_embeddings(model: str) -> Embeddings:
+    from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model) # type: ignore
+
+
+def _require_model(backend: str, factory: Callable[[str], Embeddings]) -> Callable[[str], Embeddings]:
+    def build(model: str) -> Embeddings:
+        if not model:
+            raise ValueError(f"EMBEDDING_MODEL_NAME={backend}:<model path> needs a model path")
+        return factory(model)
+    return build
+
+
+@dataclass(frozen=True)
+class EmbeddingBackend:
+    name: str
+    factory: Callable[[str], Embeddings]
+    # Remote backends go behind the persistent embedding cache; local ones are cheaper than a lookup
+    remote: bool = False
+    # Part of the collection name suffix, e.g. the vector size when the model name does not fix it
+    tag: Callable[[str], str] = lambda model: model
+    # Short name opening the collection suffix, the backend name when not given
+    label: str = ""
+
+
+EMBEDDING_BACKENDS: dict[str, EmbeddingBackend] = {}
+
+
+def register_embedding_backend(backend: EmbeddingBackend):
+    EMBEDDING_BACKENDS[backend.name] = backend
+
+
+register_embedding_backend(EmbeddingBackend("google", _google_embeddings, remote=True))
+register_embedding_backend(EmbeddingBackend("onnx", _require_model("onnx", OnnxEmbeddings)))
+register_embedding_backend(EmbeddingBackend(
+    "sentence-transformers", _require_model("sentence-transformers", SentenceTransformerEmbeddings), label="st",
+))
+register_embedding_backend(EmbeddingBackend(
+    "hashing", lambda model: HashingEmbeddings(int(model or HASHING_EMBEDDING_SIZE)),
+    tag=lambda model: model or str(HASHING_EMBEDDING_SIZE),
+))
+register_embedding_backend(EmbeddingBackend(
+    "fake", lambda model: DeterministicFakeEmbedding(size=int(model or FAKE_EMBEDDING_SIZE)),
+    tag=lambda model: model or str(FAKE_EMBEDDING_SIZE),
+))
+
+
+def parse_embedding_model(spec: str = EMBEDDING_MODEL_NAME) -> tuple[EmbeddingBackend, str]:
+    '''Backend and model of an EMBEDDING_MODEL_NAME value.'''
+    backend, sep, model = spec.partition(":")
+    if sep and backend.lower() in EMBEDDING_BACKENDS:
+        return EMBEDDING_BACKENDS[backend.lower()], model
+    if spec.lower() in EMBEDDING_BACKENDS:
+        return EMBEDDING_BACKENDS[spec.lower()], ""
+    # Gemini model names ("models/embedding-001") keep working without a prefix
+    return EMBEDDING_BACKENDS["google"], spec
+
+
+def collection_suffix(spec: str = EMBEDDING_MODEL_NAME) -> str:
+    '''Suffix separating the collections of a non-default backend; Gemini collections keep their names.
+
+    Vectors of different models are not comparable and often differ in size, so each backend and
+    model writes to its own Chroma collections and switching back and forth needs no re-ingest.
+    '''
+    backend, model = parse_embedding_model(spec)
+    if backend.name == "google":
+        return ""
+    tag = backend.tag(model)
+    # Chroma names allow [a-zA-Z0-9._-]; a model path is reduced to its last component, and a hash
+    # of the full value keeps models that share that component (or a long prefix) apart
+    label = backend.label or backend.name
+    short_tag = re.sub(r"[^a-zA-Z0-9]+", "-", Path(tag).name if tag else "").strip("-").lower()
+    if short_tag != tag.lower() or len(label) + 1 + len(short_tag) > MAX_COLLECTION_SUFFIX_LENGTH:
+        digest = hashlib.sha1(model.encode("utf-8")).hexdigest()[:8]
+        short_tag = short_tag[:MAX_COLLECTION_SUFFIX_LENGTH - len(label) - len(digest) - 2].rstrip("-")
+        short_tag = f"{short_tag}-{digest}" if short_tag else digest
+    return f"{label}-{short_tag}" if short_tag else label
+
+
+def validate_collection_name(name: str, spec: str = EMBEDDING_MODEL_NAME):
+    if (not 3 <= len(name) <= MAX_COLLECTION_NAME_LENGTH or ".." in name
+            or not _COLLECTION_NAME_PATTERN.match(name)):
+        raise ValueError(
+            f"'{name}' is not a valid Chroma collection name (3-{MAX_COLLECTION_NAME_LENGTH} characters from "
+            f"[a-zA-Z0-9._-], alphanumeric at both ends); check EMBEDDING_MODEL_NAME={spec}"
+        )
+
+
+def storage_collection_name(collection_name: str, spec: str = EMBEDDING_MODEL_NAME) -> str:
+    '''Chroma collection holding `collection_name` for the embeddings selected by `spec`.'''
+    suffix = collection_suffix(spec)
+    name = f"{collection_name}__{suffix}" if suffix else collection_name
+    validate_collection_name(name, spec)
+    return name
+
+
+def get_embeddings(spec: str = EMBEDDING_MODEL_NAME) -> Embeddings:
+    '''Build the embeddings selected by `spec`, behind the persistent cache for remote backends if enabled.'''
+    backend, model = parse_embedding_model(spec)
+    # Fail on an unusable collection suffix now, not when the first ingest creates a collection
+    suffix = collection_suffix(spec)
+    if suffix:
+        validate_collection_name(suffix, spec)
+    embeddings = backend.factory(model)
+    if backend.remote and EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(embeddings, model_name=spec)
+    logger.info(f"Embedding backend: {backend.name} ({model or 'default'})")
+    return embeddings
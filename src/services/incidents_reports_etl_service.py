@@ -1,113 +1,291 @@
+from .report_search_service import build_report_search_index, has_report_search_index
+from .telemetry_service import get_logger, span
 import duckdb
+import argparse
 import os
-import pandas as pd
 
 REPORTS_DATA_PATH = os.getenv("REPORTS_DATA_PATH", "data/raw/reports.csv")
 DB_PATH = os.getenv("DUCKDB_PATH", "data/duckdb/reports.duckdb")
 
-def create_reports_table():
+logger = get_logger(__name__)
+
+# Optional Parquet copy of the reports table, rewritten after every load
+REPORTS_PARQUET_PATH = os.getenv("REPORTS_PARQUET_PATH", "")
+# Longest CSV record accepted; report bodies are full article texts
+REPORTS_MAX_LINE_SIZE = int(os.getenv("REPORTS_MAX_LINE_SIZE", str(64 * 1024 * 1024)))
+
+REPORT_NUMERIC_COLUMNS = (
+    'epoch_date_downloaded', 'epoch_date_modified', 'epoch_date_published', 'epoch_date_submitted',
+    'ref_number', 'report_number',
+)
+# Table column order, which reports.csv follows
+REPORT_COLUMN_ORDER = (
+    '_id', 'authors', 'date_downloaded', 'date_modified', 'date_published', 'date_submitted',
+    'description', 'epoch_date_downloaded', 'epoch_date_modified', 'epoch_date_published',
+    'epoch_date_submitted', 'image_url', 'language', 'ref_number', 'report_number', 'source_domain',
+    'submitters', 'text', 'title', 'url', 'tags',
+)
+
+def _report_select(column: str) -> str:
+    if column in REPORT_NUMERIC_COLUMNS:
+        # The Mongo export writes missing numbers as {'$numberDouble': 'NaN'}; that, NaN itself
+        # and any other non-numeric value become NULL, like pd.to_numeric(errors='coerce')
+        return f"TRY_CAST(TRY_CAST({column} AS DOUBLE) AS BIGINT) AS {column}"
+    return column
+
+# The CSV is read in order on one thread, since rowid doubles as the report id incidents refer to
+_REPORTS_SOURCE = f"""
+    SELECT row_number() OVER () - 1 AS csv_row, {", ".join(_report_select(c) for c in REPORT_COLUMN_ORDER)}
+    FROM read_csv($path, header = true, all_varchar = true, parallel = false, max_line_size = {REPORTS_MAX_LINE_SIZE})
+"""
+
+_CREATE_REPORTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS reports (
+        _id VARCHAR,
+        authors VARCHAR,
+        date_downloaded VARCHAR,
+        date_modified VARCHAR,
+        date_published VARCHAR,
+        date_submitted VARCHAR,
+        description VARCHAR,
+        epoch_date_downloaded BIGINT,
+        epoch_date_modified BIGINT,
+        epoch_date_published BIGINT,
+        epoch_date_submitted BIGINT,
+        image_url VARCHAR,
+        language VARCHAR,
+        ref_number BIGINT,
+        report_number BIGINT,
+        source_domain VARCHAR,
+        submitters VARCHAR,
+        text VARCHAR,
+        title VARCHAR,
+        url VARCHAR,
+        tags VARCHAR
+    )
+"""
+
+def _load_all_reports(con: duckdb.DuckDBPyConnection) -> int:
+    with span("duckdb.load_reports", path=REPORTS_DATA_PATH):
+        con.execute(f"""
+            INSERT INTO reports
+            SELECT {", ".join(REPORT_COLUMN_ORDER)} FROM ({_REPORTS_SOURCE}) ORDER BY csv_row
+        """, {'path': REPORTS_DATA_PATH})
+    return con.execute("SELECT COUNT(*) FROM reports").fetchone()[0] #type: ignore
+
+def _append_new_reports(con: duckdb.DuckDBPyConnection, existing: int) -> int | None:
+    '''Append the reports after the stored ones; None if the CSV no longer lines up with the table.
+
+    Incidents refer to reports by CSV row, stored as the table rowid, so appending is only
+    valid when every stored report is still at its row and new report_numbers come after them.
+    The CSV is streamed twice, once to check that and once to insert, rather than staged.
+    '''
+    unchanged, new_rows, known = con.execute(f"""
+        WITH source AS ({_REPORTS_SOURCE})
+        SELECT
+            COUNT(*) FILTER (WHERE s.csv_row < $existing AND s.report_number IS NOT DISTINCT FROM r.report_number
+                             AND s._id IS NOT DISTINCT FROM r._id),
+            COUNT(*) FILTER (WHERE s.csv_row >= $existing),
+            COUNT(*) FILTER (WHERE s.csv_row >= $existing
+                             AND s.report_number IN (SELECT report_number FROM reports))
+        FROM source s
+        LEFT JOIN reports r ON r.rowid = s.csv_row
+    """, {'path': REPORTS_DATA_PATH, 'existing': existing}).fetchone() #type: ignore
+    if unchanged != existing:
+        return None
+    if known:
+        # Skipping them would shift every later row id, so they are kept as the CSV has them
+        logger.warning(f"{known} new rows of {REPORTS_DATA_PATH} repeat a stored report_number")
+    if new_rows:
+        with span("duckdb.append_reports", path=REPORTS_DATA_PATH, rows=new_rows):
+            con.execute(f"""
+                INSERT INTO reports
+                SELECT {", ".join(REPORT_COLUMN_ORDER)} FROM ({_REPORTS_SOURCE})
+                WHERE csv_row >= $existing
+                ORDER BY csv_row
+            """, {'path': REPORTS_DATA_PATH, 'existing': existing})
+    return new_rows
+
+def export_reports_parquet(con: duckdb.DuckDBPyConnection, parquet_path: str):
+    '''Write the reports table to Parquet, with rowid kept as report_rowid so incident references still resolve.'''
+    os.makedirs(os.path.dirname(os.path.abspath(parquet_path)), exist_ok=True)
+    # COPY does not take a parameter for its target, so the path is quoted as a string literal
+    target = parquet_path.replace("'", "''")
+    with span("duckdb.export_reports_parquet", path=parquet_path):
+        con.execute(
+            f"COPY (SELECT rowid AS report_rowid, * FROM reports ORDER BY rowid) TO '{target}' (FORMAT parquet, COMPRESSION zstd)"
+        )
+    logger.info(f"Exported reports to {parquet_path}")
+
+def create_reports_table(refresh: bool = False, parquet_path: str | None = None):
+    '''Create the reports table and load reports.csv into it with DuckDB's streaming CSV reader.
+
+    An empty table is filled from the CSV. With `refresh`, a populated table gets the reports
+    whose report_number it does not have yet; if the CSV was reordered or rows were removed,
+    the table is rebuilt instead so row ids keep matching CSV rows. The full-text index of
+    report_search_service is rebuilt after every load. `parquet_path`, or REPORTS_PARQUET_PATH,
+    also writes a Parquet copy after a load.
+    '''
     if DB_PATH != ':memory:':
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
+    parquet_path = parquet_path if parquet_path is not None else REPORTS_PARQUET_PATH
+
+    if refresh:
+        # Imported here since the repository module reads its configuration from this one;
+        # its read-only connection has to be released before the file is opened for writing
+        from .report_repository_service import close_report_repository
+        close_report_repository()
+
     con = duckdb.connect(database=DB_PATH, read_only=False)
-    
-    con.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            _id VARCHAR,
-            authors VARCHAR,
-            date_downloaded VARCHAR,
-            date_modified VARCHAR,
-            date_published VARCHAR,
-            date_submitted VARCHAR,
-            description VARCHAR,
-            epoch_date_downloaded BIGINT,
-            epoch_date_modified BIGINT,
-            epoch_date_published BIGINT,
-            epoch_date_submitted BIGINT,
-            image_url VARCHAR,
-            language VARCHAR,
-            ref_number BIGINT,
-            report_number BIGINT,
-            source_domain VARCHAR,
-            submitters VARCHAR,
-            text VARCHAR,
-            title VARCHAR,
-            url VARCHAR,
-            tags VARCHAR
-        )
-    """)
-    
+    con.execute(_CREATE_REPORTS_TABLE)
     count = con.execute("SELECT COUNT(*) FROM reports").fetchone()[0] #type: ignore
-    
-    if count == 0:
-        if os.path.exists(REPORTS_DATA_PATH):
-            print(f"Loading data from {REPORTS_DATA_PATH}...")
-            try:
-                df = pd.read_csv(REPORTS_DATA_PATH)
-
-                numeric_cols = [
-                    'epoch_date_downloaded', 'epoch_date_modified', 
-                    'epoch_date_published', 'epoch_date_submitted',
-                    'ref_number', 'report_number'
-                ]
-                
-                for col in numeric_cols:
-                    if col in df.columns:
-                        # Replace specific JSON NaN representation and other non-numeric values
-                        df[col] = df[col].astype(str).replace(r"\{'\$numberDouble': 'NaN'\}", None, regex=True)
-                        df[col] = pd.to_numeric(df[col], errors='coerce')
-                
-                con.register('df_reports', df)
-                con.execute("INSERT INTO reports SELECT * FROM df_reports")
-                print("Data loaded successfully.")
-            except Exception as e:
-                print(f"Error loading data: {e}")
+
+    if count and not refresh:
+        if not has_report_search_index(con):
+            build_report_search_index(con)
+        return con
+    if not os.path.exists(REPORTS_DATA_PATH):
+        logger.warning(f"Data file not found at {REPORTS_DATA_PATH}")
+        return con
+
+    try:
+        if count == 0:
+            logger.info(f"Loading data from {REPORTS_DATA_PATH}...")
+            loaded = _load_all_reports(con)
+            logger.info(f"Data loaded successfully ({loaded} reports).")
         else:
-            print(f"Warning: Data file not found at {REPORTS_DATA_PATH}")
-    
+            added = _append_new_reports(con, count)
+            if added is None:
+                logger.warning(f"{REPORTS_DATA_PATH} no longer matches the stored row order, rebuilding the reports table")
+                con.execute("DROP TABLE reports")
+                con.execute(_CREATE_REPORTS_TABLE)
+                loaded = _load_all_reports(con)
+                from .report_repository_service import get_report_cache
+                get_report_cache().clear()
+                logger.info(f"Reports table rebuilt ({loaded} reports).")
+            elif added == 0:
+                logger.info("Reports table is up to date.")
+                if not has_report_search_index(con):
+                    build_report_search_index(con)
+                return con
+            else:
+                logger.info(f"Appended {added} new reports.")
+        # Term statistics cover the whole corpus, so any change rebuilds the index
+        build_report_search_index(con)
+        if parquet_path:
+            export_reports_parquet(con, parquet_path)
+    except Exception as e:
+        logger.error(f"Error loading data: {e}")
+
     return con
 
 def get_reports_by_ids(row_ids: list[int]):
     if not row_ids:
         return []
-    
-    con = duckdb.connect(database=DB_PATH, read_only=True)
+
+    # Imported here since the repository module reads its configuration from this one
+    from .report_repository_service import get_report_cache
     try:
-        ids_str = ','.join(map(str, row_ids))
-        
-        query = f"""
-            SELECT 
-                rowid,
-                authors as Author, 
-                date_published, 
-                description, 
-                image_url, 
-                language, 
-                source_domain, 
-                title, 
-                text, 
-                url 
-            FROM reports 
-            WHERE rowid IN ({ids_str})
-        """
-        
-        df = con.execute(query).fetchdf()
-        
-        if df.empty:
-            return []
-
-        id_map = {row_id: i for i, row_id in enumerate(row_ids)}
-        df['sort_order'] = df['rowid'].map(id_map)
-        df = df.sort_values('sort_order')
-        
-        result_df = df.drop(columns=['rowid', 'sort_order'])
-        
-        return result_df.to_dict(orient='records')
-        
+        return get_report_cache().reports_by_group([row_ids])[0]
     except Exception as e:
-        print(f"Error retrieving reports: {e}")
+        logger.error(f"Error retrieving reports: {e}")
         return []
+
+
+INCIDENT_ROWS_BATCH_SIZE = 256
+
+_INCIDENTS_SOURCE = """
+    SELECT row_number() OVER () AS incident_row, *
+    FROM read_csv(?, header = true, all_varchar = true, parallel = false)
+"""
+
+# Expands each incident's `reports` array (1-based CSV row numbers of reports.csv, i.e.
+# rowid + 2) and keeps the references that resolve to a stored report, in their original order.
+_INCIDENTS_WITH_REPORTS_QUERY = f"""
+    WITH incidents AS ({_INCIDENTS_SOURCE}),
+    links AS (
+        SELECT
+            incident_row,
+            UNNEST(report_refs) AS report_ref,
+            UNNEST(range(len(report_refs))) AS position
+        FROM (
+            SELECT
+                incident_row,
+                TRY_CAST(
+                    CASE WHEN starts_with(trim(reports), '[') THEN trim(reports) ELSE '[' || reports || ']' END
+                    AS BIGINT[]
+                ) AS report_refs
+            FROM incidents
+        )
+    ),
+    resolved AS (
+        SELECT l.incident_row, list(l.report_ref ORDER BY l.position) AS report_refs
+        FROM links l
+        JOIN reports r ON r.rowid = l.report_ref - 2
+        GROUP BY l.incident_row
+    )
+    SELECT i.*, h.report_refs
+    FROM incidents i
+    LEFT JOIN resolved h USING (incident_row)
+    ORDER BY i.incident_row
+"""
+
+_INCIDENTS_WITHOUT_REPORTS_QUERY = f"""
+    SELECT *, NULL AS report_refs FROM ({_INCIDENTS_SOURCE}) ORDER BY incident_row
+"""
+
+
+def _has_reports_table() -> bool:
+    if DB_PATH == ':memory:' or not os.path.exists(DB_PATH):
+        return False
+    con = duckdb.connect(database=DB_PATH, read_only=True)
+    try:
+        return con.execute(
+            "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'reports'"
+        ).fetchone()[0] > 0 #type: ignore
+    finally:
+        con.close()
+
+
+def iter_incidents_with_reports(incidents_path: str, batch_size: int = INCIDENT_ROWS_BATCH_SIZE):
+    '''Stream incidents.csv rows in file order, each with its resolvable report references under `report_refs`.
+
+    The whole incident -> report expansion runs as a single DuckDB query; rows are fetched
+    in batches so callers can build documents while the result is still being read.
+    Report bodies are not loaded here, they are hydrated at query time by id.
+    '''
+    if _has_reports_table():
+        con = duckdb.connect(database=DB_PATH, read_only=True)
+        query = _INCIDENTS_WITH_REPORTS_QUERY
+    else:
+        logger.warning(f"reports table not found at {DB_PATH}, incidents will be ingested without reports")
+        con = duckdb.connect()
+        query = _INCIDENTS_WITHOUT_REPORTS_QUERY
+
+    try:
+        with span("duckdb.incidents_with_reports", path=incidents_path):
+            cursor = con.execute(query, [incidents_path])
+        columns = [c[0] for c in cursor.description] #type: ignore
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                # Match csv.DictReader, which reads empty fields as empty strings
+                record = {column: '' if value is None else value for column, value in zip(columns, row)}
+                record['report_refs'] = record['report_refs'] or []
+                yield record
     finally:
         con.close()
 
 
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Load reports.csv into the DuckDB reports table.")
+    parser.add_argument("--refresh", action="store_true", help="Append reports missing from a populated table")
+    parser.add_argument("--parquet", default=None, help="Also export the table to this Parquet file")
+    args = parser.parse_args(argv)
+    create_reports_table(refresh=args.refresh, parquet_path=args.parquet).close()
+
+
+if __name__ == "__main__":
+    main()
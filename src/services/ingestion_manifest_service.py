@@ -0,0 +1,302 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_chroma import Chroma
+from .vector_store_service import VectorStoreService, CHROMA_PERSIST_DIR, EMBEDDING_MODEL_NAME
+from .bm25_index_service import load_or_build_bm25_index
+from .telemetry_service import get_logger
+from pathlib import Path
+from typing import Iterable
+import hashlib
+import json
+import time
+import os
+
+MANIFEST_DIR = Path(CHROMA_PERSIST_DIR) / "manifests"
+MANIFEST_VERSION = 2
+# Version 1 entries carry a single hash of text and metadata, they are upgraded as records are synced
+COMPATIBLE_MANIFEST_VERSIONS = {1, MANIFEST_VERSION}
+# Committed records are flushed to the manifest at least this often during a sync
+INGEST_CHECKPOINT_SECONDS = float(os.getenv("INGEST_CHECKPOINT_SECONDS", "30"))
+INGEST_CHECKPOINT_RECORDS = int(os.getenv("INGEST_CHECKPOINT_RECORDS", "500"))
+# Metadata-only changes are written to Chroma in batches of this many chunks
+METADATA_UPDATE_BATCH_SIZE = int(os.getenv("METADATA_UPDATE_BATCH_SIZE", "500"))
+
+# Metadata fields that change on every run without the source changing
+VOLATILE_METADATA_FIELDS = {'ingestion_date'}
+
+vectorStoreService = VectorStoreService()
+logger = get_logger(__name__)
+
+# Latest known contents version per collection, with the manifest mtime it was read at
+_collection_versions: dict[str, tuple[int | None, str]] = {}
+
+
+def _stable_metadata(doc: Document) -> dict:
+    return {k: v for k, v in doc.metadata.items() if k not in VOLATILE_METADATA_FIELDS}
+
+
+def text_hash(doc: Document) -> str:
+    '''Hash the page content of a source document, the only part that is embedded.'''
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def metadata_hash(doc: Document) -> str:
+    '''Hash the stable metadata of a source document.'''
+    return hashlib.sha256(json.dumps(_stable_metadata(doc), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def content_hash(doc: Document) -> str:
+    '''Combined hash of page content and stable metadata, as stored by version 1 manifests.'''
+    payload = {'content': doc.page_content, 'metadata': _stable_metadata(doc)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    '''Tracks which source records are stored in a collection, with their text and metadata hashes and chunk ids.'''
+
+    def __init__(self, collection_name: str, params: dict, entries: dict | None = None,
+                 checkpoint: dict | None = None):
+        self.collection_name = collection_name
+        self.params = params
+        self.entries: dict[str, dict] = entries or {}
+        # Progress of the last sync; 'complete' stays False when a run was interrupted
+        self.checkpoint: dict = checkpoint or {'complete': True}
+
+    @staticmethod
+    def path_for(collection_name: str) -> Path:
+        return MANIFEST_DIR / f"{collection_name}.json"
+
+    @classmethod
+    def load(cls, collection_name: str) -> "IngestionManifest | None":
+        path = cls.path_for(collection_name)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read ingestion manifest {path}: {e}")
+            return None
+        if data.get('version') not in COMPATIBLE_MANIFEST_VERSIONS:
+            return None
+        return cls(collection_name, data.get('params', {}), data.get('entries', {}), data.get('checkpoint'))
+
+    def save(self):
+        path = self.path_for(self.collection_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({
+            'version': MANIFEST_VERSION,
+            'collection': self.collection_name,
+            'params': self.params,
+            'entries': self.entries,
+            'checkpoint': self.checkpoint,
+        }), encoding="utf-8")
+        tmp_path.replace(path)
+
+    @property
+    def fingerprint(self) -> str:
+        '''Identifies the exact contents of the collection described by this manifest.'''
+        digest = hashlib.sha256(json.dumps(self.params, sort_keys=True).encode("utf-8"))
+        for key in sorted(self.entries):
+            digest.update(key.encode("utf-8"))
+            entry = self.entries[key]
+            digest.update(entry.get('text_hash', entry.get('hash', '')).encode("utf-8"))
+            digest.update(entry.get('metadata_hash', '').encode("utf-8"))
+        return digest.hexdigest()
+
+    def all_chunk_ids(self) -> list[str]:
+        return [chunk_id for entry in self.entries.values() for chunk_id in entry['chunk_ids']]
+
+
+class _SyncProgress:
+    '''Commits records to the manifest once all their chunks are written, flushing it periodically.
+
+    A record's chunks may land in several batches that complete out of order, so each record
+    is only committed when its last chunk is written, and dropped from the manifest if any of
+    its chunks failed so the next run retries it.
+    '''
+
+    def __init__(self, manifest: IngestionManifest, checkpoint_seconds: float = INGEST_CHECKPOINT_SECONDS,
+                 checkpoint_records: int = INGEST_CHECKPOINT_RECORDS):
+        self.manifest = manifest
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_records = checkpoint_records
+        self.pending: dict[str, dict] = {}
+        self.rows_read = 0
+        self.embedded = 0
+        self.metadata_updated = 0
+        self.failed_keys: set[str] = set()
+        self._uncheckpointed = 0
+        self._last_checkpoint = time.monotonic()
+
+    def add(self, source_key: str, entry: dict):
+        self.pending[source_key] = {'entry': entry, 'remaining': len(entry['chunk_ids']), 'failed': False}
+
+    def on_batch(self, chunk_ids: list[str], ok: bool):
+        for chunk_id in chunk_ids:
+            source_key = chunk_id.rsplit("#", 1)[0]
+            record = self.pending[source_key]
+            record['remaining'] -= 1
+            record['failed'] |= not ok
+            if record['remaining']:
+                continue
+            del self.pending[source_key]
+            if record['failed']:
+                self.manifest.entries.pop(source_key, None)
+                self.failed_keys.add(source_key)
+            else:
+                self.manifest.entries[source_key] = record['entry']
+                self.embedded += 1
+                self._uncheckpointed += 1
+        self._maybe_checkpoint()
+
+    def on_metadata_updated(self, entries: dict[str, dict]):
+        self.manifest.entries.update(entries)
+        self.metadata_updated += len(entries)
+        self._uncheckpointed += len(entries)
+        self._maybe_checkpoint()
+
+    def _maybe_checkpoint(self):
+        if (self._uncheckpointed >= self.checkpoint_records
+                or time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds):
+            self.save(complete=False)
+
+    def save(self, complete: bool):
+        self.manifest.checkpoint = {
+            'complete': complete,
+            'rows_read': self.rows_read,
+            'records_committed': len(self.manifest.entries),
+            'saved_at': time.time(),
+        }
+        self.manifest.save()
+        self._uncheckpointed = 0
+        self._last_checkpoint = time.monotonic()
+
+
+def sync_documents(source_docs: Iterable[tuple[str, Document]], collection_name: str,
+                   chunk_size: int = 1000, chunk_overlap: int = 200) -> Chroma:
+    '''Bring a collection in line with its source records, embedding only what changed.
+
+    `source_docs` yields (source_key, document) pairs where the key is stable across runs
+    (e.g. an incident id). Unchanged records are skipped, records whose text changed have their
+    chunks replaced, records whose metadata alone changed have it updated in place without being
+    embedded again, and records that disappeared from the source are deleted.
+
+    Records stream through splitting, embedding and writing without being collected first,
+    and committed records are checkpointed to the manifest as the run goes. An interrupted
+    sync therefore resumes where it stopped: records committed before the interruption match
+    their hash on the next run and are skipped, the rest are embedded.
+    '''
+    params = {
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'embedding_model': EMBEDDING_MODEL_NAME,
+    }
+    collection = vectorStoreService.get_or_create_collection(collection_name)
+    # Manifests and derived indexes follow the Chroma collection, one per embedding backend
+    storage_name = vectorStoreService.storage_name(collection_name)
+    manifest = IngestionManifest.load(storage_name)
+
+    if manifest is None or manifest.params != params or vectorStoreService.count(collection_name) == 0:
+        # Collections without a (matching) manifest hold untracked chunks, start them over
+        if vectorStoreService.count(collection_name) > 0:
+            logger.info(f"Rebuilding collection {collection_name} (ingestion parameters changed or manifest missing)")
+            collection = vectorStoreService.reset_collection(collection_name)
+        manifest = IngestionManifest(storage_name, params)
+    elif not manifest.checkpoint.get('complete', True):
+        logger.info(f"Resuming interrupted sync of {collection_name}: {len(manifest.entries)} records already committed, "
+                    f"{manifest.checkpoint.get('rows_read', 0)} source rows read before the interruption")
+
+    text_spliter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    progress = _SyncProgress(manifest)
+    seen_keys = set()
+    # Records whose text is unchanged but whose metadata changed, waiting for an in-place update
+    metadata_updates: dict[str, tuple[dict, dict]] = {}
+
+    def flush_metadata_updates():
+        ids = [chunk_id for entry, _ in metadata_updates.values() for chunk_id in entry['chunk_ids']]
+        metadatas = [metadata for entry, metadata in metadata_updates.values() for _ in entry['chunk_ids']]
+        vectorStoreService.update_metadata(ids, metadatas, collection_name)
+        progress.on_metadata_updated({source_key: entry for source_key, (entry, _) in metadata_updates.items()})
+        metadata_updates.clear()
+
+    def changed_chunks():
+        pending_chunks = 0
+        for source_key, doc in source_docs:
+            progress.rows_read += 1
+            if source_key in seen_keys:
+                logger.warning(f"Duplicate source key {source_key} in {collection_name}, skipping")
+                continue
+            seen_keys.add(source_key)
+
+            entry = {'text_hash': text_hash(doc), 'metadata_hash': metadata_hash(doc)}
+            previous = manifest.entries.get(source_key)
+            if previous and 'text_hash' not in previous:
+                # Version 1 entry: unchanged records only need their hashes upgraded
+                if previous['hash'] != content_hash(doc):
+                    previous = {**previous, 'text_hash': None}
+                else:
+                    manifest.entries[source_key] = {**entry, 'chunk_ids': previous['chunk_ids']}
+                    continue
+            if previous and previous['text_hash'] == entry['text_hash']:
+                if previous['metadata_hash'] != entry['metadata_hash']:
+                    # Chunks of an unchanged text are the same, only their metadata is rewritten
+                    metadata_updates[source_key] = ({**entry, 'chunk_ids': previous['chunk_ids']}, doc.metadata)
+                    pending_chunks += len(previous['chunk_ids'])
+                    if pending_chunks >= METADATA_UPDATE_BATCH_SIZE:
+                        flush_metadata_updates()
+                        pending_chunks = 0
+                continue
+
+            chunks = text_spliter.split_documents([doc])
+            entry['chunk_ids'] = [f"{source_key}#{i}" for i in range(len(chunks))]
+            if previous:
+                vectorStoreService.delete_documents(list(set(previous['chunk_ids']) - set(entry['chunk_ids'])), collection_name)
+            if not chunks:
+                manifest.entries[source_key] = entry
+                continue
+            progress.add(source_key, entry)
+            yield from zip(entry['chunk_ids'], chunks)
+        flush_metadata_updates()
+
+    vectorStoreService.upsert_stream(changed_chunks(), collection_name, on_batch=progress.on_batch)
+
+    # Removals are only known once the whole source has been read
+    removed_keys = set(manifest.entries) - seen_keys
+    stale_ids = [chunk_id for source_key in removed_keys for chunk_id in manifest.entries.pop(source_key)['chunk_ids']]
+    vectorStoreService.delete_documents(stale_ids, collection_name)
+    progress.save(complete=True)
+
+    logger.info(f"Synced {collection_name}: {progress.embedded} records embedded, "
+                f"{progress.metadata_updated} metadata updated, "
+                f"{len(seen_keys) - progress.embedded - progress.metadata_updated - len(progress.failed_keys)} unchanged, "
+                f"{len(progress.failed_keys)} failed, {len(removed_keys)} removed")
+
+    # The lexical index is versioned by the manifest, so it is only rebuilt when the contents changed
+    _collection_versions[storage_name] = (_manifest_mtime(storage_name), manifest.fingerprint)
+    load_or_build_bm25_index(collection, storage_name, manifest.fingerprint)
+    return collection
+
+
+def _manifest_mtime(collection_name: str) -> int | None:
+    try:
+        return IngestionManifest.path_for(collection_name).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def collection_version(collection_name: str) -> str:
+    '''Version tag for the current contents of a collection, used to key derived indexes and caches.
+
+    `collection_name` is the name of the Chroma collection, i.e. VectorStoreService.storage_name.
+    The tag is read again whenever the manifest file changes, so a re-ingest by another process
+    (the CLI, warmup) reaches the caches of a running API.
+    '''
+    mtime = _manifest_mtime(collection_name)
+    cached = _collection_versions.get(collection_name)
+    if cached is not None and mtime is not None and cached[0] == mtime:
+        return cached[1]
+    manifest = IngestionManifest.load(collection_name) if mtime is not None else None
+    version = manifest.fingerprint if manifest is not None else f"unversioned-{vectorStoreService.client.get_or_create_collection(collection_name).count()}"
+    _collection_versions[collection_name] = (mtime, version)
+    return version
@@ -0,0 +1,156 @@
+from langchain_core.embeddings import Embeddings
+from dataclasses import dataclass, field
+from typing import Callable
+from .telemetry_service import get_logger, registry
+from .vector_store_service import VectorStoreService
+import numpy as np
+import threading
+import re
+import os
+
+# Nearest-centroid probability needed to route to a single agent without asking the LLM
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+# Probability gap under which a request is treated as needing both agents
+ROUTER_AMBIGUITY_MARGIN = float(os.getenv("ROUTER_AMBIGUITY_MARGIN", "0.1"))
+# Softmax temperature over cosine similarities; embeddings of short queries sit close together
+ROUTER_TEMPERATURE = float(os.getenv("ROUTER_TEMPERATURE", "0.05"))
+
+RISK_ROUTE = "risk_agent"
+INCIDENT_ROUTE = "incident_agent"
+ROUTES = (RISK_ROUTE, INCIDENT_ROUTE)
+
+# Only terms that name one side unambiguously: a single hit routes without the centroid check,
+# so generic words ("case", "news") would send plain risk questions to the incident agent
+KEYWORD_RULES = {
+    RISK_ROUTE: re.compile(
+        r"\b(risks?|risky|hazards?|threats?|vulnerabilit(?:y|ies)|mitigat\w*|taxonom\w*|"
+        r"could go wrong|potential harms?|likelihood|severity)\b", re.IGNORECASE),
+    INCIDENT_ROUTE: re.compile(
+        r"\b(incidents?|accidents?|happened|occurred|precedents?|lawsuits?|crash(?:ed|es)?|"
+        r"real[- ]world (?:examples?|failures?)|past (?:cases|failures?)|reported)\b", re.IGNORECASE),
+}
+
+ROUTE_EXEMPLARS = {
+    RISK_ROUTE: [
+        "What are the risks of using AI for hiring decisions?",
+        "Which ethical risks apply to a facial recognition system?",
+        "Classify the privacy risks of a health chatbot",
+        "What could go wrong with an autonomous drone project?",
+        "List the potential harms of a credit scoring model",
+        "Which risk categories cover misinformation from language models?",
+        "How can we mitigate bias in a recommendation system?",
+        "What are the security vulnerabilities of deploying an LLM agent?",
+    ],
+    INCIDENT_ROUTE: [
+        "Have there been incidents with self-driving cars hitting pedestrians?",
+        "Show past cases where facial recognition led to wrongful arrests",
+        "What happened when chatbots gave harmful medical advice?",
+        "Find real-world failures of AI hiring tools",
+        "Were there lawsuits about deepfakes during elections?",
+        "Examples of content moderation algorithms harming children",
+        "Which companies were involved in AI surveillance scandals?",
+        "Reported accidents involving warehouse robots",
+    ],
+}
+
+ROUTER_DECISIONS = registry.counter("router_decisions_total", "Supervisor routing decisions", ("method", "route"))
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class RouteDecision:
+    routes: list[str]
+    confidence: float
+    method: str
+    scores: dict[str, float] = field(default_factory=dict)
+
+
+class IntentRouter:
+    '''Routes a request to the risk agent, the incident agent or both, without an LLM call when it can.
+
+    Keyword rules decide clear-cut requests. Otherwise the query embedding is compared with
+    the centroid of each route's exemplar queries; a confident winner is routed directly,
+    a near tie goes to both agents, and only the band in between asks `llm_fallback`.
+    Exemplar and query embeddings go through the shared embedding cache.
+    '''
+
+    def __init__(self, embeddings: Embeddings, exemplars: dict[str, list[str]] = ROUTE_EXEMPLARS,
+                 threshold: float = ROUTER_CONFIDENCE_THRESHOLD, margin: float = ROUTER_AMBIGUITY_MARGIN,
+                 temperature: float = ROUTER_TEMPERATURE):
+        self.embeddings = embeddings
+        self.exemplars = exemplars
+        self.threshold = threshold
+        self.margin = margin
+        self.temperature = temperature
+        self._centroids: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def centroids(self) -> np.ndarray:
+        with self._lock:
+            if self._centroids is None:
+                rows = []
+                for route in ROUTES:
+                    vectors = np.asarray(self.embeddings.embed_documents(self.exemplars[route]), dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    rows.append(centroid / np.linalg.norm(centroid))
+                self._centroids = np.stack(rows)
+            return self._centroids
+
+    def keyword_scores(self, query: str) -> dict[str, int]:
+        return {route: len(pattern.findall(query)) for route, pattern in KEYWORD_RULES.items()}
+
+    def centroid_scores(self, query: str) -> dict[str, float]:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        similarities = self.centroids @ (vector / np.linalg.norm(vector))
+        logits = similarities / self.temperature
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        return {route: float(p) for route, p in zip(ROUTES, probabilities)}
+
+    def route(self, query: str, llm_fallback: Callable[[str], list[str] | None] | None = None) -> RouteDecision:
+        decision = self._decide(query, llm_fallback)
+        ROUTER_DECISIONS.inc(method=decision.method, route="+".join(decision.routes))
+        logger.info(f"Routed to {', '.join(decision.routes)} by {decision.method} (confidence {decision.confidence:.2f})")
+        return decision
+
+    def _decide(self, query: str, llm_fallback) -> RouteDecision:
+        hits = self.keyword_scores(query)
+        matched = [route for route in ROUTES if hits[route]]
+        if len(matched) == 1:
+            return RouteDecision(matched, 1.0, "keywords", {k: float(v) for k, v in hits.items()})
+        if len(matched) == 2:
+            return RouteDecision(list(ROUTES), 1.0, "keywords", {k: float(v) for k, v in hits.items()})
+
+        scores = self.centroid_scores(query)
+        ranked = sorted(ROUTES, key=lambda route: scores[route], reverse=True)
+        best, runner_up = scores[ranked[0]], scores[ranked[1]]
+        if best >= self.threshold:
+            return RouteDecision([ranked[0]], best, "centroid", scores)
+        if best - runner_up < self.margin:
+            return RouteDecision(list(ROUTES), best, "ambiguous", scores)
+
+        if llm_fallback is not None:
+            try:
+                routes = llm_fallback(query)
+                if routes:
+                    return RouteDecision(routes, best, "llm", scores)
+            except Exception as e:
+                logger.warning(f"LLM routing fallback failed: {e}")
+        # Without a usable answer, asking both agents is cheaper than a wrong single route
+        return RouteDecision(list(ROUTES), best, "ambiguous", scores)
+
+
+_router: IntentRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_intent_router() -> IntentRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = IntentRouter(VectorStoreService().embeddings)
+    return _router
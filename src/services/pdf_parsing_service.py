@@ -0,0 +1,262 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable
+from .telemetry_service import get_logger, span
+import pyarrow as pa
+import multiprocessing
+import threading
+import hashlib
+import duckdb
+import json
+import io
+import os
+
+PDF_ELEMENT_CACHE_PATH = os.getenv(
+    "PDF_ELEMENT_CACHE_PATH",
+    str(Path(__file__).resolve().parents[2] / "data" / "cache" / "pdf_elements.duckdb")
+)
+# Unstructured partitioning strategy: "auto", "fast", "hi_res" or "ocr_only"
+PDF_PARTITION_STRATEGY = os.getenv("PDF_PARTITION_STRATEGY", "auto")
+PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "10"))
+
+# Bump when the element layout below changes, so older cache entries are parsed again
+PARSER_VERSION = 1
+
+# Element metadata kept in the cache; the rest (coordinates, file paths, timestamps) is either
+# nested, which Chroma cannot store, or changes without the document changing
+ELEMENT_METADATA_FIELDS = ('element_id', 'category', 'page_number', 'parent_id', 'languages', 'text_as_html')
+
+ELEMENT_SCHEMA = pa.schema([
+    ('cache_key', pa.string()),
+    ('position', pa.int64()),
+    ('element_id', pa.string()),
+    ('category', pa.string()),
+    ('page_number', pa.int64()),
+    ('text', pa.string()),
+    ('metadata', pa.string()),
+])
+
+logger = get_logger(__name__)
+
+
+def file_hash(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(path: str | Path, strategy: str = PDF_PARTITION_STRATEGY) -> str:
+    '''Elements depend on the file contents and on how they were partitioned, not on the path.'''
+    return f"{file_hash(path)}:{strategy}:v{PARSER_VERSION}"
+
+
+def _element_record(element) -> dict:
+    metadata = element.metadata.to_dict()
+    metadata['element_id'] = element.id
+    metadata['category'] = element.category
+    kept = {}
+    for field in ELEMENT_METADATA_FIELDS:
+        value = metadata.get(field)
+        if isinstance(value, list):
+            value = ", ".join(map(str, value))
+        if value not in (None, ""):
+            kept[field] = value
+    return {'text': element.text, 'metadata': kept}
+
+
+def partition_page_range(path: str, first_page: int, last_page: int | None, strategy: str) -> list[dict]:
+    '''Partition pages [first_page, last_page) of a PDF, numbered from 0; runs in a worker process.
+
+    The range is copied into an in-memory PDF so Unstructured only reads those pages;
+    `starting_page_number` and `metadata_filename` keep page numbers and file names the same
+    as when the whole file is partitioned at once.
+    '''
+    from unstructured.partition.pdf import partition_pdf
+
+    if first_page == 0 and last_page is None:
+        return [_element_record(e) for e in partition_pdf(filename=path, strategy=strategy)]
+
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for page in PdfReader(path).pages[first_page:last_page]:
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    buffer.seek(0)
+    elements = partition_pdf(file=buffer, strategy=strategy, starting_page_number=first_page + 1,
+                             metadata_filename=Path(path).name)
+    return [_element_record(e) for e in elements]
+
+
+def page_ranges(path: str, pages_per_task: int = PDF_PAGES_PER_TASK) -> list[tuple[int, int | None]]:
+    try:
+        from pypdf import PdfReader
+        page_count = len(PdfReader(path).pages)
+    except ImportError:
+        # Without pypdf the file cannot be split, parse it in one task
+        return [(0, None)]
+    if page_count <= pages_per_task:
+        return [(0, None)]
+    return [(first, min(first + pages_per_task, page_count)) for first in range(0, page_count, pages_per_task)]
+
+
+class PdfElementCache:
+    '''Parsed PDF elements in a DuckDB table, keyed by file hash and partitioning strategy.'''
+
+    def __init__(self, db_path: str = PDF_ELEMENT_CACHE_PATH):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._con = duckdb.connect(database=db_path)
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS pdf_elements (
+                cache_key VARCHAR,
+                position BIGINT,
+                element_id VARCHAR,
+                category VARCHAR,
+                page_number BIGINT,
+                text VARCHAR,
+                metadata VARCHAR
+            )
+        """)
+        self._con.execute("""
+            CREATE TABLE IF NOT EXISTS pdf_files (
+                cache_key VARCHAR PRIMARY KEY,
+                file_name VARCHAR,
+                elements BIGINT,
+                parsed_at TIMESTAMP DEFAULT current_timestamp
+            )
+        """)
+
+    def get(self, key: str) -> list[dict] | None:
+        with self._lock:
+            cursor = self._con.cursor()
+            if cursor.execute("SELECT 1 FROM pdf_files WHERE cache_key = ?", [key]).fetchone() is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            rows = cursor.execute(
+                "SELECT text, metadata FROM pdf_elements WHERE cache_key = ? ORDER BY position", [key]
+            ).fetchall()
+        return [{'text': text, 'metadata': json.loads(metadata)} for text, metadata in rows]
+
+    def put(self, key: str, file_name: str, elements: list[dict]):
+        table = pa.Table.from_pylist([
+            {
+                'cache_key': key,
+                'position': position,
+                'element_id': element['metadata'].get('element_id'),
+                'category': element['metadata'].get('category'),
+                'page_number': element['metadata'].get('page_number'),
+                'text': element['text'],
+                'metadata': json.dumps(element['metadata'], default=str),
+            }
+            for position, element in enumerate(elements)
+        ], schema=ELEMENT_SCHEMA)
+        with self._lock:
+            cursor = self._con.cursor()
+            cursor.execute("BEGIN TRANSACTION")
+            try:
+                cursor.execute("DELETE FROM pdf_elements WHERE cache_key = ?", [key])
+                cursor.execute("DELETE FROM pdf_files WHERE cache_key = ?", [key])
+                cursor.register("new_elements", table)
+                cursor.execute("INSERT INTO pdf_elements SELECT * FROM new_elements")
+                cursor.unregister("new_elements")
+                cursor.execute("INSERT INTO pdf_files (cache_key, file_name, elements) VALUES (?, ?, ?)",
+                               [key, file_name, len(elements)])
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, elements = self._con.cursor().execute(
+                "SELECT COUNT(*), COALESCE(SUM(elements), 0) FROM pdf_files"
+            ).fetchone() # type: ignore
+        return {'hits': self.hits, 'misses': self.misses, 'files': files, 'elements': elements}
+
+    def close(self):
+        self._con.close()
+
+
+def resolve_pdf_paths(spec: str) -> list[Path]:
+    '''PDF files named by `spec`: a file, a directory of PDFs, or several of either separated by os.pathsep.'''
+    paths = []
+    for part in filter(None, spec.split(os.pathsep)):
+        path = Path(part)
+        if path.is_dir():
+            paths.extend(sorted(p for p in path.iterdir() if p.suffix.lower() == ".pdf"))
+        else:
+            paths.append(path)
+    return paths
+
+
+def parse_pdfs(paths: Iterable[str | Path], cache: PdfElementCache | None = None,
+               strategy: str = PDF_PARTITION_STRATEGY, max_workers: int = PDF_PARSE_WORKERS,
+               pages_per_task: int = PDF_PAGES_PER_TASK) -> dict[Path, list[dict]]:
+    '''Elements of each PDF, from the cache when the file was parsed before, otherwise parsed in parallel.
+
+    Uncached files are cut into page ranges and every range of every file goes to one shared
+    process pool, so a batch of small documents parallelises as well as one large document.
+    '''
+    paths = [Path(p) for p in paths]
+    results: dict[Path, list[dict]] = {}
+    to_parse: dict[Path, str] = {}
+    for path in paths:
+        key = cache_key(path, strategy)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[path] = cached
+        else:
+            to_parse[path] = key
+    if not to_parse:
+        return results
+
+    tasks = [(path, first, last) for path in to_parse for first, last in page_ranges(str(path), pages_per_task)]
+    logger.info(f"Parsing {len(to_parse)} PDFs in {len(tasks)} page ranges on {max_workers} processes")
+    parts: dict[Path, dict[int, list[dict]]] = {path: {} for path in to_parse}
+    with span("pdf.parse", files=len(to_parse), tasks=len(tasks)):
+        if max_workers <= 1 or len(tasks) == 1:
+            for path, first, last in tasks:
+                parts[path][first] = partition_page_range(str(path), first, last, strategy)
+        else:
+            # Forking copies the locks of whatever threads are running (tool executor, ingest pool)
+            # into children that never release them; spawned workers start clean
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(tasks)),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {
+                    executor.submit(partition_page_range, str(path), first, last, strategy): (path, first)
+                    for path, first, last in tasks
+                }
+                for future in as_completed(futures):
+                    path, first = futures[future]
+                    parts[path][first] = future.result()
+
+    for path, key in to_parse.items():
+        elements = [element for first in sorted(parts[path]) for element in parts[path][first]]
+        if cache is not None:
+            cache.put(key, path.name, elements)
+        results[path] = elements
+        logger.info(f"Parsed {path.name}: {len(elements)} elements")
+    return results
+
+
+_cache: PdfElementCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_element_cache() -> PdfElementCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PdfElementCache()
+    return _cache
@@ -1,35 +1,51 @@
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from .vector_store_service import VectorStoreService
-from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
-from langchain_community.document_loaders import UnstructuredPDFLoader
+from .ingestion_manifest_service import sync_documents
+from .pdf_parsing_service import parse_pdfs, resolve_pdf_paths, get_pdf_element_cache
 from datetime import datetime
 import os
-import csv
 
-PROPRIETARY_FRAMEWORK_DATA_DIR = os.getenv("PROPRIETARY_FRAMEWORK_DATA_DIR", "data/raw/PL_2338-2023.csv")
-
-vectorStoreService = VectorStoreService()
+# A PDF, a directory of PDFs, or several of either separated by os.pathsep
+PROPRIETARY_FRAMEWORK_DATA_DIR = os.getenv("PROPRIETARY_FRAMEWORK_DATA_DIR", "data/raw/PL_2338-2023.pdf")
 
+# Source and owner recorded for known documents, other PDFs use their file name for both.
+# The bill keeps the source it was always cited by.
+KNOWN_DOCUMENTS = {
+    'PL_2338-2023.pdf': {'source': 'proprietary_framework.pdf', 'data_owner': 'PL 2338/2023'},
+}
 
-def ingest_proprietary_framework(chunk_size: int = 1000, chunk_overlap: int = 200):
-    
-    loader = UnstructuredPDFLoader(PROPRIETARY_FRAMEWORK_DATA_DIR, mode="elements")
-    docs_unstructured = loader.load()
-    structured_docs = []
-    for doc in docs_unstructured:
-        doc.metadata['source'] = 'proprietary_framework.pdf'
-        doc.metadata['ingestion_date'] = datetime.now().strftime('%Y-%m-%d')
-        doc.metadata['data_owner'] = 'PL 2338/2023'
-        structured_docs.append(doc)
-
-    text_spliter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    split_docs = text_spliter.split_documents(structured_docs)
-
-    vector_db = vectorStoreService.ingest_documents(split_docs, collection_name="reports_database")
-    return vector_db
+vectorStoreService = VectorStoreService()
 
-    
 
+def iter_framework_documents(paths=None):
+    '''Yield (source_key, Document) pairs for every element of the framework PDFs.
+
+    Parsing goes through the element cache, so only PDFs that changed since they were last
+    parsed are partitioned again; re-chunking with other parameters reads the cache.
+    '''
+    paths = resolve_pdf_paths(PROPRIETARY_FRAMEWORK_DATA_DIR) if paths is None else paths
+    parsed = parse_pdfs(paths, cache=get_pdf_element_cache())
+    ingestion_date = datetime.now().strftime('%Y-%m-%d')
+    for path, elements in parsed.items():
+        for index, element in enumerate(elements):
+            known = KNOWN_DOCUMENTS.get(path.name, {})
+            metadata = {
+                **element['metadata'],
+                'source': known.get('source', path.name),
+                'ingestion_date': ingestion_date,
+                'data_owner': known.get('data_owner', path.stem),
+            }
+            # Unstructured element ids are derived from the element text and position,
+            # the file stem keeps identical elements of different PDFs apart
+            source_key = f"{path.stem}:{metadata.get('element_id') or f'element-{index}'}"
+            yield source_key, Document(page_content=element['text'], metadata=metadata)
 
 
+def ingest_proprietary_framework(chunk_size: int = 1000, chunk_overlap: int = 200):
+    vector_db = sync_documents(
+        iter_framework_documents(),
+        collection_name="reports_database",
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+    return vector_db
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable
+import numpy as np
+import threading
+import asyncio
+import time
+import json
+import os
+
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("QUERY_CACHE_SIMILARITY_THRESHOLD", "0.97"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "900"))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+
+
+class SemanticQueryCache:
+    '''Caches retrieval results keyed by query embedding.
+
+    A lookup hits when a cached query with the same search parameters has cosine similarity
+    at or above `threshold`, so rephrasings of the same question reuse the earlier results.
+    Entries expire after `ttl` seconds, the least recently used are evicted beyond
+    `max_entries`, and everything is dropped when the collection version changes.
+    '''
+
+    def __init__(self, name: str, embed_query: Callable[[str], list[float]],
+                 threshold: float = QUERY_CACHE_SIMILARITY_THRESHOLD,
+                 ttl: float = QUERY_CACHE_TTL_SECONDS, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.name = name
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._version: str | None = None
+        self._entries: OrderedDict[int, tuple[np.ndarray, str, float, object]] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    @staticmethod
+    def params_key(**params) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, version: str):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def lookup(self, embedding, params_key: str, version: str):
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            expired = [key for key, entry in self._entries.items() if now - entry[2] > self.ttl]
+            for key in expired:
+                del self._entries[key]
+
+            candidates = [key for key, entry in self._entries.items() if entry[1] == params_key]
+            if candidates:
+                matrix = np.stack([self._entries[key][0] for key in candidates])
+                similarities = matrix @ self._normalize(embedding)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][3]
+            self.misses += 1
+            return None
+
+    def store(self, embedding, params_key: str, version: str, results):
+        with self._lock:
+            self._check_version(version)
+            self._entries[self._next_id] = (self._normalize(embedding), params_key, time.monotonic(), results)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, query_text: str, params_key: str, version: str, compute: Callable[[], object]):
+        embedding = self.embed_query(query_text)
+        results = self.lookup(embedding, params_key, version)
+        if results is None:
+            results = compute()
+            self.store(embedding, params_key, version, results)
+        return results
+
+    async def aget_or_compute(self, query_text: str, params_key: str, version: str,
+                              compute: Callable[[], Awaitable[object]]):
+        embedding = await asyncio.to_thread(self.embed_query, query_text)
+        results = self.lookup(embedding, params_key, version)
+        if results is None:
+            results = await compute()
+            self.store(embedding, params_key, version, results)
+        return results
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+        }
+
+
+_caches: dict[str, SemanticQueryCache] = {}
+
+
+def query_cache_stats() -> dict[str, dict]:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,222 @@
+from .incidents_reports_etl_service import DB_PATH
+from .report_search_service import has_report_search_index, search_query, tokenize
+from .telemetry_service import get_logger, span
+from collections import OrderedDict
+import pyarrow as pa
+import duckdb
+import threading
+import os
+
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+logger = get_logger(__name__)
+
+REPORT_COLUMNS = """
+    r.authors AS Author,
+    r.date_published,
+    r.description,
+    r.image_url,
+    r.language,
+    r.source_domain,
+    r.title,
+    r.text,
+    r.url
+"""
+
+# Ids are bound as list parameters, so every lookup reuses the same prepared statement
+_REPORTS_BY_GROUP_QUERY = f"""
+    WITH wanted AS (
+        SELECT
+            UNNEST($groups::BIGINT[]) AS group_idx,
+            UNNEST($ids::BIGINT[]) AS report_rowid,
+            UNNEST(range(len($ids::BIGINT[]))) AS position
+    )
+    SELECT w.group_idx, w.report_rowid, {REPORT_COLUMNS}
+    FROM wanted w
+    JOIN reports r ON r.rowid = w.report_rowid
+    ORDER BY w.position
+"""
+
+
+def _to_arrow_table(cursor) -> pa.Table:
+    # DuckDB 1.5 renamed fetch_arrow_table to to_arrow_table
+    if hasattr(cursor, "to_arrow_table"):
+        return cursor.to_arrow_table()
+    return cursor.fetch_arrow_table()
+
+
+def _to_arrow_reader(cursor, batch_size: int) -> pa.RecordBatchReader:
+    if hasattr(cursor, "to_arrow_reader"):
+        return cursor.to_arrow_reader(batch_size)
+    return cursor.fetch_record_batch(batch_size)
+
+
+class ReportRepository:
+    '''Read-only access to the reports table over one long-lived DuckDB connection.
+
+    Each thread gets its own cursor on the shared connection, which is how DuckDB
+    expects a connection to be used concurrently.
+    '''
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+        self._con = duckdb.connect(database=db_path, read_only=True)
+        self._local = threading.local()
+        self.has_search_index = has_report_search_index(self._con)
+        if not self.has_search_index:
+            logger.warning(f"No report search index in {db_path}, run create_reports_table to build it")
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._con.cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    def fetch_reports_table(self, groups: list[list[int]]) -> pa.Table:
+        '''Fetch the reports of several incidents in one query.
+
+        `groups[i]` holds the report rowids of the i-th incident; the result has one row per
+        found report, tagged with `group_idx`, in the order the ids were given.
+        '''
+        group_idx = [i for i, ids in enumerate(groups) for _ in ids]
+        ids = [row_id for row_ids in groups for row_id in row_ids]
+        with span("duckdb.reports_by_group", groups=len(groups), ids=len(ids)):
+            cursor = self._cursor().execute(_REPORTS_BY_GROUP_QUERY, {'groups': group_idx, 'ids': ids})
+            return _to_arrow_table(cursor)
+
+    def iter_report_batches(self, groups: list[list[int]], batch_size: int = 1024) -> pa.RecordBatchReader:
+        '''Like fetch_reports_table, but streams the result as Arrow record batches.'''
+        group_idx = [i for i, ids in enumerate(groups) for _ in ids]
+        ids = [row_id for row_ids in groups for row_id in row_ids]
+        cursor = self._cursor().execute(_REPORTS_BY_GROUP_QUERY, {'groups': group_idx, 'ids': ids})
+        return _to_arrow_reader(cursor, batch_size)
+
+    def reports_by_group(self, groups: list[list[int]]) -> list[list[dict]]:
+        '''Plain-Python view of fetch_reports_table: one list of report dicts per group.'''
+        results: list[list[dict]] = [[] for _ in groups]
+        if not any(groups):
+            return results
+        table = self.fetch_reports_table(groups)
+        for record in table.drop_columns(['report_rowid']).to_pylist():
+            results[record.pop('group_idx')].append(record)
+        return results
+
+    def reports_by_rowid(self, row_ids: list[int]) -> dict[int, dict]:
+        '''Fetch reports keyed by rowid; ids without a stored report are left out.'''
+        if not row_ids:
+            return {}
+        table = self.fetch_reports_table([row_ids]).drop_columns(['group_idx'])
+        return {record.pop('report_rowid'): record for record in table.to_pylist()}
+
+    def search_report_ids(self, query: str, top_k: int = 5) -> list[tuple[int, float]]:
+        '''Rowids and BM25 scores of the reports best matching `query`, best first.'''
+        terms = sorted(set(tokenize(query)))
+        if not terms or top_k <= 0 or not self.has_search_index:
+            return []
+        with span("duckdb.search_reports", terms=len(terms), top_k=top_k):
+            rows = self._cursor().execute(search_query(len(terms)), [*terms, top_k]).fetchall()
+        return [(int(row_id), float(score)) for row_id, score in rows]
+
+    def close(self):
+        self._con.close()
+
+
+def _report_size(report: dict) -> int:
+    return sum(len(v) if isinstance(v, str) else 8 for v in report.values())
+
+
+class ReportCache:
+    '''In-process LRU cache of report bodies, bounded by the approximate size of their text.'''
+
+    def __init__(self, repository_factory=None, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self._repository_factory = repository_factory or get_report_repository
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[dict, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, row_id: int, report: dict):
+        size = _report_size(report)
+        if size > self.max_bytes:
+            return
+        if row_id in self._entries:
+            self.current_bytes -= self._entries.pop(row_id)[1]
+        self._entries[row_id] = (report, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def get_many(self, row_ids: list[int]) -> dict[int, dict]:
+        found = {}
+        with self._lock:
+            for row_id in row_ids:
+                entry = self._entries.get(row_id)
+                if entry is not None:
+                    self._entries.move_to_end(row_id)
+                    found[row_id] = entry[0]
+            self.hits += len(found)
+
+        missing = [row_id for row_id in dict.fromkeys(row_ids) if row_id not in found]
+        if missing:
+            fetched = self._repository_factory().reports_by_rowid(missing)
+            with self._lock:
+                self.misses += len(missing)
+                for row_id, report in fetched.items():
+                    self._put(row_id, report)
+            found.update(fetched)
+        return found
+
+    def reports_by_group(self, groups: list[list[int]]) -> list[list[dict]]:
+        '''Same contract as ReportRepository.reports_by_group, served from the cache when possible.'''
+        found = self.get_many([row_id for row_ids in groups for row_id in row_ids])
+        return [[found[row_id] for row_id in row_ids if row_id in found] for row_ids in groups]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+_repository: ReportRepository | None = None
+_repository_lock = threading.Lock()
+
+
+def get_report_repository() -> ReportRepository:
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = ReportRepository()
+    return _repository
+
+
+def close_report_repository():
+    '''Release the shared read-only connection, e.g. before reloading the reports table.'''
+    global _repository
+    with _repository_lock:
+        if _repository is not None:
+            _repository.close()
+            _repository = None
+    _report_cache.clear()
+
+
+_report_cache = ReportCache()
+
+
+def get_report_cache() -> ReportCache:
+    return _report_cache
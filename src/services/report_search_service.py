@@ -0,0 +1,132 @@
+from .telemetry_service import get_logger, span
+import duckdb
+import re
+import os
+
+# Characters of report text returned around the best matching passage
+REPORT_PASSAGE_CHARS = int(os.getenv("REPORT_PASSAGE_CHARS", "400"))
+
+# Same parameters as the collection BM25 indexes
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# RE2 counterpart of the `\w+` tokenizer used by bm25_index_service, including non-ASCII letters
+_SQL_TOKEN_PATTERN = r"[\p{L}\p{N}_]+"
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+logger = get_logger(__name__)
+
+# One row per term with its posting list, keyed by a primary key on the term: a query is an
+# index lookup of a few rows whatever the corpus size. Postings hold the final BM25 weight of
+# each (term, report) pair, so scoring only sums them.
+_CREATE_TERMS = """
+    CREATE TABLE report_terms (
+        term VARCHAR PRIMARY KEY,
+        report_rowids BIGINT[],
+        weights FLOAT[]
+    )
+"""
+
+_BUILD_TERMS = f"""
+    INSERT INTO report_terms
+    WITH tokens AS (
+        SELECT rowid AS report_rowid,
+               UNNEST(regexp_extract_all(lower(concat_ws(' ', title, description, text)), '{_SQL_TOKEN_PATTERN}')) AS term
+        FROM reports
+    ),
+    counts AS (
+        SELECT term, report_rowid, COUNT(*) AS tf FROM tokens GROUP BY term, report_rowid
+    ),
+    lengths AS (
+        SELECT report_rowid, SUM(tf) AS length FROM counts GROUP BY report_rowid
+    ),
+    stats AS (
+        SELECT COUNT(*) AS num_docs, AVG(length) AS avgdl FROM lengths
+    ),
+    doc_freqs AS (
+        SELECT term, COUNT(*) AS df FROM counts GROUP BY term
+    ),
+    postings AS (
+        SELECT
+            c.term,
+            c.report_rowid,
+            (ln(1 + (s.num_docs - d.df + 0.5) / (d.df + 0.5))
+                * c.tf * ({BM25_K1} + 1)
+                / (c.tf + {BM25_K1} * (1 - {BM25_B} + {BM25_B} * l.length / s.avgdl)))::FLOAT AS weight
+        FROM counts c
+        JOIN doc_freqs d USING (term)
+        JOIN lengths l USING (report_rowid)
+        CROSS JOIN stats s
+    )
+    SELECT term, list(report_rowid ORDER BY report_rowid), list(weight ORDER BY report_rowid)
+    FROM postings
+    GROUP BY term
+"""
+
+
+def build_report_search_index(con: duckdb.DuckDBPyConnection):
+    '''(Re)build the inverted index over the title, description and text of every stored report.'''
+    with span("duckdb.build_report_search_index"):
+        con.execute("DROP TABLE IF EXISTS report_terms")
+        con.execute(_CREATE_TERMS)
+        con.execute(_BUILD_TERMS)
+    terms, postings = con.execute("SELECT COUNT(*), COALESCE(SUM(len(report_rowids)), 0) FROM report_terms").fetchone() # type: ignore
+    logger.info(f"Report search index built: {terms} terms, {postings} postings")
+
+
+def has_report_search_index(con: duckdb.DuckDBPyConnection) -> bool:
+    return con.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'report_terms'"
+    ).fetchone()[0] > 0 # type: ignore
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def search_query(num_terms: int) -> str:
+    '''BM25 top-k over the postings of `num_terms` distinct query terms.
+
+    The terms are bound as separate parameters of an IN list rather than one list parameter,
+    so DuckDB sees constants it can answer from the primary key index.
+    '''
+    placeholders = ", ".join("?" for _ in range(num_terms))
+    return f"""
+        SELECT report_rowid, SUM(weight) AS score
+        FROM (
+            SELECT UNNEST(report_rowids) AS report_rowid, UNNEST(weights) AS weight
+            FROM report_terms
+            WHERE term IN ({placeholders})
+        )
+        GROUP BY report_rowid
+        ORDER BY score DESC, report_rowid
+        LIMIT ?
+    """
+
+
+def best_passage(text: str, query: str, max_chars: int = REPORT_PASSAGE_CHARS) -> str:
+    '''Window of `text` holding the most distinct query terms, cut on whitespace.'''
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    terms = set(tokenize(query))
+    matches = [(m.start(), m.group(0).lower()) for m in _TOKEN_PATTERN.finditer(text) if m.group(0).lower() in terms]
+    if not matches:
+        start = 0
+    else:
+        best_start, best_hits, right = matches[0][0], 0, 0
+        for left in range(len(matches)):
+            while right < len(matches) and matches[right][0] < matches[left][0] + max_chars:
+                right += 1
+            hits = len({term for _, term in matches[left:right]})
+            if hits > best_hits:
+                best_start, best_hits = matches[left][0], hits
+        # Open a little before the first hit so it reads in context
+        start = max(0, best_start - max_chars // 5)
+        space = text.rfind(" ", 0, start)
+        start = space + 1 if start and space >= 0 else start
+    passage = text[start:start + max_chars]
+    if start + max_chars < len(text):
+        passage = passage[:passage.rfind(" ")] if " " in passage else passage
+        passage += " …"
+    return ("… " if start else "") + passage
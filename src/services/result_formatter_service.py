@@ -0,0 +1,290 @@
+from langchain_core.documents import Document
+from dataclasses import dataclass
+from collections import OrderedDict
+from .telemetry_service import registry
+import threading
+import json
+import ast
+import re
+import os
+
+# Per-call size of a search result sent to the model, in estimated tokens
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1500"))
+# Upper bound on the excerpt of each result; the budget may trim it further
+RESULT_SNIPPET_CHARS = int(os.getenv("RESULT_SNIPPET_CHARS", "400"))
+# Recently returned documents kept in memory for get_document
+DOCUMENT_REGISTRY_SIZE = int(os.getenv("DOCUMENT_REGISTRY_SIZE", "2048"))
+
+# Same ratio as langchain's count_tokens_approximately
+CHARS_PER_TOKEN = 4
+MIN_SNIPPET_CHARS = 80
+MAX_REPORT_TITLES = 3
+
+RESULT_CHARS = registry.counter("tool_result_chars_total", "Characters of search results before and after formatting", ("tool", "stage"))
+
+
+@dataclass(frozen=True)
+class ResultLayout:
+    '''How the results of one collection are rendered for the model.
+
+    Short ids are "<prefix>:<chunk id>", so they are stable across runs and resolve back to
+    the collection without a lookup table.
+    '''
+    prefix: str
+    collection: str
+    source: str
+    # (label, metadata keys joined with " / ")
+    fields: tuple[tuple[str, tuple[str, ...]], ...]
+    # page_content lines repeating what the header already shows
+    header_lines: tuple[str, ...] = ("Title:",)
+
+
+RISK_LAYOUT = ResultLayout(
+    prefix="R",
+    collection="ai_risk_database_v3",
+    source="ai_risk_database_v3.csv",
+    fields=(
+        ("category", ("risk_category", "risk_subcategory")),
+        ("domain", ("domain", "sub_domain")),
+        ("entity", ("entity",)),
+        ("intent", ("intent",)),
+        ("timing", ("timing",)),
+        ("ref", ("quick_ref",)),
+    ),
+    header_lines=("Title:", "Risk category:", "Risk subcategory:"),
+)
+
+INCIDENT_LAYOUT = ResultLayout(
+    prefix="I",
+    collection="incidents_database",
+    source="incidents.csv",
+    fields=(
+        ("date", ("incident_date",)),
+        ("deployer", ("deployer",)),
+        ("developer", ("developer",)),
+        ("harmed", ("harmed_parties",)),
+    ),
+    header_lines=("Title:", "Deployer:", "Developer:", "Harmed Parties:"),
+)
+
+# Reports live in the DuckDB reports table, their ids are table rowids
+REPORT_LAYOUT = ResultLayout(
+    prefix="E",
+    collection="reports",
+    source="reports.csv",
+    fields=(
+        ("source", ("source_domain",)),
+        ("date", ("date_published",)),
+        ("author", ("Author",)),
+        ("url", ("url",)),
+    ),
+    header_lines=(),
+)
+
+LAYOUTS = {layout.prefix: layout for layout in (RISK_LAYOUT, INCIDENT_LAYOUT, REPORT_LAYOUT)}
+
+# "[R:EV123#0] Title" opens every formatted result
+CITATION_HEADER = re.compile(r"^\[([A-Z]):([^\]\s]+)\] ?(.*)$", re.MULTILINE)
+
+
+def short_id(layout: ResultLayout, document: Document) -> str:
+    return f"{layout.prefix}:{document.id or document.metadata.get('id') or document.metadata.get('title', '')}"
+
+
+def split_short_id(doc_id: str) -> tuple[ResultLayout | None, str]:
+    prefix, _, chunk_id = doc_id.strip().strip("[]").partition(":")
+    return LAYOUTS.get(prefix), chunk_id
+
+
+def _plain(value) -> str:
+    '''Metadata values are often JSON or Python list literals; render them as a comma separated list.'''
+    if value is None:
+        return ""
+    text = str(value).strip()
+    if text[:1] == "[":
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                items = parse(text)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(items, list):
+                return ", ".join(str(item) for item in items if item not in (None, ""))
+    return text
+
+
+def _collapse(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _trim(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1]
+    # Prefer ending on a word boundary when one is close
+    space = cut.rfind(" ")
+    if space > max_chars * 0.8:
+        cut = cut[:space]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def _report_titles(document: Document) -> str:
+    details = document.metadata.get('reports_details')
+    if not details:
+        return ""
+    try:
+        reports = json.loads(details) if isinstance(details, str) else details
+    except json.JSONDecodeError:
+        return ""
+    if not isinstance(reports, list) or not reports:
+        return ""
+    titles = []
+    for report in reports[:MAX_REPORT_TITLES]:
+        if not isinstance(report, dict):
+            continue
+        where = ", ".join(str(report[key])[:10] if key == 'date_published' else str(report[key])
+                          for key in ('source_domain', 'date_published') if report.get(key))
+        title = _trim(_collapse(str(report.get('title') or "untitled")), 90)
+        titles.append(f"{title} ({where})" if where else title)
+    more = f"; +{len(reports) - len(titles)} more" if len(reports) > len(titles) else ""
+    return f"reports ({len(reports)}): " + "; ".join(titles) + more
+
+
+def _head(layout: ResultLayout, document: Document) -> str:
+    title = _collapse(str(document.metadata.get('title') or "")) or "untitled"
+    lines = [f"[{short_id(layout, document)}] {title}"]
+    fields = []
+    for label, keys in layout.fields:
+        value = " / ".join(part for part in (_plain(document.metadata.get(key)) for key in keys) if part)
+        if value:
+            fields.append(f"{label}: {_trim(value, 80)}")
+    if fields:
+        lines.append(" | ".join(fields))
+    reports = _report_titles(document)
+    if reports:
+        lines.append(reports)
+    return "\n".join(lines)
+
+
+def _snippet(layout: ResultLayout, document: Document) -> str:
+    lines = [line for line in document.page_content.splitlines() if not line.startswith(layout.header_lines)]
+    return _collapse(" ".join(lines))
+
+
+class DocumentRegistry:
+    '''LRU of documents recently shown to the model, so get_document can return them as they were retrieved.'''
+
+    def __init__(self, max_entries: int = DOCUMENT_REGISTRY_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Document] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, doc_id: str, document: Document):
+        with self._lock:
+            self._entries[doc_id] = document
+            self._entries.move_to_end(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, doc_id: str) -> Document | None:
+        with self._lock:
+            document = self._entries.get(doc_id)
+            if document is not None:
+                self._entries.move_to_end(doc_id)
+            return document
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+document_registry = DocumentRegistry()
+
+
+def format_results(results, layout: ResultLayout, token_budget: int = TOOL_RESULT_TOKEN_BUDGET,
+                   tool_name: str = "") -> str:
+    '''Render search results as compact citation blocks that fit `token_budget`.
+
+    Each block is a "[<short id>] <title>" header, the layout's key fields and an excerpt.
+    Headers are always kept; the excerpts share what the budget leaves, and results that
+    still do not fit are listed by id only. Plain string results (no match, errors) pass through.
+    '''
+    if isinstance(results, str) or not results:
+        return results if isinstance(results, str) else "No results."
+
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    heads = []
+    for document in results:
+        document_registry.register(short_id(layout, document), document)
+        heads.append(_head(layout, document))
+
+    blocks, omitted, used = [], [], 0
+    for i, (document, head) in enumerate(zip(results, heads)):
+        if omitted:
+            omitted.append(short_id(layout, document))
+            continue
+        # Spread what is left evenly over the remaining results, after their headers
+        remaining_heads = sum(len(h) + 4 for h in heads[i:])
+        share = (budget_chars - used - remaining_heads) // (len(results) - i)
+        snippet = _snippet(layout, document)
+        block = head
+        if snippet and share >= MIN_SNIPPET_CHARS:
+            block += "\n> " + _trim(snippet, min(share, RESULT_SNIPPET_CHARS))
+        if blocks and used + len(block) > budget_chars:
+            omitted.append(short_id(layout, document))
+            continue
+        blocks.append(block)
+        used += len(block) + 2
+
+    if omitted:
+        blocks.append(f"[{len(omitted)} more results not shown: {', '.join(omitted)}]")
+    blocks.append("Full records: get_document(doc_id) with an id in brackets.")
+    text = "\n\n".join(blocks)
+
+    RESULT_CHARS.inc(sum(len(document.page_content) + len(str(document.metadata)) for document in results),
+                     tool=tool_name, stage="raw")
+    RESULT_CHARS.inc(len(text), tool=tool_name, stage="formatted")
+    return text
+
+
+def format_document(document: Document, layout: ResultLayout) -> str:
+    '''Full record for get_document: every metadata field, the whole text and the linked reports.'''
+    lines = [f"[{short_id(layout, document)}] {_collapse(str(document.metadata.get('title') or '')) or 'untitled'}"]
+    for key, value in sorted(document.metadata.items()):
+        if key in ('title', 'reports', 'reports_details') or value in (None, ""):
+            continue
+        lines.append(f"{key}: {_plain(value)}")
+    lines.append("")
+    lines.append(document.page_content)
+
+    details = document.metadata.get('reports_details')
+    try:
+        reports = json.loads(details) if isinstance(details, str) else (details or [])
+    except json.JSONDecodeError:
+        reports = []
+    for n, report in enumerate(r for r in reports if isinstance(r, dict)):
+        lines.append("")
+        lines.append(f"Report {n + 1}: {report.get('title') or 'untitled'}")
+        for key in ('source_domain', 'date_published', 'Author', 'url'):
+            if report.get(key):
+                lines.append(f"{key}: {_plain(report[key])}")
+        if report.get('text'):
+            lines.append(str(report['text']).strip())
+    return "\n".join(lines)
+
+
+def parse_citations(text: str) -> list[dict]:
+    '''Citation entries for the result headers found in a formatted tool result.'''
+    citations = []
+    for prefix, chunk_id, title in CITATION_HEADER.findall(text):
+        layout = LAYOUTS.get(prefix)
+        if layout is None:
+            continue
+        citations.append({
+            'id': f"{prefix}:{chunk_id}",
+            'title': title.strip(),
+            'source': layout.source,
+        })
+    return citations
+
+
+def citation_headers(text: str) -> list[str]:
+    return [match.group(0) for match in CITATION_HEADER.finditer(text)]
@@ -1,37 +1,198 @@
-try:
-    from langchain.retrievers import EnsembleRetriever # type: ignore
-except ImportError:
-    try:
-        from langchain.retrievers.ensemble import EnsembleRetriever # type: ignore
-    except ImportError:
-        try:
-            from langchain_community.retrievers import EnsembleRetriever
-        except ImportError:
-            # Fallback for older or weird installations
-            from langchain_classic.retrievers import EnsembleRetriever
-
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
 from langchain_chroma import Chroma
+from pydantic import PrivateAttr
+from .bm25_index_service import BM25Index, load_or_build_bm25_index
+from .ingestion_manifest_service import collection_version
+from .telemetry_service import get_logger, span
+from typing import Callable
+import asyncio
+import json
+import ast
+import os
+
+# Constant from the reciprocal rank fusion paper, also the default of LangChain's EnsembleRetriever
+RRF_C = 60
+# Extra candidates fetched from Chroma when a filter can only be applied after the search
+VECTOR_OVERFETCH = 4
+# Fusion weight of the report full-text leg of collections that link to reports; 0 turns it off
+EVIDENCE_WEIGHT = float(os.getenv("EVIDENCE_WEIGHT", "0"))
+# Reports fetched per wanted document, several reports often belong to the same incident
+EVIDENCE_OVERFETCH = 3
+
+logger = get_logger(__name__)
+
+
+def _matches(value, condition) -> bool:
+    if isinstance(condition, dict):
+        value = str(value or '')
+        ops = {k.lstrip('$'): str(v) for k, v in condition.items()}
+        return bool(value) and all([
+            'gte' not in ops or value >= ops['gte'],
+            'gt' not in ops or value > ops['gt'],
+            'lte' not in ops or value <= ops['lte'],
+            'lt' not in ops or value < ops['lt'],
+        ])
+    if isinstance(condition, (list, tuple, set)):
+        return str(value) in {str(c) for c in condition}
+    return str(value) == str(condition)
+
+
+def _report_rowids(value) -> list[int]:
+    '''Report rowids of a chunk's 'reports' metadata, which holds 1-based CSV row numbers (header is row 1).'''
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return []
+    if not isinstance(value, list):
+        return []
+    return [int(x) - 2 for x in value if str(x).isdigit()]
+
+
+def _chroma_where(filters: dict) -> tuple[dict | None, dict]:
+    '''Split filters into a Chroma `where` clause and the range conditions Chroma can't express on strings.'''
+    clauses, post_filters = [], {}
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            post_filters[field] = condition
+        elif isinstance(condition, (list, tuple, set)):
+            clauses.append({field: {"$in": [str(c) for c in condition]}})
+        else:
+            clauses.append({field: str(condition)})
+    if not clauses:
+        return None, post_filters
+    return (clauses[0] if len(clauses) == 1 else {"$and": clauses}), post_filters
+
 
+class HybridRetriever(BaseRetriever):
+    '''Fuses BM25 and vector search results with weighted reciprocal rank fusion.
 
-def get_ensembled_retriever(collection: Chroma,  score_threshold: float = 0.1):
+    Unlike LangChain's EnsembleRetriever, `top_k` and metadata `filters` passed to
+    `invoke` reach every leg of the search.
+
+    With `evidence_search` set, a third leg searches the full text of the linked reports and
+    ranks the documents citing the best matching reports, weighted by `evidence_weight`.
+    '''
+
+    bm25_index: BM25Index
+    vector_store: Chroma
+    weights: tuple[float, float] = (0.5, 0.5)
+    k: int = 4
+    # (query, top_k) -> [(report rowid, score)], best first
+    evidence_search: Callable[[str, int], list[tuple[int, float]]] | None = None
+    evidence_weight: float = 0.0
+
+    # Report rowid -> positions of the documents citing it, built on first use
+    _report_documents: dict[int, list[int]] | None = PrivateAttr(default=None)
+
+    @property
+    def evidence_enabled(self) -> bool:
+        return self.evidence_search is not None and self.evidence_weight > 0
+
+    def lexical_search(self, query: str, top_k: int, filters: dict | None = None) -> list[Document]:
+        with span("retrieval.bm25", collection=self.vector_store._collection.name, top_k=top_k):
+            return [doc for doc, _ in self.bm25_index.search(query, top_k, filters)]
+
+    def vector_search(self, query: str, top_k: int, filters: dict | None = None) -> list[Document]:
+        with span("retrieval.vector", collection=self.vector_store._collection.name, top_k=top_k):
+            if not filters:
+                return self.vector_store.similarity_search(query, k=top_k)
+            where, post_filters = _chroma_where(filters)
+            fetch_k = top_k * VECTOR_OVERFETCH if post_filters else top_k
+            docs = self.vector_store.similarity_search(query, k=fetch_k, filter=where)
+            docs = [
+                doc for doc in docs
+                if all(_matches(doc.metadata.get(field), condition) for field, condition in post_filters.items())
+            ]
+            return docs[:top_k]
+
+    def _documents_by_report(self) -> dict[int, list[int]]:
+        if self._report_documents is None:
+            mapping: dict[int, list[int]] = {}
+            for doc_idx in range(self.bm25_index.num_docs):
+                for row_id in _report_rowids(self.bm25_index.get_document(doc_idx).metadata.get('reports')):
+                    mapping.setdefault(row_id, []).append(doc_idx)
+            self._report_documents = mapping
+        return self._report_documents
+
+    def evidence_search_documents(self, query: str, top_k: int, filters: dict | None = None) -> list[Document]:
+        if not self.evidence_enabled:
+            return []
+        with span("retrieval.evidence", collection=self.vector_store._collection.name, top_k=top_k):
+            hits = self.evidence_search(query, top_k * EVIDENCE_OVERFETCH) # type: ignore
+            documents_by_report = self._documents_by_report()
+            mask = self.bm25_index.filter_mask(filters)
+            seen, docs = set(), []
+            for row_id, _ in hits:
+                for doc_idx in documents_by_report.get(row_id, ()):
+                    if doc_idx in seen or (mask is not None and not mask[doc_idx]):
+                        continue
+                    seen.add(doc_idx)
+                    docs.append(self.bm25_index.get_document(doc_idx))
+                    if len(docs) == top_k:
+                        return docs
+            return docs
+
+    def fuse(self, result_lists: list[list[Document]], weights, top_k: int) -> list[Document]:
+        with span("retrieval.fusion", top_k=top_k):
+            scores: dict[str, float] = {}
+            docs: dict[str, Document] = {}
+            for results, weight in zip(result_lists, weights):
+                for rank, doc in enumerate(results):
+                    key = doc.id or doc.page_content
+                    docs.setdefault(key, doc)
+                    scores[key] = scores.get(key, 0.0) + weight / (RRF_C + rank + 1)
+            ranked = sorted(scores, key=lambda key: scores[key], reverse=True)
+            return [docs[key] for key in ranked[:top_k]]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                top_k: int | None = None, filters: dict | None = None) -> list[Document]:
+        top_k = top_k or self.k
+        lexical = self.lexical_search(query, top_k, filters)
+        vector = self.vector_search(query, top_k, filters)
+        if not self.evidence_enabled:
+            return self.fuse([lexical, vector], self.weights, top_k)
+        evidence = self.evidence_search_documents(query, top_k, filters)
+        return self.fuse([lexical, vector, evidence], (*self.weights, self.evidence_weight), top_k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       top_k: int | None = None, filters: dict | None = None) -> list[Document]:
+        # Both legs are blocking (NumPy / Chroma + embedding call), run them side by side off the event loop
+        top_k = top_k or self.k
+        if not self.evidence_enabled:
+            lexical, vector = await asyncio.gather(
+                asyncio.to_thread(self.lexical_search, query, top_k, filters),
+                asyncio.to_thread(self.vector_search, query, top_k, filters),
+            )
+            return self.fuse([lexical, vector], self.weights, top_k)
+        lexical, vector, evidence = await asyncio.gather(
+            asyncio.to_thread(self.lexical_search, query, top_k, filters),
+            asyncio.to_thread(self.vector_search, query, top_k, filters),
+            asyncio.to_thread(self.evidence_search_documents, query, top_k, filters),
+        )
+        return self.fuse([lexical, vector, evidence], (*self.weights, self.evidence_weight), top_k)
+
+
+def get_ensembled_retriever(collection: Chroma,  score_threshold: float = 0.1,
+                            evidence_search: Callable[[str, int], list[tuple[int, float]]] | None = None):
     try:
-        collection_data = collection.get()
-        doc_contents = collection_data['documents']
-        metadatas = collection_data['metadatas']
-        
-        # collection.get() returns documents as list of strings, but BM25Retriever.from_documents expects Document objects
-        if doc_contents:
-            documents = [Document(page_content=content, metadata=meta) for content, meta in zip(doc_contents, metadatas)]
-            bm25_retriever = BM25Retriever.from_documents(documents)
-            chroma_retriever = collection.as_retriever()
-
-            ensemble_retriever = EnsembleRetriever(retrievers=[bm25_retriever, chroma_retriever], weights=[0.5, 0.5])
-            return ensemble_retriever
+        collection_name = collection._collection.name
+        # Loads the index persisted at ingest time; only rebuilds from collection.get() if it is stale
+        bm25_index = load_or_build_bm25_index(collection, collection_name, collection_version(collection_name))
+
+        if bm25_index is not None:
+            return HybridRetriever(bm25_index=bm25_index, vector_store=collection, weights=(0.5, 0.5),
+                                   evidence_search=evidence_search, evidence_weight=EVIDENCE_WEIGHT)
         else:
-             print("Warning: Collection is empty. Returning None for retriever.")
+             logger.warning("Collection is empty. Returning None for retriever.")
              return None
     except Exception as e:
-        print(f"Error creating retriever: {e}")
+        logger.error(f"Error creating retriever: {e}")
         return None
@@ -0,0 +1,271 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import threading
+import logging
+import bisect
+import json
+import time
+import sys
+import os
+
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" emits one JSON object per line, "text" a human readable line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+METRICS_NAMESPACE = "ai_ethics"
+
+# Seconds; spans range from sub-millisecond BM25 lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, le: str | None = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {",".join(map(str, key)) or "_": value for key, value in self._values.items()}
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count], sum
+        self._series: dict[tuple, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not TELEMETRY_ENABLED:
+            return
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, str(bound))} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, '+Inf')} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                ",".join(map(str, key)) or "_": {'count': sum(counts), 'sum': total[0]}
+                for key, (counts, total) in self._series.items()
+            }
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self._metrics: dict[str, Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_type, name: str, *args, **kwargs):
+        full_name = f"{self.namespace}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = metric_type(full_name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render_prometheus(self) -> str:
+        '''Prometheus text exposition format (also accepted by OpenMetrics scrapers).'''
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+
+registry = MetricsRegistry()
+
+SPAN_SECONDS = registry.histogram("span_duration_seconds", "Duration of traced operations", ("span", "status"))
+LLM_CALL_SECONDS = registry.histogram("llm_call_duration_seconds", "Chat model call latency", ("model",))
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens sent to and received from the chat model", ("model", "direction"))
+TOOL_CALL_SECONDS = registry.histogram("tool_call_duration_seconds", "Tool invocation latency", ("tool", "status"))
+INGESTED_CHUNKS = registry.counter("ingested_chunks_total", "Chunks written to or failed for a collection", ("collection", "status"))
+
+
+class JsonFormatter(logging.Formatter):
+    '''One JSON object per line; values passed through `extra=` become top-level fields.'''
+
+    _RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update({k: v for k, v in vars(record).items() if k not in self._RESERVED})
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+_logging_configured = False
+
+
+def configure_logging():
+    '''Attach a single stderr handler to the `src` logger tree, once.'''
+    global _logging_configured
+    if _logging_configured:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    package_logger = logging.getLogger(__name__.split(".")[0])
+    package_logger.addHandler(handler)
+    package_logger.setLevel(LOG_LEVEL)
+    package_logger.propagate = False
+    _logging_configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    configure_logging()
+    return logging.getLogger(name)
+
+
+logger = get_logger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "attributes", "started", "duration")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    '''Shared stand-in returned when telemetry is disabled, so a span costs one attribute lookup.'''
+    __slots__ = ()
+    duration = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def _recording_span(name: str, attributes: dict):
+    current = Span(name, attributes)
+    status = "ok"
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        SPAN_SECONDS.observe(current.duration, span=name, status=status)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s", name, extra={
+                'span': name, 'status': status, 'duration_ms': round(current.duration * 1000, 3), **current.attributes
+            })
+
+
+def span(name: str, **attributes):
+    '''Time a block into the span histogram and, at DEBUG level, log it with its attributes.
+
+    Attributes only go to the log, so high-cardinality values (queries, ids) are fine.
+    Disabled telemetry returns a no-op context manager.
+    '''
+    if not TELEMETRY_ENABLED:
+        return _NOOP_SPAN
+    return _recording_span(name, attributes)
+
+
+def record_llm_call(model: str, duration: float, message):
+    '''Record latency and token usage from an AIMessage's usage_metadata, when the provider reports it.'''
+    if not TELEMETRY_ENABLED:
+        return
+    LLM_CALL_SECONDS.observe(duration, model=model)
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("input_tokens"):
+        LLM_TOKENS.inc(usage["input_tokens"], model=model, direction="input")
+    if usage.get("output_tokens"):
+        LLM_TOKENS.inc(usage["output_tokens"], model=model, direction="output")
+    logger.debug("llm call", extra={
+        'model': model, 'duration_ms': round(duration * 1000, 3),
+        'input_tokens': usage.get("input_tokens"), 'output_tokens': usage.get("output_tokens")
+    })
+
+
+def render_metrics() -> str:
+    return registry.render_prometheus()
+
+
+def metrics_snapshot() -> dict:
+    return registry.snapshot()
@@ -1,48 +1,122 @@
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
 from pathlib import Path
-from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
-from typing import Dict, Optional
+from langchain_core.embeddings import Embeddings
+from .embedding_service import get_embeddings, storage_collection_name, EMBEDDING_MODEL_NAME
+from .batch_ingestion_service import BatchIngestor, IngestionReport
+from .telemetry_service import get_logger
+from typing import Callable, Dict, Iterable, Optional
+import chromadb
+import threading
+import uuid
 import os
 
-CHROMA_PERSIST_DIR = str(Path(__file__).resolve().parents[2] / "data" / "chroma")
-EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "models/embedding-001") 
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", str(Path(__file__).resolve().parents[2] / "data" / "chroma"))
+
+logger = get_logger(__name__)
 
 class VectorStoreService:
     _instance = None
     _collections: Dict[str, Chroma] = {}
+    _embeddings: Optional[Embeddings] = None
+    _client = None
+    _lock = threading.RLock()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             Path(CHROMA_PERSIST_DIR).mkdir(parents=True, exist_ok=True)
             cls._instance._collections = {}
+            cls._instance._embeddings = None
+            cls._instance._client = None
         return cls._instance
+
+    @property
+    def client(self):
+        '''Single persistent Chroma client, so collections can be opened from several threads.'''
+        with self._lock:
+            if self._client is None:
+                self._client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+            return self._client
+
+    @property
+    def embeddings(self) -> Embeddings:
+        '''Embedding function shared by every collection, from the backend selected by EMBEDDING_MODEL_NAME.'''
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = get_embeddings(EMBEDDING_MODEL_NAME)
+            return self._embeddings
+
+    @staticmethod
+    def storage_name(collection_name: str) -> str:
+        '''Name of the Chroma collection, manifest and BM25 index holding `collection_name` for the current embedding backend.'''
+        return storage_collection_name(collection_name, EMBEDDING_MODEL_NAME)
+
+    def get_or_create_collection(self, collection_name: str) -> Chroma:
+        with self._lock:
+            if collection_name not in self._collections:
+                self._collections[collection_name] = Chroma(
+                    collection_name=self.storage_name(collection_name),
+                    embedding_function=self.embeddings,
+                    client=self.client
+                )
+            return self._collections[collection_name]
     
     def ingest_documents(self, documents: list[Document], collection_name: str) -> Chroma:
         if not documents:
-            print(f"Warning: No documents to ingest for collection {collection_name}")
-            if collection_name in self._collections:
-                return self._collections[collection_name]
-            
-            self._collections[collection_name] = Chroma(
-                collection_name=collection_name,
-                embedding_function=GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME),
-                persist_directory=CHROMA_PERSIST_DIR
-            )
-            return self._collections[collection_name]
+            logger.warning(f"No documents to ingest for collection {collection_name}")
+            return self.get_or_create_collection(collection_name)
+
+        self.upsert_documents(documents, [str(uuid.uuid4()) for _ in documents], collection_name)
+        return self.get_or_create_collection(collection_name)
+
+    def upsert_documents(self, documents: list[Document], ids: list[str], collection_name: str,
+                         ingestor: Optional[BatchIngestor] = None) -> IngestionReport:
+        '''Insert or replace documents under explicit ids, embedding them in parallel batches.'''
+        collection = self.get_or_create_collection(collection_name)
+        if not documents:
+            return IngestionReport()
+        report = (ingestor or BatchIngestor()).ingest(collection, documents, ids)
+        if report.failed_ids:
+            logger.warning(f"{len(report.failed_ids)} chunks failed to ingest into {collection_name}")
+        return report
+
+    def upsert_stream(self, pairs: Iterable[tuple[str, Document]], collection_name: str,
+                      on_batch: Optional[Callable[[list[str], bool], None]] = None,
+                      ingestor: Optional[BatchIngestor] = None) -> IngestionReport:
+        '''Like upsert_documents, for a lazy stream of (id, document) pairs of unknown length.'''
+        collection = self.get_or_create_collection(collection_name)
+        report = (ingestor or BatchIngestor()).ingest_stream(collection, pairs, on_batch)
+        if report.failed_ids:
+            logger.warning(f"{len(report.failed_ids)} chunks failed to ingest into {collection_name}")
+        return report
+
+    def update_metadata(self, ids: list[str], metadatas: list[dict], collection_name: str):
+        '''Replace the metadata of stored documents without touching their text or embeddings.'''
+        if not ids:
+            return
+        collection = self.get_or_create_collection(collection_name)._collection
+        # Chroma merges metadata on update, keys missing from the new metadata are cleared explicitly
+        current = collection.get(ids=ids, include=['metadatas'])
+        old_keys = {doc_id: set(metadata or {}) for doc_id, metadata in zip(current['ids'], current['metadatas'] or [])}
+        collection.update(ids=ids, metadatas=[
+            {**{key: None for key in old_keys.get(doc_id, set()) - set(metadata)}, **metadata}
+            for doc_id, metadata in zip(ids, metadatas)
+        ]) # type: ignore
+
+    def delete_documents(self, ids: list[str], collection_name: str):
+        if ids:
+            self.get_or_create_collection(collection_name).delete(ids=ids)
+
+    def count(self, collection_name: str) -> int:
+        return self.get_or_create_collection(collection_name)._collection.count()
 
-        if collection_name not in self._collections:
-            self._collections[collection_name] = Chroma(
-                collection_name=collection_name,
-                embedding_function=GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL_NAME),
-                persist_directory=CHROMA_PERSIST_DIR
-            )
-        
-        if documents:
-            self._collections[collection_name].add_documents(documents)
-            
-        return self._collections[collection_name]
+    def reset_collection(self, collection_name: str) -> Chroma:
+        '''Drop every document in a collection and return a fresh, empty one.'''
+        with self._lock:
+            self.get_or_create_collection(collection_name).delete_collection()
+            self._collections.pop(collection_name, None)
+            return self.get_or_create_collection(collection_name)
 
     def get_collection(self, collection_name: str) -> Optional[Chroma]: 
         if collection_name in self._collections:
@@ -50,4 +124,4 @@ class VectorStoreService:
         return None
     
     def clear_cache(self):
-        self._collections.clear()
\ No newline at end of file
+        self._collections.clear()
@@ -0,0 +1,54 @@
+from ...services.result_formatter_service import document_registry, split_short_id, format_document, INCIDENT_LAYOUT, REPORT_LAYOUT
+from ...services.vector_store_service import VectorStoreService
+from ...services.report_repository_service import get_report_cache
+from .reports_search import report_document
+from langchain_core.documents import Document
+from langchain_core.tools import StructuredTool
+import asyncio
+
+def _load_report(row_id: str) -> Document | None:
+    # Search hits only hold a passage, the full record is the whole report
+    if not row_id.isdigit():
+        return None
+    report = get_report_cache().get_many([int(row_id)]).get(int(row_id))
+    return report_document(int(row_id), report) if report is not None else None
+
+def _load_document(doc_id: str) -> Document | None:
+    layout, chunk_id = split_short_id(doc_id)
+    if layout is REPORT_LAYOUT:
+        return _load_report(chunk_id)
+
+    document = document_registry.get(doc_id)
+    if document is not None:
+        return document
+
+    # Evicted or from an earlier process: read the chunk back from its collection
+    if layout is None or not chunk_id:
+        return None
+    found = VectorStoreService().get_or_create_collection(layout.collection).get(ids=[chunk_id])
+    if not found['ids']:
+        return None
+    document = Document(id=found['ids'][0], page_content=found['documents'][0], metadata=found['metadatas'][0] or {})
+    if layout is INCIDENT_LAYOUT:
+        from .incidents_rag import get_incidents_rag
+        get_incidents_rag().enrich_results([document])
+    document_registry.register(doc_id, document)
+    return document
+
+def _get_document(doc_id: str):
+    """Get the full record of a search result, including every field and, for incidents, the linked reports.
+
+    Args:
+        doc_id: The id shown in brackets at the start of a search result, e.g. "I:12#0" or "E:1042".
+    """
+    layout, _ = split_short_id(doc_id)
+    document = _load_document(doc_id.strip().strip("[]"))
+    if layout is None or document is None:
+        return f"No document with id '{doc_id}'. Use an id exactly as shown in brackets in a search result."
+    return format_document(document, layout)
+
+async def _aget_document(doc_id: str):
+    # Registry misses go to Chroma and DuckDB, keep them off the event loop
+    return await asyncio.to_thread(_get_document, doc_id)
+
+get_document = StructuredTool.from_function(func=_get_document, coroutine=_aget_document, name="get_document")
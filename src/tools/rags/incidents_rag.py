@@ -1,30 +1,89 @@
 from ...services.incidents_etl_service import ingest_incidents_csv
-from ...services.incidents_reports_etl_service import get_reports_by_ids
+from ...services.report_repository_service import get_report_cache, get_report_repository
 from ...services.retrieval_service import get_ensembled_retriever
-from langchain_core.tools import tool
+from ...services.vector_store_service import VectorStoreService
+from ...services.ingestion_manifest_service import collection_version
+from ...services.query_cache_service import SemanticQueryCache, QUERY_CACHE_ENABLED
+from ...services.result_formatter_service import format_results, INCIDENT_LAYOUT
+from ...services.telemetry_service import get_logger
+from langchain_core.tools import StructuredTool
+import threading
+import asyncio
 import json
 import ast
 
+logger = get_logger(__name__)
+
+def _search_report_ids(query: str, top_k: int) -> list[tuple[int, float]]:
+    return get_report_repository().search_report_ids(query, top_k)
+
 class IncidentsRAG:
     def __init__(self):
         self.vector_store_service = ingest_incidents_csv()
-        self.retriever = get_ensembled_retriever(self.vector_store_service)
+        self.retriever = get_ensembled_retriever(self.vector_store_service, evidence_search=_search_report_ids)
+        self.query_cache = None
+        if QUERY_CACHE_ENABLED:
+            self.query_cache = SemanticQueryCache("search_incidents", VectorStoreService().embeddings.embed_query)
     
-    def query(self, query_text: str, top_k: int = 5):
+    def _ensure_retriever(self) -> bool:
         if not self.retriever:
             # Re-initialize if retriever is None (e.g. if vector store was empty initially)
             self.vector_store_service = ingest_incidents_csv()
-            self.retriever = get_ensembled_retriever(self.vector_store_service)
-            if not self.retriever:
-                return "Error: Retriever could not be initialized."
-        
-        results = self.retriever.invoke(query_text, top_k=top_k)
+            self.retriever = get_ensembled_retriever(self.vector_store_service, evidence_search=_search_report_ids)
+        return self.retriever is not None
+
+    def _current_version(self) -> str:
+        '''Contents version of the collection; reloads the lexical index if another process re-ingested it.'''
+        version = collection_version(self.vector_store_service._collection.name)
+        if self.retriever is not None and self.retriever.bm25_index.version != version:
+            self.retriever = get_ensembled_retriever(self.vector_store_service, evidence_search=_search_report_ids) or self.retriever
+        return version
+
+    def _search(self, query_text: str, top_k: int, filters: dict | None):
+        results = self.retriever.invoke(query_text, top_k=top_k, filters=filters) # type: ignore
+        if not results:
+            return "No incidents were found related to this type of query."
+        return self.enrich_results(results)
+
+    async def _asearch(self, query_text: str, top_k: int, filters: dict | None):
+        results = await self.retriever.ainvoke(query_text, top_k=top_k, filters=filters) # type: ignore
         if not results:
             return "No incidents were found related to this type of query."
-        
-        # Enrich results with report details if explicitly needed or missing
-        # ingest_incidents_csv attempts to populate metadata['reports']
-        # But this backup logic ensures we can get them if we only have the IDs string in metadata
+        # Report hydration hits DuckDB, keep it off the event loop
+        return await asyncio.to_thread(self.enrich_results, results)
+
+    def query(self, query_text: str, top_k: int = 5, filters: dict | None = None):
+        if not self._ensure_retriever():
+            return "Error: Retriever could not be initialized."
+        version = self._current_version()
+        if self.query_cache is None:
+            return self._search(query_text, top_k, filters)
+        return self.query_cache.get_or_compute(
+            query_text,
+            SemanticQueryCache.params_key(top_k=top_k, filters=filters),
+            version,
+            lambda: self._search(query_text, top_k, filters)
+        )
+
+    async def aquery(self, query_text: str, top_k: int = 5, filters: dict | None = None):
+        if not await asyncio.to_thread(self._ensure_retriever):
+            return "Error: Retriever could not be initialized."
+        version = await asyncio.to_thread(self._current_version)
+        if self.query_cache is None:
+            return await self._asearch(query_text, top_k, filters)
+        return await self.query_cache.aget_or_compute(
+            query_text,
+            SemanticQueryCache.params_key(top_k=top_k, filters=filters),
+            version,
+            lambda: self._asearch(query_text, top_k, filters)
+        )
+
+    def enrich_results(self, results):
+        # Enrich results with report details
+        # ingest_incidents_csv only stores the report IDs in metadata['reports'] to keep the index small,
+        # the report bodies are hydrated here through the in-process report cache
+        pending_docs = []
+        pending_indices = []
         for doc in results:
             reports_meta = doc.metadata.get('reports')
             if reports_meta and isinstance(reports_meta, str):
@@ -46,28 +105,53 @@ class IncidentsRAG:
                         continue # Already fully populated
                     
                     # Case 2: List of integers (incident report IDs)
-                    # We need to fetch the content using our helper function
+                    # Collect them so all retrieved incidents are hydrated in a single query
                     if isinstance(parsed, list):
                          # Convert 1-based CSV row number to 0-based data index: index = val - 2
                          # Filter out non-digits just in case
-                         data_indices = []
-                         for x in parsed:
-                             if str(x).isdigit():
-                                 data_indices.append(int(x) - 2)
-                         
+                         data_indices = [int(x) - 2 for x in parsed if str(x).isdigit()]
                          if data_indices:
-                            fetched_reports = get_reports_by_ids(data_indices)
-                            # Update metadata with full details
-                            doc.metadata['reports_details'] = json.dumps(fetched_reports, default=str)
+                            pending_docs.append(doc)
+                            pending_indices.append(data_indices)
                 except Exception as e:
-                    print(f"Error enriching report metadata: {e}")
+                    logger.warning(f"Error enriching report metadata: {e}")
+
+        if pending_docs:
+            try:
+                fetched = get_report_cache().reports_by_group(pending_indices)
+                for doc, fetched_reports in zip(pending_docs, fetched):
+                    # Update metadata with full details
+                    doc.metadata['reports_details'] = json.dumps(fetched_reports, default=str)
+            except Exception as e:
+                logger.warning(f"Error enriching report metadata: {e}")
 
         return results
 
-_rag_instance = IncidentsRAG()
+_rag_instance: IncidentsRAG | None = None
+_rag_lock = threading.Lock()
+
+def get_incidents_rag() -> IncidentsRAG:
+    '''Build the incidents RAG on first use; concurrent callers wait for the same instance.'''
+    global _rag_instance
+    if _rag_instance is None:
+        with _rag_lock:
+            if _rag_instance is None:
+                _rag_instance = IncidentsRAG()
+    return _rag_instance
+
+def _incident_query(project_description: str, action: str, date_from: str | None, date_to: str | None):
+    # Create a semantic query combining project context and action
+    query = f"Project context: {project_description}. Action: {action}. Find relevant AI incidents and failures."
+    date_range = {}
+    if date_from:
+        date_range['gte'] = date_from
+    if date_to:
+        date_range['lte'] = date_to
+    filters = {'incident_date': date_range} if date_range else None
+    return query, filters
 
-@tool
-def search_incidents(project_description: str, action: str, top_k: int = 5):
+def _search_incidents(project_description: str, action: str, top_k: int = 5,
+                      date_from: str | None = None, date_to: str | None = None):
     """Search for AI incidents in the database based on the project description and specific action.
     This search considers relevant reports linked to the incident.
     
@@ -75,7 +159,19 @@ def search_incidents(project_description: str, action: str, top_k: int = 5):
         project_description: The description of the AI project.
         action: The specific action being analyzed for risks.
         top_k: The number of top results to return from the search.
+        date_from: Optional earliest incident date to include (YYYY-MM-DD).
+        date_to: Optional latest incident date to include (YYYY-MM-DD).
     """
-    # Create a semantic query combining project context and action
-    query = f"Project context: {project_description}. Action: {action}. Find relevant AI incidents and failures."
-    return _rag_instance.query(query, top_k)
+    query, filters = _incident_query(project_description, action, date_from, date_to)
+    results = get_incidents_rag().query(query, top_k, filters=filters)
+    return format_results(results, INCIDENT_LAYOUT, tool_name="search_incidents")
+
+async def _asearch_incidents(project_description: str, action: str, top_k: int = 5,
+                             date_from: str | None = None, date_to: str | None = None):
+    query, filters = _incident_query(project_description, action, date_from, date_to)
+    # The first call may still have to build the index, keep that off the event loop
+    rag = await asyncio.to_thread(get_incidents_rag)
+    results = await rag.aquery(query, top_k, filters=filters)
+    return format_results(results, INCIDENT_LAYOUT, tool_name="search_incidents")
+
+search_incidents = StructuredTool.from_function(func=_search_incidents, coroutine=_asearch_incidents, name="search_incidents")
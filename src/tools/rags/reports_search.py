@@ -0,0 +1,46 @@
+from ...services.report_repository_service import get_report_repository, get_report_cache
+from ...services.report_search_service import best_passage
+from ...services.result_formatter_service import format_results, REPORT_LAYOUT
+from langchain_core.documents import Document
+from langchain_core.tools import StructuredTool
+import asyncio
+
+# Report fields shown with a search hit; the text itself is cut down to the best passage
+REPORT_METADATA_FIELDS = ('title', 'source_domain', 'date_published', 'Author', 'url', 'language')
+
+def report_document(row_id: int, report: dict, query: str | None = None) -> Document:
+    '''A report as a Document; with a query, page_content is only the passage best matching it.'''
+    metadata = {key: report[key] for key in REPORT_METADATA_FIELDS if report.get(key) not in (None, "")}
+    text = report.get('text') or report.get('description') or ""
+    if query is None:
+        if report.get('description'):
+            metadata['description'] = report['description']
+        return Document(id=str(row_id), page_content=text, metadata=metadata)
+    return Document(id=str(row_id), page_content=best_passage(text, query), metadata=metadata)
+
+def find_reports(query: str, top_k: int = 5) -> list[Document]:
+    hits = get_report_repository().search_report_ids(query, top_k)
+    reports = get_report_cache().get_many([row_id for row_id, _ in hits])
+    return [report_document(row_id, reports[row_id], query) for row_id, _ in hits if row_id in reports]
+
+def _search_reports(query: str, top_k: int = 5):
+    """Full-text search over the news reports and articles that document AI incidents.
+    Use it to find specific evidence: quotes, names, figures or events mentioned in the reports.
+    Each result shows the passage of the report that best matches the query.
+
+    Args:
+        query: Keywords to look for in the report titles, descriptions and texts.
+        top_k: The number of top results to return from the search.
+    """
+    if not get_report_repository().has_search_index:
+        return "Report search is unavailable: the reports table has no search index."
+    results = find_reports(query, top_k)
+    if not results:
+        return "No reports matched this query."
+    return format_results(results, REPORT_LAYOUT, tool_name="search_reports")
+
+async def _asearch_reports(query: str, top_k: int = 5):
+    # DuckDB calls block, keep them off the event loop
+    return await asyncio.to_thread(_search_reports, query, top_k)
+
+search_reports = StructuredTool.from_function(func=_search_reports, coroutine=_asearch_reports, name="search_reports")
@@ -1,28 +1,102 @@
 from ...services.ai_risk_etl_service import ingest_ai_risk_csv
 from ...services.retrieval_service import get_ensembled_retriever
-from langchain_core.tools import tool
+from ...services.vector_store_service import VectorStoreService
+from ...services.ingestion_manifest_service import collection_version
+from ...services.query_cache_service import SemanticQueryCache, QUERY_CACHE_ENABLED
+from ...services.result_formatter_service import format_results, RISK_LAYOUT
+from langchain_core.tools import StructuredTool
+import threading
+import asyncio
 
 class RiskRAG:
     def __init__(self):
         self.vector_store = ingest_ai_risk_csv()
         self.retriever = get_ensembled_retriever(self.vector_store)
+        self.query_cache = None
+        if QUERY_CACHE_ENABLED:
+            self.query_cache = SemanticQueryCache("search_risks", VectorStoreService().embeddings.embed_query)
     
-    def query(self, query_text: str, top_k: int = 5, score_threshold: float = 0.5):
-        if not self.retriever:
-            raise ValueError("Retriever not initialized")
-        results = self.retriever.invoke(query_text, top_k=top_k)
+    def _current_version(self) -> str:
+        '''Contents version of the collection; reloads the lexical index if another process re-ingested it.'''
+        version = collection_version(self.vector_store._collection.name)
+        if self.retriever is not None and self.retriever.bm25_index.version != version:
+            self.retriever = get_ensembled_retriever(self.vector_store) or self.retriever
+        return version
+
+    def _search(self, query_text: str, top_k: int, filters: dict | None):
+        results = self.retriever.invoke(query_text, top_k=top_k, filters=filters) # type: ignore
         if not results:
             return "No risks were found related to this type of query."
         return results
 
-_rag_instance = RiskRAG()
+    async def _asearch(self, query_text: str, top_k: int, filters: dict | None):
+        results = await self.retriever.ainvoke(query_text, top_k=top_k, filters=filters) # type: ignore
+        if not results:
+            return "No risks were found related to this type of query."
+        return results
+
+    def query(self, query_text: str, top_k: int = 5, score_threshold: float = 0.5, filters: dict | None = None):
+        if not self.retriever:
+            raise ValueError("Retriever not initialized")
+        version = self._current_version()
+        if self.query_cache is None:
+            return self._search(query_text, top_k, filters)
+        return self.query_cache.get_or_compute(
+            query_text,
+            SemanticQueryCache.params_key(top_k=top_k, filters=filters),
+            version,
+            lambda: self._search(query_text, top_k, filters)
+        )
 
-@tool
-def search_risks(query: str, top_k: int = 5):
+    async def aquery(self, query_text: str, top_k: int = 5, score_threshold: float = 0.5, filters: dict | None = None):
+        if not self.retriever:
+            raise ValueError("Retriever not initialized")
+        version = await asyncio.to_thread(self._current_version)
+        if self.query_cache is None:
+            return await self._asearch(query_text, top_k, filters)
+        return await self.query_cache.aget_or_compute(
+            query_text,
+            SemanticQueryCache.params_key(top_k=top_k, filters=filters),
+            version,
+            lambda: self._asearch(query_text, top_k, filters)
+        )
+
+_rag_instance: RiskRAG | None = None
+_rag_lock = threading.Lock()
+
+def get_risk_rag() -> RiskRAG:
+    '''Build the risk RAG on first use; concurrent callers wait for the same instance.'''
+    global _rag_instance
+    if _rag_instance is None:
+        with _rag_lock:
+            if _rag_instance is None:
+                _rag_instance = RiskRAG()
+    return _rag_instance
+
+def _risk_filters(risk_category: str | None, domain: str | None) -> dict | None:
+    filters = {}
+    if risk_category:
+        filters['risk_category'] = risk_category
+    if domain:
+        filters['domain'] = domain
+    return filters or None
+
+def _search_risks(query: str, top_k: int = 5, risk_category: str | None = None, domain: str | None = None):
     """Search for AI risks in the database based on a query.
     
     Args:
         query: The search query string describing the risk or topic to look for.
         top_k: The number of top results to return from the search.
+        risk_category: Optional exact risk category to restrict the search to.
+        domain: Optional exact risk domain to restrict the search to.
     """
-    return _rag_instance.query(query, top_k)
\ No newline at end of file
+    results = get_risk_rag().query(query, top_k, filters=_risk_filters(risk_category, domain))
+    return format_results(results, RISK_LAYOUT, tool_name="search_risks")
+
+async def _asearch_risks(query: str, top_k: int = 5, risk_category: str | None = None, domain: str | None = None):
+    # The first call may still have to build the index, keep that off the event loop
+    rag = await asyncio.to_thread(get_risk_rag)
+    results = await rag.aquery(query, top_k, filters=_risk_filters(risk_category, domain))
+    return format_results(results, RISK_LAYOUT, tool_name="search_risks")
+
+search_risks = StructuredTool.from_function(func=_search_risks, coroutine=_asearch_risks, name="search_risks")
@@ -0,0 +1,69 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+from concurrent.futures import ThreadPoolExecutor
+from .tools.rags.incidents_rag import get_incidents_rag
+from .tools.rags.risk_rag import get_risk_rag
+from .services.telemetry_service import get_logger
+import threading
+import time
+
+logger = get_logger(__name__)
+
+# Every index the tools need, keyed by a short name for reporting
+WARMUP_TARGETS = {
+    'incidents': get_incidents_rag,
+    'risks': get_risk_rag,
+}
+
+_ready = threading.Event()
+_errors: dict[str, str] = {}
+
+
+def warmup(max_workers: int | None = None) -> dict[str, float]:
+    '''Build every RAG index in parallel and return how long each one took, in seconds.'''
+    def build(name: str) -> float:
+        started = time.perf_counter()
+        try:
+            WARMUP_TARGETS[name]()
+        except Exception as e:
+            _errors[name] = str(e)
+            raise
+        return time.perf_counter() - started
+
+    _errors.clear()
+    with ThreadPoolExecutor(max_workers=max_workers or len(WARMUP_TARGETS), thread_name_prefix="warmup") as executor:
+        futures = {name: executor.submit(build, name) for name in WARMUP_TARGETS}
+        timings = {}
+        for name, future in futures.items():
+            try:
+                timings[name] = future.result()
+            except Exception as e:
+                logger.error(f"Error warming up {name}: {e}")
+
+    if not _errors:
+        _ready.set()
+    return timings
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def warmup_errors() -> dict[str, str]:
+    return dict(_errors)
+
+
+def main():
+    print("\n ===WARMUP===\n")
+    started = time.perf_counter()
+    timings = warmup()
+    for name, elapsed in timings.items():
+        print(f"{name}: ready in {elapsed:.2f}s")
+    print(f"Total: {time.perf_counter() - started:.2f}s")
+    if not is_ready():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
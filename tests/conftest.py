@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Services read their configuration at import time: point every store at a scratch directory
+# and select the offline models before anything from src is imported
+_scratch = tempfile.mkdtemp(prefix="ai-ethics-tests-")
+os.environ.update({
+    "CHROMA_PERSIST_DIR": os.path.join(_scratch, "chroma"),
+    "EMBEDDING_CACHE_PATH": os.path.join(_scratch, "embeddings.sqlite"),
+    "EMBEDDING_MODEL_NAME": "fake",
+    "CHAT_MODEL_BACKEND": "fake",
+    "LLM_CACHE_ENABLED": "false",
+    "TELEMETRY_ENABLED": "false",
+})
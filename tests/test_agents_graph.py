@@ -0,0 +1,105 @@
+from langchain.agents import create_agent
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import StructuredTool
+from pathlib import Path
+from src.services.chat_model_service import ScriptedChatModel
+import asyncio
+import importlib.util
+import pytest
+
+# The graph module builds both deep agents when it is imported
+pytest.importorskip("deepagents")
+
+GRAPH_PATH = Path(__file__).parents[1] / "src" / "agents_graph copy.py"
+
+# Both agents find incident 12, through different chunks of it
+RISK_RESULTS = "[R:EV1#0] Biased hiring decisions\nScreening models reproduce past bias.\n\n[I:12#0] Hiring tool rejected women\nThe tool downgraded CVs."
+INCIDENT_RESULTS = "[I:12#1] Hiring tool rejected women\nIt was scrapped in 2018.\n\n[I:40#0] Chatbot gave harmful advice\nA support bot hallucinated."
+
+
+def load_graph(monkeypatch, mode: str):
+    '''A fresh copy of the graph module; the fan-out edges are fixed when it is imported.'''
+    monkeypatch.setenv("AGENT_FANOUT_MODE", mode)
+    spec = importlib.util.spec_from_file_location(f"src.agents_graph_{mode}", GRAPH_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def scripted_agent(tool_name: str, results: str, runs: list[str]):
+    def search(query: str) -> str:
+        runs.append(tool_name)
+        return results
+    tool = StructuredTool.from_function(func=search, name=tool_name, description=tool_name)
+    return create_agent(model=ScriptedChatModel(), tools=[tool])
+
+
+@pytest.fixture
+def runs():
+    '''Names of the search tools called, one per agent run.'''
+    return []
+
+
+def patch_agents(monkeypatch, module, runs):
+    monkeypatch.setattr(module, "risks_agent", scripted_agent("search_risks", RISK_RESULTS, runs))
+    monkeypatch.setattr(module, "incident_agent", scripted_agent("search_incidents", INCIDENT_RESULTS, runs))
+
+
+def invoke(module, query: str, action: str) -> dict:
+    inputs = {'messages': [HumanMessage(content=query)], 'llm_calls': 0}
+    return module.graph.invoke(inputs) if action == "sync" else asyncio.run(module.graph.ainvoke(inputs))
+
+
+@pytest.mark.parametrize("action", ["sync", "async"])
+def test_always_mode_runs_both_agents_and_merges_their_answers(monkeypatch, runs, action):
+    module = load_graph(monkeypatch, "always")
+    patch_agents(monkeypatch, module, runs)
+
+    result = invoke(module, "What are the risks of AI hiring tools?", action)
+
+    assert sorted(runs) == ["search_incidents", "search_risks"]
+    answer = result['messages'][-1].text
+    # Sections come in a fixed order, whichever branch finished first
+    assert answer.index("## Risk analysis") < answer.index("## Incident analysis") < answer.index("## Sources")
+    # Each scripted agent made one tool-calling turn and one answering turn, summed across branches
+    assert result['llm_calls'] == 4
+    assert [output['agent'] for output in result['agent_outputs']].count("risk_agent") == 1
+
+
+def test_duplicate_citations_collapse_in_the_merged_answer(monkeypatch, runs):
+    module = load_graph(monkeypatch, "always")
+    patch_agents(monkeypatch, module, runs)
+
+    answer = invoke(module, "What are the risks of AI hiring tools?", "sync")['messages'][-1].text
+    sources = answer.split("## Sources\n\n")[1].splitlines()
+
+    assert sources == [
+        "1. Biased hiring decisions (ai_risk_database_v3.csv, R:EV1)",
+        "2. Hiring tool rejected women (incidents.csv, I:12)",
+        "3. Chatbot gave harmful advice (incidents.csv, I:40)",
+    ]
+
+
+def test_router_mode_runs_only_the_routed_agent(monkeypatch, runs):
+    module = load_graph(monkeypatch, "router")
+    patch_agents(monkeypatch, module, runs)
+
+    result = invoke(module, "What are the risks of AI hiring tools?", "sync")
+
+    assert runs == ["search_risks"]
+    assert [output['agent'] for output in result['agent_outputs']] == ["risk_agent"]
+    answer = result['messages'][-1].text
+    # A single answer is passed through without section headers
+    assert answer.startswith("Analysis of: What are the risks of AI hiring tools?")
+    assert "## Risk analysis" not in answer
+    assert result['llm_calls'] == 2
+
+
+def test_router_mode_fans_out_when_both_are_asked_for(monkeypatch, runs):
+    module = load_graph(monkeypatch, "router")
+    patch_agents(monkeypatch, module, runs)
+
+    result = invoke(module, "Which incidents happened and what risks remain for AI hiring tools?", "sync")
+
+    assert sorted(runs) == ["search_incidents", "search_risks"]
+    assert result['llm_calls'] == 4
@@ -0,0 +1,151 @@
+from fastapi.testclient import TestClient
+from langchain_core.tools import StructuredTool
+from src import api, main, warmup
+import asyncio
+import json
+import pytest
+
+
+def fake_search(name: str) -> StructuredTool:
+    '''Offline tool with the arguments of the real one.'''
+    def search(**kwargs) -> str:
+        return f"[{name}] result for {next(iter(kwargs.values()))}"
+
+    async def asearch(**kwargs) -> str:
+        return search(**kwargs)
+    return StructuredTool.from_function(func=search, coroutine=asearch, name=name, description=name,
+                                        args_schema=main.tools_dict[name].args_schema)
+
+
+@pytest.fixture(autouse=True)
+def offline_tools(monkeypatch):
+    # The scripted model calls every search_* tool; answer them without the RAG indexes
+    for name in ("search_incidents", "search_risks", "search_reports"):
+        monkeypatch.setitem(main.tools_dict, name, fake_search(name))
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    semaphore = asyncio.Semaphore(2)
+    monkeypatch.setattr(api, "_analysis_slots", semaphore)
+    monkeypatch.setattr(api, "ANALYSIS_QUEUE_TIMEOUT_SECONDS", 0.05)
+    return semaphore
+
+
+@pytest.fixture
+def client():
+    # Without the context manager the lifespan, and so the startup warmup, does not run
+    return TestClient(api.app)
+
+
+def sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class FakeRequest:
+    '''Stands in for the Starlette request; reports a disconnect after `connected_for` checks.'''
+
+    def __init__(self, connected_for: int | None = None):
+        self.connected_for = connected_for
+        self.checks = 0
+
+    async def is_disconnected(self) -> bool:
+        self.checks += 1
+        return self.connected_for is not None and self.checks > self.connected_for
+
+
+def test_analysis_streams_tool_events_and_the_final_answer(client, slots):
+    response = client.post("/analyze", json={'query': "Risks of facial recognition"})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith("text/event-stream")
+    events = sse_events(response.text)
+    assert events[0] == ("start", {'query': "Risks of facial recognition"})
+    assert {data['name'] for kind, data in events if kind == "tool_start"} == {"search_incidents", "search_risks", "search_reports"}
+    kind, final = events[-1]
+    assert kind == "final"
+    assert final['answer'].startswith("Analysis of: Risks of facial recognition")
+    assert final['llm_calls'] == 2
+    # The completed stream gave its slot back
+    assert slots._value == 2
+
+
+def test_full_slots_turn_requests_away(client, slots):
+    async def hold_all_slots():
+        await slots.acquire()
+        await slots.acquire()
+    asyncio.run(hold_all_slots())
+
+    response = client.post("/analyze", json={'query': "anything"})
+
+    assert response.status_code == 503
+    assert response.json() == {'detail': "Too many concurrent analyses, retry later."}
+
+
+def test_cancelled_stream_gives_its_slot_back(slots):
+    async def cancel_after_first_event():
+        response = await api.analyze(api.AnalysisRequest(query="Risks of chatbots"), FakeRequest())
+        assert slots._value == 1
+        body = response.body_iterator
+        first = await body.__anext__()
+        await body.aclose()
+        # Released by the close itself, not later when the event loop finalizes the generators
+        assert slots._value == 2
+        return first
+
+    assert asyncio.run(cancel_after_first_event()).startswith("event: start")
+
+
+def test_disconnected_client_stops_the_run_and_gives_its_slot_back(slots):
+    async def consume():
+        response = await api.analyze(api.AnalysisRequest(query="Risks of chatbots"), FakeRequest(connected_for=1))
+        chunks = [chunk async for chunk in response.body_iterator]
+        assert slots._value == 2
+        return chunks
+
+    chunks = asyncio.run(consume())
+
+    assert chunks[0].startswith("event: start")
+    assert not any(chunk.startswith("event: final") for chunk in chunks)
+
+
+def test_readyz_waits_for_warmup(client, monkeypatch):
+    monkeypatch.setattr(warmup, "_ready", type(warmup._ready)())
+    monkeypatch.setattr(warmup, "WARMUP_TARGETS", {'risks': lambda: None, 'incidents': lambda: None})
+
+    assert client.get("/healthz").json() == {'status': "ok"}
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()['status'] == "warming_up"
+
+    warmup.warmup()
+    assert client.get("/readyz").json() == {'status': "ready"}
+
+
+def test_readyz_reports_warmup_errors(client, monkeypatch):
+    def broken():
+        raise RuntimeError("incidents.csv not found")
+
+    monkeypatch.setattr(warmup, "_ready", type(warmup._ready)())
+    monkeypatch.setattr(warmup, "WARMUP_TARGETS", {'risks': lambda: None, 'incidents': broken})
+    warmup.warmup()
+
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()['errors'] == {'incidents': "incidents.csv not found"}
+
+
+def test_stats_and_metrics(client, slots):
+    client.post("/analyze", json={'query': "Risks of facial recognition"})
+
+    stats = client.get("/stats").json()
+    assert {'query_cache', 'report_cache', 'metrics'} <= set(stats)
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers['content-type'].startswith("text/plain")
+    assert "# TYPE ai_ethics_tool_call_duration_seconds histogram" in metrics.text
@@ -0,0 +1,75 @@
+from langchain_core.documents import Document
+from src.services.batch_ingestion_service import BatchIngestor
+from collections import Counter
+import threading
+import pytest
+
+
+class FlakyEmbeddings:
+    '''Fails every attempt at the batches starting with a text in `broken`, and the first attempt at those in `flaky`.'''
+
+    def __init__(self, flaky: set[str] = frozenset(), broken: set[str] = frozenset()):
+        self.flaky = flaky
+        self.broken = broken
+        self.attempts: Counter[str] = Counter()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.attempts[texts[0]] += 1
+        if texts[0] in self.broken or (texts[0] in self.flaky and self.attempts[texts[0]] == 1):
+            raise ConnectionError(f"embedding {texts[0]} failed")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class RecordingCollection:
+    '''The parts of a langchain Chroma collection BatchIngestor uses, recording each write and its thread.'''
+
+    name = "ingest_test"
+
+    def __init__(self, embeddings: FlakyEmbeddings):
+        self.embeddings = embeddings
+        self._collection = self
+        self.writes: list[tuple[list[str], int]] = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        assert len(ids) == len(embeddings) == len(documents) == len(metadatas)
+        self.writes.append((ids, threading.get_ident()))
+
+
+def pairs(count: int) -> list[tuple[str, Document]]:
+    return [(f"doc-{n}", Document(page_content=f"text {n}", metadata={'n': n})) for n in range(count)]
+
+
+@pytest.fixture
+def batches():
+    '''(ids, ok) of every on_batch call.'''
+    return []
+
+
+def test_transient_failures_are_retried_and_permanent_ones_reported(batches):
+    embeddings = FlakyEmbeddings(flaky={"text 2"}, broken={"text 4"})
+    collection = RecordingCollection(embeddings)
+    ingestor = BatchIngestor(batch_size=2, max_workers=3, max_retries=2, retry_backoff=0)
+
+    report = ingestor.ingest_stream(collection, pairs(6), lambda ids, ok: batches.append((ids, ok)))
+
+    assert embeddings.attempts == {"text 0": 1, "text 2": 2, "text 4": 3}
+    assert report.total == 6
+    assert report.written == 4
+    assert report.failed_ids == ["doc-4", "doc-5"]
+    assert not report.succeeded
+    assert sorted(batches) == [(["doc-0", "doc-1"], True), (["doc-2", "doc-3"], True), (["doc-4", "doc-5"], False)]
+    assert sorted(ids for ids, _ in collection.writes) == [["doc-0", "doc-1"], ["doc-2", "doc-3"]]
+
+
+def test_writes_happen_in_order_on_the_calling_thread(batches):
+    collection = RecordingCollection(FlakyEmbeddings(flaky={"text 0"}))
+    # With one worker, batches complete in the order they were read
+    ingestor = BatchIngestor(batch_size=3, max_workers=1, max_retries=1, retry_backoff=0)
+
+    report = ingestor.ingest_stream(collection, iter(pairs(10)), lambda ids, ok: batches.append((ids, ok)))
+
+    assert report.succeeded and report.written == 10
+    assert [ids for ids, _ in collection.writes] == [[f"doc-{n}" for n in range(first, min(first + 3, 10))]
+                                                     for first in range(0, 10, 3)]
+    assert {thread for _, thread in collection.writes} == {threading.get_ident()}
+    assert [ids for ids, _ in batches] == [ids for ids, _ in collection.writes]
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.services import bm25_index_service
+from src.services.bm25_index_service import BM25Index, tokenize
+import pytest
+import math
+import sys
+
+IDS = ["r1", "r2", "r3", "r4"]
+TEXTS = [
+    "Facial recognition misidentified a suspect",
+    "Chatbot gave harmful medical advice",
+    "Facial recognition used for mass surveillance",
+    "Autonomous car crash on the highway",
+]
+METADATAS = [
+    {'source': 'incidents', 'incident_date': '2018-05-01', 'deployer': 'Police'},
+    {'source': 'incidents', 'incident_date': '2021-03-10', 'deployer': 'Clinic'},
+    {'source': 'risks', 'incident_date': '2019-11-20'},
+    {'source': 'incidents', 'incident_date': '2022-07-04', 'deployer': 'Police'},
+]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(IDS, TEXTS, METADATAS, version="v1")
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    index.save(tmp_path / "index")
+    loaded = BM25Index.load(tmp_path / "index", version="v1")
+
+    assert loaded is not None
+    assert loaded.num_docs == index.num_docs
+    assert loaded.vocabulary == index.vocabulary
+    assert [doc.id for doc, _ in loaded.search("facial recognition", k=4)] == \
+        [doc.id for doc, _ in index.search("facial recognition", k=4)]
+    assert loaded.get_document(1).page_content == TEXTS[1]
+    assert loaded.get_document(1).metadata == METADATAS[1]
+
+
+def test_load_rejects_other_versions_and_missing_indexes(index, tmp_path):
+    index.save(tmp_path / "index")
+
+    assert BM25Index.load(tmp_path / "index", version="v2") is None
+    assert BM25Index.load(tmp_path / "missing", version="v1") is None
+
+
+def test_save_replaces_a_previous_index(index, tmp_path):
+    index.save(tmp_path / "index")
+    BM25Index.build(["x"], ["something else"], [{}], version="v2").save(tmp_path / "index")
+
+    assert BM25Index.load(tmp_path / "index", version="v1") is None
+    assert BM25Index.load(tmp_path / "index", version="v2").num_docs == 1
+
+
+def reference_bm25(query: str, texts: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+    docs = [tokenize(text) for text in texts]
+    avgdl = sum(len(doc) for doc in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in tokenize(query):
+            df = sum(term in other for other in docs)
+            tf = doc.count(term)
+            idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+        scores.append(score)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["facial recognition", "car crash", "recognition recognition advice", "unknown"])
+def test_scores_match_okapi_bm25(index, query):
+    assert index.score(query).tolist() == pytest.approx(reference_bm25(query, TEXTS), rel=1e-5)
+
+
+def test_search_returns_top_k_matches_best_first(index):
+    results = index.search("facial recognition surveillance", k=2)
+
+    assert [doc.id for doc, _ in results] == ["r3", "r1"]
+    assert results[0][1] > results[1][1]
+    # Only documents that match at least one term are returned
+    assert [doc.id for doc, _ in index.search("surveillance", k=4)] == ["r3"]
+    assert index.search("unknown", k=4) == []
+
+
+def test_filters_on_values_lists_and_ranges(index):
+    def ids(filters):
+        mask = index.filter_mask(filters)
+        return [IDS[i] for i in range(len(IDS)) if mask[i]]
+
+    assert index.filter_mask(None) is None
+    assert ids({'deployer': 'Police'}) == ["r1", "r4"]
+    assert ids({'deployer': ['Police', 'Clinic']}) == ["r1", "r2", "r4"]
+    assert ids({'incident_date': {'gte': '2019-01-01', 'lt': '2022-01-01'}}) == ["r2", "r3"]
+    assert ids({'source': 'incidents', 'incident_date': {'$gt': '2020-01-01'}}) == ["r2", "r4"]
+    assert ids({'not_a_field': 'x'}) == []
+    with pytest.raises(ValueError):
+        index.filter_mask({'incident_date': {'ne': '2020'}})
+
+
+def test_search_applies_filters(index):
+    results = index.search("facial recognition", k=4, filters={'source': 'risks'})
+
+    assert [doc.id for doc, _ in results] == ["r3"]
+
+
+def test_filter_masks_are_safe_to_share_across_threads(index, monkeypatch):
+    monkeypatch.setattr(bm25_index_service, "_MASK_CACHE_SIZE", 2)
+    # Switch threads as often as possible, so lookups and evictions interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    filters = [{'deployer': 'Police'}, {'deployer': 'Clinic'}, {'source': 'risks'}, {'source': 'incidents'}]
+    expected = [index.filter_mask(f).tolist() for f in filters]
+
+    def churn(offset: int) -> bool:
+        return all(
+            index.filter_mask(filters[(offset + i) % len(filters)]).tolist() == expected[(offset + i) % len(filters)]
+            for i in range(500)
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert all(executor.map(churn, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    assert len(index._mask_cache) <= 2
@@ -0,0 +1,88 @@
+from langchain_core.load import dumps
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from src.services.chat_model_service import ResponseCache, ScriptedChatModel, get_chat_model, normalize_prompt
+import pytest
+
+
+@tool
+def search_risks(query: str, top_k: int = 5) -> str:
+    '''Search the risk database.'''
+    return ""
+
+
+@tool
+def get_document(document_id: str) -> str:
+    '''Fetch a document by id.'''
+    return ""
+
+
+def conversation(call_id: str, message_id: str) -> list:
+    return [
+        HumanMessage(content="What are the risks?", id=message_id),
+        AIMessage(content="", id=f"{message_id}-ai", tool_calls=[
+            {'name': 'search_risks', 'args': {'query': 'risks'}, 'id': call_id, 'type': 'tool_call'},
+        ], response_metadata={'finish_reason': 'STOP'}),
+        ToolMessage(content="results", tool_call_id=call_id, name="search_risks"),
+    ]
+
+
+def test_normalize_prompt_ignores_ids_and_response_metadata():
+    first = normalize_prompt(dumps(conversation("abc", "m1")))
+    second = normalize_prompt(dumps(conversation("xyz", "m2")))
+
+    assert first == second
+    assert '"call_0"' in first
+    assert normalize_prompt("not json") == "not json"
+
+
+def test_scripted_model_replays_its_script():
+    model = ScriptedChatModel(script=[AIMessage(content="first"), AIMessage(content="second")])
+
+    assert model.invoke([HumanMessage(content="hi")]).content == "first"
+    assert model.invoke([HumanMessage(content="hi"), AIMessage(content="first")]).content == "second"
+
+
+def test_scripted_model_calls_search_tools_then_summarises():
+    model = ScriptedChatModel().bind_tools([search_risks, get_document])
+    question = HumanMessage(content="Risks of facial recognition?")
+
+    call = model.invoke([question])
+    assert [(c['name'], c['args']) for c in call.tool_calls] == [('search_risks', {'query': question.content})]
+
+    result = ToolMessage(content="Mass surveillance", tool_call_id=call.tool_calls[0]['id'], name="search_risks")
+    answer = model.invoke([question, call, result])
+    assert not answer.tool_calls
+    assert "Analysis of: Risks of facial recognition?" in answer.content
+    assert "[search_risks] Mass surveillance" in answer.content
+
+
+def test_response_cache_serves_repeated_conversations():
+    cache = ResponseCache(":memory:")
+    model = ScriptedChatModel(cache=cache, script=[AIMessage(content="cached answer")])
+
+    assert model.invoke([HumanMessage(content="hi", id="1")]).content == "cached answer"
+    # Only the message id differs: same normalized prompt
+    assert model.invoke([HumanMessage(content="hi", id="2")]).content == "cached answer"
+    assert model.invoke([HumanMessage(content="hello")]).content == "cached answer"
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'hit_ratio': pytest.approx(1 / 3), 'entries': 2}
+
+    cache.clear()
+    assert cache.stats()['entries'] == 0
+
+
+def test_response_cache_round_trips_tool_calls():
+    cache = ResponseCache(":memory:")
+    model = ScriptedChatModel(cache=cache).bind_tools([search_risks])
+
+    first = model.invoke([HumanMessage(content="risks")])
+    second = model.invoke([HumanMessage(content="risks")])
+
+    assert cache.hits == 1
+    assert second.tool_calls == first.tool_calls
+
+
+def test_get_chat_model_selects_the_backend():
+    assert isinstance(get_chat_model(backend="fake"), ScriptedChatModel)
+    with pytest.raises(ValueError):
+        get_chat_model(backend="unknown")
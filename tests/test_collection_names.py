@@ -0,0 +1,36 @@
+from src.services.embedding_service import (
+    MAX_COLLECTION_NAME_LENGTH, collection_suffix, storage_collection_name, validate_collection_name,
+)
+import pytest
+
+
+@pytest.mark.parametrize("spec, name", [
+    ("models/embedding-001", "incidents_database"),
+    ("fake:64", "incidents_database__fake-64"),
+    ("sentence-transformers:all-MiniLM-L6-v2", "incidents_database__st-all-minilm-l6-v2"),
+])
+def test_simple_model_names_stay_readable(spec, name):
+    assert storage_collection_name("incidents_database", spec) == name
+
+
+def test_model_paths_are_shortened_and_hashed():
+    first = collection_suffix("onnx:/models/a/all-MiniLM-L6-v2")
+    second = collection_suffix("onnx:/models/b/all-MiniLM-L6-v2")
+
+    assert first.startswith("onnx-all-minilm-l6-v2-")
+    assert first != second
+
+
+def test_long_model_names_fit_chroma_limits():
+    spec = "onnx:/very/long/path/to/a/model/" + "multilingual-e5-large-instruct-quantized-" * 4 + "v2"
+    name = storage_collection_name("ai_risk_database_v3", spec)
+
+    assert len(name) <= MAX_COLLECTION_NAME_LENGTH
+    assert name != storage_collection_name("ai_risk_database_v3", spec + "1")
+    validate_collection_name(name)
+
+
+@pytest.mark.parametrize("name", ["ab", "x" * (MAX_COLLECTION_NAME_LENGTH + 1), "bad name", "-leading", "a..b"])
+def test_invalid_names_are_rejected(name):
+    with pytest.raises(ValueError):
+        validate_collection_name(name)
@@ -0,0 +1,79 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from src.services.context_budget_service import (
+    apply_replacements, compact_tool_result, compact_tool_results, estimate_tokens, is_compacted,
+)
+
+
+def tool_round(round_id: int, size: int) -> list:
+    call_id = f"call_{round_id}"
+    return [
+        AIMessage(content="", id=f"ai_{round_id}", tool_calls=[
+            {'name': 'search_risks', 'args': {'query': 'q'}, 'id': call_id, 'type': 'tool_call'},
+        ]),
+        ToolMessage(content=f"result {round_id} " + "word " * size, tool_call_id=call_id,
+                    name="search_risks", id=f"tool_{round_id}"),
+    ]
+
+
+def conversation(*sizes: int) -> list:
+    messages = [HumanMessage(content="What are the risks?", id="human")]
+    for round_id, size in enumerate(sizes):
+        messages += tool_round(round_id, size)
+    return messages
+
+
+def test_nothing_is_compacted_within_budget():
+    messages = conversation(50, 50)
+    replacements, total = compact_tool_results(messages, budget=10_000)
+
+    assert replacements == []
+    assert total == estimate_tokens(messages)
+
+
+def test_oldest_results_are_compacted_first():
+    messages = conversation(2000, 2000, 2000)
+    budget = estimate_tokens(messages) - 1500
+    replacements, total = compact_tool_results(messages, budget=budget)
+
+    assert [message.id for message in replacements] == ["tool_0"]
+    assert total <= budget
+    assert total == estimate_tokens(apply_replacements(messages, replacements))
+
+
+def test_latest_round_is_compacted_last():
+    messages = conversation(2000, 2000)
+    replacements, total = compact_tool_results(messages, budget=100)
+
+    assert [message.id for message in replacements] == ["tool_0", "tool_1"]
+    # Everything is a stub and the prompt is still too big: reported, not looped on
+    assert total > 100
+
+
+def test_reserved_tokens_count_against_the_budget():
+    messages = conversation(500)
+    budget = estimate_tokens(messages) + 10
+
+    assert compact_tool_results(messages, budget=budget)[0] == []
+    assert [m.id for m in compact_tool_results(messages, budget=budget, reserved_tokens=200)[0]] == ["tool_0"]
+
+
+def test_compacted_results_are_not_compacted_again():
+    messages = conversation(2000, 2000)
+    replacements, _ = compact_tool_results(messages, budget=estimate_tokens(messages) - 1000)
+    messages = apply_replacements(messages, replacements)
+
+    again, _ = compact_tool_results(messages, budget=estimate_tokens(messages) - 1000)
+    assert [message.id for message in again] == ["tool_1"]
+
+
+def test_stub_keeps_identity_and_the_opening_text():
+    message = tool_round(0, 500)[1]
+    stub = compact_tool_result(message, max_chars=40)
+
+    assert (stub.id, stub.tool_call_id, stub.name) == (message.id, message.tool_call_id, message.name)
+    assert is_compacted(stub) and not is_compacted(message)
+    assert stub.text.startswith(message.text[:30])
+    assert f"{len(message.text)} chars originally" in stub.text
+
+    short = ToolMessage(content="short", tool_call_id="c", id="t")
+    assert compact_tool_result(short).text == "short"
@@ -0,0 +1,90 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from src.services.embedding_cache_service import CachedEmbeddings
+import pytest
+
+
+class CountingEmbeddings(Embeddings):
+    '''Fake embeddings that record every text they are asked to embed.'''
+
+    def __init__(self):
+        self.inner = DeterministicFakeEmbedding(size=8)
+        self.documents: list[str] = []
+        self.queries: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.documents.extend(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return self.inner.embed_query(text)
+
+
+@pytest.fixture
+def inner():
+    return CountingEmbeddings()
+
+
+def cached(inner, max_entries=100):
+    return CachedEmbeddings(inner, "fake", db_path=":memory:", max_entries=max_entries)
+
+
+def test_repeated_texts_are_embedded_once(inner):
+    cache = cached(inner)
+    first = cache.embed_documents(["a", "b"])
+    second = cache.embed_documents(["b", "a"])
+
+    assert inner.documents == ["a", "b"]
+    assert second == [pytest.approx(first[1]), pytest.approx(first[0])]
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+
+
+def test_duplicates_within_a_call_count_once(inner):
+    cache = cached(inner)
+    vectors = cache.embed_documents(["a", "a", "b"])
+
+    assert inner.documents == ["a", "b"]
+    assert vectors[0] == vectors[1]
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['hits'] == 0
+
+    cache.embed_documents(["a", "a"])
+    assert cache.stats()['hits'] == 1
+
+
+def test_queries_and_documents_are_cached_separately(inner):
+    cache = cached(inner)
+    cache.embed_documents(["a"])
+    cache.embed_query("a")
+    cache.embed_query("a")
+
+    assert inner.documents == ["a"]
+    assert inner.queries == ["a"]
+    assert cache.stats()['entries'] == 2
+
+
+def test_least_recently_used_entries_are_evicted(inner):
+    cache = cached(inner, max_entries=3)
+    cache.embed_documents(["a", "b", "c"])
+    cache.embed_documents(["a"])  # refresh "a", "b" is now the oldest
+    cache.embed_documents(["d"])
+
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['entries'] == cache._count()
+
+    inner.documents.clear()
+    cache.embed_documents(["a", "c", "d"])
+    assert inner.documents == []
+    cache.embed_documents(["b"])
+    assert inner.documents == ["b"]
+
+
+def test_clear_empties_the_cache(inner):
+    cache = cached(inner)
+    cache.embed_documents(["a", "b"])
+    cache.clear()
+
+    assert cache.stats()['entries'] == 0
+    cache.embed_documents(["a"])
+    assert inner.documents == ["a", "b", "a"]
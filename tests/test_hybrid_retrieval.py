@@ -0,0 +1,61 @@
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_chroma import Chroma
+from src.services.bm25_index_service import BM25Index
+from src.services.retrieval_service import HybridRetriever, _chroma_where
+import chromadb
+import pytest
+import uuid
+
+
+@pytest.fixture
+def retriever():
+    texts = ["facial recognition error", "chatbot medical advice", "self driving car crash"]
+    ids = ["a", "b", "c"]
+    metadatas = [{'deployer': 'Police'}, {'deployer': 'Clinic'}, {'deployer': 'Police'}]
+    vector_store = Chroma(
+        collection_name=f"test-{uuid.uuid4().hex[:8]}",
+        embedding_function=DeterministicFakeEmbedding(size=8),
+        client=chromadb.EphemeralClient(),
+    )
+    vector_store.add_texts(texts, metadatas=metadatas, ids=ids)
+    return HybridRetriever(bm25_index=BM25Index.build(ids, texts, metadatas, version="v1"), vector_store=vector_store)
+
+
+def docs(*ids: str) -> list[Document]:
+    return [Document(id=doc_id, page_content=doc_id) for doc_id in ids]
+
+
+def test_fuse_sums_weighted_reciprocal_ranks(retriever):
+    fused = retriever.fuse([docs("a", "b", "c"), docs("c", "b")], (0.5, 0.5), top_k=3)
+
+    # c: 1/63 + 1/61 edges out b: 1/62 + 1/62, a only has 1/61
+    assert [doc.id for doc in fused] == ["c", "b", "a"]
+
+
+def test_fuse_respects_weights_and_top_k(retriever):
+    fused = retriever.fuse([docs("a", "b"), docs("b", "a")], (0.9, 0.1), top_k=1)
+
+    assert [doc.id for doc in fused] == ["a"]
+    assert retriever.fuse([[], []], (0.5, 0.5), top_k=3) == []
+
+
+def test_invoke_passes_top_k_and_filters_to_both_legs(retriever):
+    results = retriever.invoke("facial recognition car", top_k=1)
+    assert len(results) == 1
+
+    filtered = retriever.invoke("facial recognition chatbot car", top_k=3, filters={'deployer': 'Police'})
+    assert {doc.id for doc in filtered} == {"a", "c"}
+
+
+def test_chroma_where_keeps_ranges_for_post_filtering():
+    where, post_filters = _chroma_where({
+        'deployer': 'Police',
+        'domain': ['Health', 'Transport'],
+        'incident_date': {'gte': '2020-01-01'},
+    })
+
+    assert where == {"$and": [{'deployer': 'Police'}, {'domain': {"$in": ['Health', 'Transport']}}]}
+    assert post_filters == {'incident_date': {'gte': '2020-01-01'}}
+    assert _chroma_where({'incident_date': {'lt': '2020'}}) == (None, {'incident_date': {'lt': '2020'}})
+
@@ -0,0 +1,158 @@
+from langchain_core.documents import Document
+from src.services import ingestion_manifest_service as manifests
+from src.services.batch_ingestion_service import BatchIngestor
+from src.services.ingestion_manifest_service import IngestionManifest, content_hash, sync_documents, vectorStoreService
+from functools import partial
+import json
+import pytest
+import uuid
+
+TEXT = "A delivery robot injured a pedestrian on a crowded sidewalk. " * 10
+
+
+def records(reports: str, text: str = TEXT, extra: dict | None = None, count: int = 3) -> list[tuple[str, Document]]:
+    return [
+        (str(n), Document(page_content=f"Incident {n}. {text}",
+                          metadata={'id': n, 'reports': reports, 'ingestion_date': str(uuid.uuid4()), **(extra or {})}))
+        for n in range(count)
+    ]
+
+
+@pytest.fixture
+def collection_name():
+    return f"manifest_test_{uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    '''Chunk ids sent to be embedded by each sync.'''
+    chunk_ids: list[str] = []
+    upsert_stream = vectorStoreService.upsert_stream
+
+    def spy(pairs, collection_name, **kwargs):
+        def recorded():
+            for chunk_id, chunk in pairs:
+                chunk_ids.append(chunk_id)
+                yield chunk_id, chunk
+        return upsert_stream(recorded(), collection_name, **kwargs)
+
+    monkeypatch.setattr(vectorStoreService, "upsert_stream", spy)
+    return chunk_ids
+
+
+def sync(docs, collection_name):
+    return sync_documents(docs, collection_name, chunk_size=200, chunk_overlap=0)
+
+
+def stored_metadata(collection_name) -> list[dict]:
+    return vectorStoreService.get_or_create_collection(collection_name)._collection.get(include=['metadatas'])['metadatas']
+
+
+def test_unchanged_records_are_skipped(collection_name, embedded):
+    sync(records("[2]"), collection_name)
+    first = len(embedded)
+    sync(records("[2]"), collection_name)
+
+    assert first > 3
+    assert len(embedded) == first
+
+
+def test_metadata_changes_are_updated_in_place(collection_name, embedded):
+    sync(records("[2]", extra={'obsolete': 'x'}), collection_name)
+    embedded.clear()
+    count = vectorStoreService.count(collection_name)
+
+    sync(records("[2, 7]"), collection_name)
+
+    assert embedded == []
+    assert vectorStoreService.count(collection_name) == count
+    metadatas = stored_metadata(collection_name)
+    assert {metadata['reports'] for metadata in metadatas} == {"[2, 7]"}
+    assert not any('obsolete' in metadata for metadata in metadatas)
+
+
+def test_metadata_updates_are_batched(collection_name, embedded, monkeypatch):
+    monkeypatch.setattr(manifests, "METADATA_UPDATE_BATCH_SIZE", 2)
+    sync(records("[2]"), collection_name)
+    sync(records("[3]"), collection_name)
+
+    assert {metadata['reports'] for metadata in stored_metadata(collection_name)} == {"[3]"}
+
+
+def test_text_changes_are_embedded_again(collection_name, embedded):
+    sync(records("[2]"), collection_name)
+    embedded.clear()
+    sync(records("[2]", text="A chatbot gave harmful advice. " * 10), collection_name)
+
+    assert {chunk_id.split("#")[0] for chunk_id in embedded} == {"0", "1", "2"}
+    manifest = IngestionManifest.load(vectorStoreService.storage_name(collection_name))
+    assert set(manifest.all_chunk_ids()) == set(vectorStoreService.get_or_create_collection(collection_name).get()['ids'])
+
+
+def test_removed_records_are_deleted(collection_name, embedded):
+    sync(records("[2]"), collection_name)
+    sync(records("[2]")[:2], collection_name)
+
+    ids = vectorStoreService.get_or_create_collection(collection_name).get()['ids']
+    assert ids and not any(chunk_id.startswith("2#") for chunk_id in ids)
+
+
+def test_version_1_manifests_are_upgraded_without_embedding(collection_name, embedded):
+    sync(records("[2]"), collection_name)
+    path = IngestionManifest.path_for(vectorStoreService.storage_name(collection_name))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    docs = dict(records("[2]"))
+    data['version'] = 1
+    data['entries'] = {
+        key: {'hash': content_hash(docs[key]), 'chunk_ids': entry['chunk_ids']}
+        for key, entry in data['entries'].items()
+    }
+    path.write_text(json.dumps(data), encoding="utf-8")
+    embedded.clear()
+
+    sync(records("[2]"), collection_name)
+
+    assert embedded == []
+    manifest = IngestionManifest.load(vectorStoreService.storage_name(collection_name))
+    assert all({'text_hash', 'metadata_hash', 'chunk_ids'} == set(entry) for entry in manifest.entries.values())
+
+
+def test_interrupted_sync_resumes_from_its_checkpoint(collection_name, embedded, monkeypatch):
+    sync(records("[2]", count=6), collection_name)
+    storage_name = vectorStoreService.storage_name(collection_name)
+    stored_ids = set(vectorStoreService.get_or_create_collection(collection_name).get()['ids'])
+
+    # Checkpoint every committed record, and read one chunk at a time so the source is not drained ahead
+    monkeypatch.setattr(manifests, "_SyncProgress", partial(manifests._SyncProgress, checkpoint_records=1))
+    upsert_stream = vectorStoreService.upsert_stream
+    monkeypatch.setattr(vectorStoreService, "upsert_stream", lambda pairs, collection_name, **kwargs: upsert_stream(
+        pairs, collection_name, ingestor=BatchIngestor(batch_size=1, max_workers=1), **kwargs))
+
+    changed = records("[2]", text="A chatbot gave harmful advice. " * 10, count=6)
+
+    def interrupted():
+        yield from changed[:3]
+        raise ConnectionError("source went away")
+
+    embedded.clear()
+    with pytest.raises(ConnectionError):
+        sync(interrupted(), collection_name)
+
+    manifest = IngestionManifest.load(storage_name)
+    assert manifest.checkpoint['complete'] is False
+    changed_hashes = {key: manifests.text_hash(doc) for key, doc in changed}
+    committed = {key for key, entry in manifest.entries.items() if entry['text_hash'] == changed_hashes[key]}
+    # Which of the records read were fully written before the interruption depends on timing
+    assert committed and committed <= {"0", "1", "2"}
+    # Records the partial run never read are neither dropped from the manifest nor deleted
+    assert {"3", "4", "5"} <= set(manifest.entries)
+    remaining_ids = set(vectorStoreService.get_or_create_collection(collection_name).get()['ids'])
+    assert {chunk_id for chunk_id in stored_ids if chunk_id.split("#")[0] in {"3", "4", "5"}} <= remaining_ids
+
+    embedded.clear()
+    sync(changed, collection_name)
+
+    assert {chunk_id.split("#")[0] for chunk_id in embedded} == {"0", "1", "2", "3", "4", "5"} - committed
+    manifest = IngestionManifest.load(storage_name)
+    assert manifest.checkpoint['complete'] is True
+    assert set(manifest.all_chunk_ids()) == set(vectorStoreService.get_or_create_collection(collection_name).get()['ids'])
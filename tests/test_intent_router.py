@@ -0,0 +1,69 @@
+from src.services.embedding_service import HashingEmbeddings
+from src.services.intent_router_service import IntentRouter, RISK_ROUTE, INCIDENT_ROUTE, ROUTES
+import pytest
+
+# Disjoint vocabularies, so hashing embeddings put each query clearly on one side or neither
+EXEMPLARS = {
+    RISK_ROUTE: ["bias in hiring models", "privacy of health chatbots", "harms of credit scoring"],
+    INCIDENT_ROUTE: ["drone hit pedestrians", "wrongful arrests after matching", "robots injured workers"],
+}
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(HashingEmbeddings(size=512), EXEMPLARS, threshold=0.75, margin=0.1, temperature=0.05)
+
+
+@pytest.mark.parametrize("query, routes", [
+    ("What are the risks of facial recognition?", [RISK_ROUTE]),
+    ("How do we mitigate bias in hiring?", [RISK_ROUTE]),
+    ("Have there been incidents with delivery drones?", [INCIDENT_ROUTE]),
+    ("Show past cases of wrongful arrests", [INCIDENT_ROUTE]),
+    ("Which risks showed up in reported incidents?", list(ROUTES)),
+])
+def test_keywords_decide_clear_requests(router, query, routes):
+    decision = router.route(query)
+
+    assert decision.method == "keywords"
+    assert decision.routes == routes
+
+
+@pytest.mark.parametrize("query", [
+    "Give me a case study of the risks of credit scoring",
+    "Latest news on the risks of chatbots",
+])
+def test_generic_words_do_not_override_risk_questions(router, query):
+    assert router.route(query).routes == [RISK_ROUTE]
+
+
+def test_confident_centroid_match_routes_to_one_agent(router):
+    decision = router.route("privacy of health chatbots and credit scoring")
+
+    assert decision.method == "centroid"
+    assert decision.routes == [RISK_ROUTE]
+    assert decision.confidence >= router.threshold
+    assert sum(decision.scores.values()) == pytest.approx(1.0)
+
+
+def test_near_tie_goes_to_both_agents_without_the_llm(router):
+    calls = []
+    decision = router.route("completely unrelated words", llm_fallback=lambda query: calls.append(query))
+
+    assert decision.method == "ambiguous"
+    assert decision.routes == list(ROUTES)
+    assert calls == []
+
+
+def test_llm_decides_between_threshold_and_margin():
+    # Never confident and never a tie: every embedding-routed request reaches the fallback
+    router = IntentRouter(HashingEmbeddings(size=512), EXEMPLARS, threshold=1.01, margin=0.0, temperature=0.05)
+
+    decision = router.route("wrongful arrests", llm_fallback=lambda query: [INCIDENT_ROUTE])
+    assert (decision.method, decision.routes) == ("llm", [INCIDENT_ROUTE])
+
+    def failing(query):
+        raise RuntimeError("model unavailable")
+
+    for fallback in (failing, lambda query: None, None):
+        decision = router.route("wrongful arrests", llm_fallback=fallback)
+        assert (decision.method, decision.routes) == ("ambiguous", list(ROUTES))
@@ -0,0 +1,71 @@
+from src.services import pdf_parsing_service as pdfs
+from src.services.pdf_parsing_service import PdfElementCache, parse_pdfs
+import pytest
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    '''Stands in for Unstructured: one element per page, recording each page range it was asked for.'''
+    calls: list[tuple[str, int, int | None, str]] = []
+
+    def partition_page_range(path, first_page, last_page, strategy):
+        calls.append((path, first_page, last_page, strategy))
+        last_page = 30 if last_page is None else last_page
+        return [{'text': f"page {page + 1}", 'metadata': {'page_number': page + 1, 'category': "NarrativeText"}}
+                for page in range(first_page, last_page)]
+
+    monkeypatch.setattr(pdfs, "partition_page_range", partition_page_range)
+    # Ranges listed last to first, as they may complete in the process pool
+    monkeypatch.setattr(pdfs, "page_ranges", lambda path, pages_per_task: [(20, None), (10, 20), (0, 10)])
+    return calls
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PdfElementCache(str(tmp_path / "cache" / "pdf_elements.duckdb"))
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "report.pdf"
+    path.write_bytes(b"%PDF-1.7 first version")
+    return path
+
+
+def test_page_ranges_are_reassembled_in_page_order(partitioned, cache, pdf):
+    elements = parse_pdfs([pdf], cache=cache, max_workers=1)[pdf]
+
+    assert [element['text'] for element in elements] == [f"page {page}" for page in range(1, 31)]
+    assert len(partitioned) == 3
+
+
+def test_cached_files_are_not_parsed_again(partitioned, cache, pdf, tmp_path):
+    first = parse_pdfs([pdf], cache=cache, max_workers=1)[pdf]
+    partitioned.clear()
+
+    # The key is the file contents, so a copy under another name is a hit too
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(pdf.read_bytes())
+    second = parse_pdfs([pdf, copy], cache=cache, max_workers=1)
+
+    assert partitioned == []
+    assert second[pdf] == first and second[copy] == first
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'files': 1, 'elements': 30}
+
+
+def test_changed_files_and_strategies_are_parsed_again(partitioned, cache, pdf, monkeypatch):
+    parse_pdfs([pdf], cache=cache, max_workers=1)
+
+    pdf.write_bytes(b"%PDF-1.7 second version")
+    parse_pdfs([pdf], cache=cache, max_workers=1)
+    parse_pdfs([pdf], cache=cache, strategy="hi_res", max_workers=1)
+    monkeypatch.setattr(pdfs, "PARSER_VERSION", pdfs.PARSER_VERSION + 1)
+    parse_pdfs([pdf], cache=cache, strategy="hi_res", max_workers=1)
+
+    assert len(partitioned) == 4 * 3
+    default = pdfs.PDF_PARTITION_STRATEGY
+    assert [strategy for *_, strategy in partitioned[::3]] == [default, default, "hi_res", "hi_res"]
+    assert cache.stats()['misses'] == 4
+    assert cache.stats()['hits'] == 0
@@ -0,0 +1,108 @@
+from src.services.embedding_service import HashingEmbeddings
+from src.services.ingestion_manifest_service import IngestionManifest, collection_version
+from src.services.query_cache_service import SemanticQueryCache
+import asyncio
+import os
+import pytest
+
+embeddings = HashingEmbeddings(size=256)
+
+
+class Compute:
+    '''Counts how often the cached search actually runs.'''
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [f"result {self.calls}"]
+
+
+@pytest.fixture
+def cache():
+    return SemanticQueryCache("test", embeddings.embed_query, threshold=0.9, ttl=60, max_entries=2)
+
+
+def test_similar_queries_with_the_same_params_hit(cache):
+    compute = Compute()
+    params = cache.params_key(top_k=5)
+
+    first = cache.get_or_compute("facial recognition incidents", params, "v1", compute)
+    # Same words, different case and punctuation: identical hashing embedding
+    again = cache.get_or_compute("Facial recognition, incidents?", params, "v1", compute)
+
+    assert again == first
+    assert compute.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_different_queries_params_or_versions_miss(cache):
+    compute = Compute()
+    cache.get_or_compute("facial recognition incidents", cache.params_key(top_k=5), "v1", compute)
+
+    cache.get_or_compute("chatbot medical advice", cache.params_key(top_k=5), "v1", compute)
+    cache.get_or_compute("facial recognition incidents", cache.params_key(top_k=10), "v1", compute)
+    assert compute.calls == 3
+
+    # A new collection version drops every entry
+    cache.get_or_compute("facial recognition incidents", cache.params_key(top_k=5), "v2", compute)
+    assert compute.calls == 4
+    assert cache.stats()['entries'] == 1
+
+
+def test_params_key_ignores_argument_order():
+    assert SemanticQueryCache.params_key(top_k=5, filters={'a': 1, 'b': 2}) == \
+        SemanticQueryCache.params_key(filters={'b': 2, 'a': 1}, top_k=5)
+
+
+def test_expired_entries_miss(cache):
+    cache.ttl = 0
+    compute = Compute()
+    cache.get_or_compute("facial recognition", "{}", "v1", compute)
+    cache.get_or_compute("facial recognition", "{}", "v1", compute)
+
+    assert compute.calls == 2
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    compute = Compute()
+    for query in ["facial recognition", "chatbot advice", "facial recognition", "car crash"]:
+        cache.get_or_compute(query, "{}", "v1", compute)
+
+    assert cache.stats()['evictions'] == 1
+    cache.get_or_compute("facial recognition", "{}", "v1", compute)
+    assert compute.calls == 3
+    cache.get_or_compute("chatbot advice", "{}", "v1", compute)
+    assert compute.calls == 4
+
+
+def test_async_lookup_shares_entries(cache):
+    compute = Compute()
+
+    async def acompute():
+        return compute()
+
+    cache.get_or_compute("facial recognition", "{}", "v1", compute)
+    result = asyncio.run(cache.aget_or_compute("facial recognition", "{}", "v1", acompute))
+
+    assert result == ["result 1"]
+    assert compute.calls == 1
+
+
+def test_collection_version_follows_the_manifest_on_disk():
+    manifest = IngestionManifest("query-cache-test", {'chunk_size': 1000})
+    manifest.entries['1'] = {'text_hash': 'a', 'metadata_hash': 'm', 'chunk_ids': ['1#0']}
+    manifest.save()
+    first = collection_version("query-cache-test")
+    assert first == manifest.fingerprint
+    assert collection_version("query-cache-test") == first
+
+    # Another process re-ingests: the new manifest is picked up without a restart
+    manifest.entries['2'] = {'text_hash': 'b', 'metadata_hash': 'm', 'chunk_ids': ['2#0']}
+    manifest.save()
+    path = IngestionManifest.path_for("query-cache-test")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert collection_version("query-cache-test") == manifest.fingerprint != first
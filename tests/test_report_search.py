@@ -0,0 +1,128 @@
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_chroma import Chroma
+from src.services.bm25_index_service import BM25Index
+from src.services.report_repository_service import ReportRepository
+from src.services.report_search_service import best_passage, build_report_search_index, tokenize
+from src.services.retrieval_service import HybridRetriever, _report_rowids
+import chromadb
+import duckdb
+import pytest
+import math
+import uuid
+
+REPORTS = [
+    ("Police facial recognition", "Wrongful arrest", "A man was arrested after facial recognition matched the wrong face."),
+    ("Chatbot advice", None, "The chatbot gave dangerous medical advice to patients."),
+    ("Überwachung in Städten", "Gesichtserkennung", "Kameras mit Gesichtserkennung überwachen öffentliche Plätze."),
+    ("Robot accident", "Warehouse", "A warehouse robot injured a worker during the night shift."),
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "reports.duckdb")
+    con = duckdb.connect(path)
+    con.execute("CREATE TABLE reports (title VARCHAR, description VARCHAR, text VARCHAR)")
+    con.executemany("INSERT INTO reports VALUES (?, ?, ?)", REPORTS)
+    build_report_search_index(con)
+    con.close()
+    return path
+
+
+@pytest.fixture
+def repository(db_path):
+    repository = ReportRepository(db_path)
+    yield repository
+    repository.close()
+
+
+def reference_scores(query: str, k1: float = 1.5, b: float = 0.75) -> dict[int, float]:
+    docs = [tokenize(" ".join(part for part in report if part)) for report in REPORTS]
+    avgdl = sum(len(doc) for doc in docs) / len(docs)
+    scores = {}
+    for row_id, doc in enumerate(docs):
+        score = 0.0
+        for term in set(tokenize(query)):
+            tf = doc.count(term)
+            df = sum(term in other for other in docs)
+            if tf:
+                score += math.log1p((len(docs) - df + 0.5) / (df + 0.5)) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avgdl))
+        if score:
+            scores[row_id] = score
+    return scores
+
+
+@pytest.mark.parametrize("query", ["facial recognition arrest", "chatbot medical advice", "Gesichtserkennung Überwachung"])
+def test_search_matches_bm25_over_title_description_and_text(repository, query):
+    hits = repository.search_report_ids(query, top_k=10)
+    expected = reference_scores(query)
+
+    assert dict(hits) == pytest.approx(expected, rel=1e-5)
+    assert [row_id for row_id, _ in hits] == sorted(expected, key=lambda row_id: -expected[row_id])
+
+
+def test_search_honours_top_k_and_unknown_terms(repository):
+    assert len(repository.search_report_ids("the a worker face", top_k=1)) == 1
+    assert repository.search_report_ids("nonexistentterm", top_k=5) == []
+    assert repository.search_report_ids("", top_k=5) == []
+    assert repository.search_report_ids("robot", top_k=0) == []
+
+
+def test_search_without_an_index_returns_nothing(tmp_path):
+    path = str(tmp_path / "plain.duckdb")
+    con = duckdb.connect(path)
+    con.execute("CREATE TABLE reports (title VARCHAR, description VARCHAR, text VARCHAR)")
+    con.close()
+    repository = ReportRepository(path)
+
+    assert not repository.has_search_index
+    assert repository.search_report_ids("robot", top_k=5) == []
+    repository.close()
+
+
+def test_best_passage_centres_on_the_query_terms():
+    filler = " ".join(f"filler{i}" for i in range(200))
+    text = f"{filler} the robot injured a worker {filler}"
+    passage = best_passage(text, "robot worker", max_chars=120)
+
+    assert "robot injured a worker" in passage
+    assert passage.startswith("… ") and passage.endswith(" …")
+    assert len(passage) <= 120 + 4
+
+
+def test_best_passage_short_or_unmatched_text():
+    assert best_passage("  short\n text ", "robot") == "short text"
+    passage = best_passage("word " * 200, "robot", max_chars=50)
+    assert passage.startswith("word") and passage.endswith(" …")
+    assert best_passage(None, "robot") == ""
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("[2, 3, 10]", [0, 1, 8]),
+    ("['4']", [2]),
+    ([5], [3]),
+    ("", []),
+    ("not a list", []),
+])
+def test_report_rowids_from_incident_metadata(value, expected):
+    assert _report_rowids(value) == expected
+
+
+def test_evidence_leg_ranks_documents_citing_the_best_reports():
+    texts = ["incident one", "incident two", "incident three"]
+    metadatas = [{'reports': "[2]"}, {'reports': "[3, 4]"}, {'reports': "[5]"}]
+    vector_store = Chroma(collection_name=f"test-{uuid.uuid4().hex[:8]}",
+                          embedding_function=DeterministicFakeEmbedding(size=8), client=chromadb.EphemeralClient())
+    retriever = HybridRetriever(
+        bm25_index=BM25Index.build(["a", "b", "c"], texts, metadatas, version="v1"),
+        vector_store=vector_store,
+        evidence_search=lambda query, top_k: [(2, 3.0), (0, 2.0), (1, 1.0)],
+        evidence_weight=0.5,
+    )
+
+    assert retriever.evidence_enabled
+    assert [doc.id for doc in retriever.evidence_search_documents("q", top_k=3)] == ["b", "a"]
+    assert [doc.id for doc in retriever.evidence_search_documents("q", top_k=1)] == ["b"]
+    assert retriever.evidence_search_documents("q", top_k=3, filters={'reports': 'x'}) == []
+    assert not HybridRetriever(bm25_index=retriever.bm25_index, vector_store=vector_store,
+                               evidence_search=retriever.evidence_search).evidence_enabled
@@ -0,0 +1,85 @@
+from src.services import incidents_reports_etl_service as etl
+from src.services.incidents_reports_etl_service import REPORT_COLUMN_ORDER, create_reports_table
+import csv
+import duckdb
+import pytest
+
+
+def report(n: int, **fields) -> dict:
+    return {
+        '_id': f"id-{n}", 'report_number': str(n), 'title': f"Report {n}",
+        'description': f"About incident {n}", 'text': f"Full text of report {n}.", **fields,
+    }
+
+
+def write_csv(path, rows: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMN_ORDER, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def csv_path(tmp_path, monkeypatch):
+    path = tmp_path / "reports.csv"
+    monkeypatch.setattr(etl, "REPORTS_DATA_PATH", str(path))
+    monkeypatch.setattr(etl, "DB_PATH", str(tmp_path / "duckdb" / "reports.duckdb"))
+    monkeypatch.setattr(etl, "REPORTS_PARQUET_PATH", "")
+    return path
+
+
+def load(refresh: bool = False, parquet_path: str | None = None) -> list[tuple]:
+    con = create_reports_table(refresh=refresh, parquet_path=parquet_path)
+    try:
+        return con.execute("SELECT rowid, _id, report_number FROM reports ORDER BY rowid").fetchall()
+    finally:
+        con.close()
+
+
+def test_refresh_appends_new_reports_at_their_csv_rows(csv_path):
+    rows = [report(n) for n in (1, 2, 3)]
+    write_csv(csv_path, rows)
+    assert load() == [(0, "id-1", 1), (1, "id-2", 2), (2, "id-3", 3)]
+
+    rows += [report(n) for n in (4, 5)]
+    write_csv(csv_path, rows)
+    stored = load(refresh=True)
+
+    # Incidents refer to reports by CSV row, which has to stay the rowid
+    assert stored == [(row, f"id-{n}", n) for row, n in enumerate((1, 2, 3, 4, 5))]
+    assert load(refresh=True) == stored
+
+
+def test_refresh_rebuilds_when_the_csv_was_reordered(csv_path):
+    write_csv(csv_path, [report(n) for n in (1, 2, 3)])
+    load()
+
+    write_csv(csv_path, [report(n) for n in (2, 1, 3, 4)])
+
+    assert load(refresh=True) == [(0, "id-2", 2), (1, "id-1", 1), (2, "id-3", 3), (3, "id-4", 4)]
+
+
+def test_unreadable_numbers_become_null(csv_path):
+    write_csv(csv_path, [
+        report(1, epoch_date_published="1600000000", ref_number="7.0"),
+        report(2, epoch_date_published="{'$numberDouble': 'NaN'}", ref_number="NaN"),
+        report(3, epoch_date_published="", ref_number="not a number"),
+    ])
+    con = create_reports_table()
+    try:
+        numbers = con.execute("SELECT epoch_date_published, ref_number, epoch_date_modified FROM reports ORDER BY rowid").fetchall()
+    finally:
+        con.close()
+
+    assert numbers == [(1600000000, 7, None), (None, None, None), (None, None, None)]
+
+
+def test_parquet_export_keeps_row_ids_and_quotes_the_path(csv_path, tmp_path):
+    write_csv(csv_path, [report(n) for n in (1, 2)])
+    parquet_path = str(tmp_path / "o'brien" / "reports.parquet")
+
+    load(parquet_path=parquet_path)
+
+    rows = duckdb.sql("SELECT report_rowid, _id FROM read_parquet($path) ORDER BY report_rowid",
+                      params={'path': parquet_path}).fetchall()
+    assert rows == [(0, "id-1"), (1, "id-2")]
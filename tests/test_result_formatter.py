@@ -0,0 +1,102 @@
+from langchain_core.documents import Document
+from langchain_core.messages import ToolMessage
+from src.services.context_budget_service import compact_tool_result
+from src.services.result_formatter_service import (
+    DocumentRegistry, INCIDENT_LAYOUT, RISK_LAYOUT, citation_headers, document_registry, format_document,
+    format_results, parse_citations, short_id, split_short_id,
+)
+import json
+
+
+def incident(n: int, text_words: int = 60) -> Document:
+    return Document(
+        id=f"{n}#0",
+        page_content=f"Title: Incident {n}\nDeployer: Police\n" + " ".join(f"word{i}" for i in range(text_words)),
+        metadata={
+            'title': f"Incident {n}",
+            'incident_date': "2020-01-01",
+            'deployer': '["Police", "City"]',
+            'reports_details': json.dumps([
+                {'title': "First report", 'source_domain': "example.com", 'date_published': "2020-01-02T00:00:00"},
+                {'title': "Second report"},
+            ]),
+        },
+    )
+
+
+def test_short_ids_resolve_back_to_their_layout():
+    doc_id = short_id(INCIDENT_LAYOUT, incident(7))
+
+    assert doc_id == "I:7#0"
+    assert split_short_id(f"[{doc_id}]") == (INCIDENT_LAYOUT, "7#0")
+    assert split_short_id("X:1") == (None, "1")
+
+
+def test_results_render_as_citation_blocks():
+    text = format_results([incident(1)], INCIDENT_LAYOUT)
+
+    assert text.startswith("[I:1#0] Incident 1\n")
+    assert "date: 2020-01-01 | deployer: Police, City" in text
+    assert "reports (2): First report (example.com, 2020-01-02); Second report" in text
+    # Lines repeating the header are left out of the excerpt
+    assert "\n> word0 word1" in text
+    assert "Deployer: Police" not in text
+    assert text.endswith("Full records: get_document(doc_id) with an id in brackets.")
+    assert document_registry.get("I:1#0").page_content == incident(1).page_content
+
+
+def test_results_fit_the_token_budget():
+    results = [incident(n, text_words=400) for n in range(10)]
+    text = format_results(results, INCIDENT_LAYOUT, token_budget=300)
+
+    shown = [citation['id'] for citation in parse_citations(text)]
+    omitted = text.split("more results not shown: ")[1].split("]")[0].split(", ")
+    assert shown[0] == "I:0#0"
+    assert shown + omitted == [f"I:{n}#0" for n in range(10)]
+    assert len(text[:text.index(f"\n\n[{len(omitted)} more results")]) <= 300 * 4
+
+
+def test_plain_results_pass_through():
+    assert format_results("No results found.", RISK_LAYOUT) == "No results found."
+    assert format_results([], RISK_LAYOUT) == "No results."
+
+
+def test_parse_citations_and_headers():
+    text = format_results([incident(1), incident(2)], INCIDENT_LAYOUT)
+
+    assert parse_citations(text) == [
+        {'id': "I:1#0", 'title': "Incident 1", 'source': "incidents.csv"},
+        {'id': "I:2#0", 'title': "Incident 2", 'source': "incidents.csv"},
+    ]
+    assert citation_headers(text) == ["[I:1#0] Incident 1", "[I:2#0] Incident 2"]
+    assert parse_citations("[Z:1] unknown prefix") == []
+
+
+def test_compacted_results_keep_their_citation_headers():
+    text = format_results([incident(1), incident(2)], INCIDENT_LAYOUT)
+    stub = compact_tool_result(ToolMessage(content=text, tool_call_id="c", id="t"))
+
+    assert citation_headers(stub.text) == citation_headers(text)
+    assert "get_document(doc_id)" in stub.text
+
+
+def test_format_document_shows_the_full_record():
+    text = format_document(incident(3, text_words=5), INCIDENT_LAYOUT)
+
+    assert text.startswith("[I:3#0] Incident 3\n")
+    assert "deployer: Police, City" in text
+    assert "word4" in text
+    assert "Report 1: First report" in text and "source_domain: example.com" in text
+    assert "Report 2: Second report" in text
+
+
+def test_registry_evicts_least_recently_used():
+    registry = DocumentRegistry(max_entries=2)
+    for n in range(3):
+        registry.register(f"I:{n}", incident(n))
+        if n == 1:
+            registry.get("I:0")
+
+    assert registry.get("I:1") is None
+    assert registry.get("I:0") is not None and registry.get("I:2") is not None
+    assert len(registry) == 2
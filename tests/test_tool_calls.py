@@ -0,0 +1,124 @@
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from src import main
+import asyncio
+import threading
+import time
+import pytest
+
+
+def tool_calls(*calls: tuple[str, dict]) -> dict:
+    return {'messages': [AIMessage(content="", tool_calls=[
+        {'name': name, 'args': args, 'id': f"call_{i}", 'type': 'tool_call'} for i, (name, args) in enumerate(calls)
+    ])], 'llm_calls': 1}
+
+
+def make_tool(name: str, func) -> StructuredTool:
+    async def afunc(**kwargs):
+        return await asyncio.to_thread(func, **kwargs)
+    return StructuredTool.from_function(func=func, coroutine=afunc, name=name, description=name)
+
+
+# Lets search_stuck return, giving its worker back
+release = threading.Event()
+
+
+@pytest.fixture
+def received(monkeypatch):
+    '''Registers fake search tools; the returned list collects the arguments each call received.'''
+    calls: list[tuple[str, dict]] = []
+    release.clear()
+
+    def search_fast(query: str, top_k: int = 5, filters: dict | None = None) -> str:
+        calls.append(("search_fast", {'query': query, 'top_k': top_k, 'filters': filters}))
+        return f"fast: {query}"
+
+    def search_slow(query: str) -> str:
+        time.sleep(0.2)
+        calls.append(("search_slow", {'query': query}))
+        return f"slow: {query}"
+
+    def search_stuck(query: str) -> str:
+        release.wait(5)
+        return "too late"
+
+    def search_broken(query: str) -> str:
+        raise RuntimeError("index missing")
+
+    for func in (search_fast, search_slow, search_stuck, search_broken):
+        monkeypatch.setitem(main.tools_dict, func.__name__, make_tool(func.__name__, func))
+    monkeypatch.setitem(main.TOOL_TIMEOUTS, "search_stuck", 0.1)
+    yield calls
+    release.set()
+    wait_for_abandoned_calls()
+
+
+def wait_for_abandoned_calls():
+    deadline = time.monotonic() + 5
+    while main._ToolRun.abandoned and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def contents(result: dict) -> list[str]:
+    return [message.content for message in result['messages']]
+
+
+@pytest.mark.parametrize("action", ["sync", "async"])
+def test_results_come_back_in_tool_call_order(received, action):
+    state = tool_calls(("search_slow", {'query': "a"}), ("search_fast", {'query': "b"}), ("missing", {}))
+    result = main.retriever_action(state) if action == "sync" else asyncio.run(main.aretriever_action(state))
+
+    assert all(isinstance(message, ToolMessage) for message in result['messages'])
+    assert [message.tool_call_id for message in result['messages']] == ["call_0", "call_1", "call_2"]
+    assert contents(result)[:2] == ["slow: a", "fast: b"]
+    assert contents(result)[2].startswith("Tool missing not found")
+    # Run side by side: the fast call did not wait for the slow one
+    assert [name for name, _ in received] == ["search_fast", "search_slow"]
+
+
+@pytest.mark.parametrize("action", ["sync", "async"])
+def test_every_argument_reaches_the_tool(received, action):
+    args = {'query': "facial recognition", 'top_k': 12, 'filters': {'deployer': ['Police'], 'incident_date': {'gte': '2020'}}}
+    state = tool_calls(("search_fast", args))
+    if action == "sync":
+        main.retriever_action(state)
+    else:
+        asyncio.run(main.aretriever_action(state))
+
+    assert received == [("search_fast", args)]
+
+
+@pytest.mark.parametrize("action", ["sync", "async"])
+def test_a_timed_out_call_gives_exactly_one_error_message(received, action):
+    state = tool_calls(("search_stuck", {'query': "a"}), ("search_fast", {'query': "b"}), ("search_broken", {'query': "c"}))
+
+    async def timed_aretriever_action():
+        result = await main.aretriever_action(state)
+        # asyncio.run waits for the stuck worker thread before returning
+        release.set()
+        return result
+
+    started = time.monotonic()
+    result = main.retriever_action(state) if action == "sync" else asyncio.run(timed_aretriever_action())
+
+    assert time.monotonic() - started < 2
+    assert len(result['messages']) == 3
+    assert contents(result)[0] == "Tool search_stuck timed out after 0.1 seconds. Try a narrower query or continue without it."
+    assert contents(result)[1] == "fast: b"
+    assert contents(result)[2] == "Tool search_broken failed with error: index missing"
+
+
+def test_abandoned_calls_are_bounded_and_released(received, monkeypatch):
+    monkeypatch.setattr(main, "TOOL_MAX_ABANDONED", 1)
+    main.retriever_action(tool_calls(("search_stuck", {'query': "a"})))
+    assert main._ToolRun.abandoned == 1
+
+    # The stuck worker is still busy: further calls are refused instead of queueing behind it
+    refused = main.retriever_action(tool_calls(("search_fast", {'query': "b"})))
+    assert contents(refused)[0].startswith("Tool search_fast is unavailable")
+    assert received == []
+
+    release.set()
+    wait_for_abandoned_calls()
+    assert main._ToolRun.abandoned == 0
+    assert contents(main.retriever_action(tool_calls(("search_fast", {'query': "b"}))))[0] == "fast: b"